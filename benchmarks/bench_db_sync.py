@@ -0,0 +1,215 @@
+"""
+Замеры публичных функций db_sync на синтетических данных (data/generate_synthetic.py)
+нескольких масштабов. Результаты пишутся в JSON, чтобы сравнивать прогоны до/после изменений.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_db_sync --scales 5,20,50 -o bench_before.json
+    python -m benchmarks.bench_db_sync --scales 5,20,50 -o bench_after.json --compare bench_before.json
+    python -m benchmarks.bench_db_sync --url postgresql+psycopg2://... -o pg.json   (готовая БД, без генерации)
+
+Масштаб — число сезонов. БД каждого масштаба создаётся в --workdir и переиспользуется
+при повторных прогонах с теми же параметрами. По умолчанию кэши запросов отключены,
+чтобы замерялся путь до БД; --cache оставляет их включёнными (замеряются попадания).
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sqlalchemy as sa
+
+import db_sync
+from data import generate_synthetic
+
+
+def _context(series_name: str) -> dict:
+    """Аргументы для вызовов: последний сезон, первая гонка, лидеры рейтингов."""
+    season = db_sync.get_latest_season(force_refresh=True)
+    with db_sync.get_db_session() as session:
+        series_id = db_sync.get_series_id_by_name(session, series_name)
+    races, _, _ = db_sync.get_races_for_season(season, series_name, 1, 1)
+    drivers, _, _ = db_sync.get_driver_standings(season, series_name, 1, 10)
+    teams, _, _ = db_sync.get_team_standings(season, series_name, 1, 10)
+    manufacturers = db_sync.get_all_manufacturers_list()
+    return {
+        'season': season, 'series': series_name, 'series_id': series_id,
+        'race_id': races[0].race_id, 'driver_id': drivers[0].driver_id, 'driver_name': drivers[0].driver_name,
+        'team_id': teams[0].team_id, 'manufacturer_id': manufacturers[0][0],
+        'driver_ids': [row.driver_id for row in drivers[:5]], 'team_ids': [row.team_id for row in teams[:5]],
+        'manufacturer_ids': [row[0] for row in manufacturers],
+    }
+
+
+def _with_session(func, *args):
+    def call():
+        with db_sync.get_db_session() as session:
+            return func(session, *args)
+    return call
+
+
+def _cases(ctx: dict) -> dict:
+    """Имя функции -> вызов без аргументов."""
+    s, series, sid = ctx['season'], ctx['series'], ctx['series_id']
+    return {
+        'get_latest_season': lambda: db_sync.get_latest_season(force_refresh=True),
+        'get_series_id_by_name': _with_session(db_sync.get_series_id_by_name, series),
+        'get_driver_id_by_name': _with_session(db_sync.get_driver_id_by_name, ctx['driver_name']),
+        'get_races_for_season': lambda: db_sync.get_races_for_season(s, series, 2, 7),
+        'get_races_for_season_after': lambda: db_sync.get_races_for_season_after(s, series, None, 50),
+        'get_race_details_and_results': lambda: db_sync.get_race_details_and_results(ctx['race_id']),
+        'get_driver_standings': lambda: db_sync.get_driver_standings(s, series, 2, 10),
+        'get_driver_standings_after': lambda: db_sync.get_driver_standings_after(s, series, None, 100),
+        'get_driver_season_details': lambda: db_sync.get_driver_season_details(ctx['driver_id'], s, series),
+        'get_driver_race_results_for_season': lambda: db_sync.get_driver_race_results_for_season(ctx['driver_id'], s, sid),
+        'get_team_standings': lambda: db_sync.get_team_standings(s, series, 2, 10),
+        'get_team_standings_after': lambda: db_sync.get_team_standings_after(s, series, None, 100),
+        'get_team_season_details': lambda: db_sync.get_team_season_details(ctx['team_id'], s, series),
+        'get_manufacturer_season_stats': lambda: db_sync.get_manufacturer_season_stats(s, series),
+        'get_overall_driver_stats': lambda: db_sync.get_overall_driver_stats(ctx['driver_id']),
+        'get_overall_team_stats': lambda: db_sync.get_overall_team_stats(ctx['team_id']),
+        'get_overall_manufacturer_stats': lambda: db_sync.get_overall_manufacturer_stats(ctx['manufacturer_id']),
+        'get_driver_standings_progression': lambda: db_sync.get_driver_standings_progression(ctx['driver_id'], s, sid),
+        'get_team_race_results_for_season': lambda: db_sync.get_team_race_results_for_season(ctx['team_id'], s, sid),
+        'get_manufacturer_wins_by_season': lambda: db_sync.get_manufacturer_wins_by_season(ctx['manufacturer_id']),
+        'get_all_drivers_list': db_sync.get_all_drivers_list,
+        'get_all_teams_list': db_sync.get_all_teams_list,
+        'get_all_manufacturers_list': db_sync.get_all_manufacturers_list,
+        'get_driver_season_details_many': lambda: db_sync.get_driver_season_details_many(ctx['driver_ids'], s, series),
+        'get_team_season_details_many': lambda: db_sync.get_team_season_details_many(ctx['team_ids'], s, series),
+        'get_overall_driver_stats_many': lambda: db_sync.get_overall_driver_stats_many(ctx['driver_ids']),
+        'get_overall_team_stats_many': lambda: db_sync.get_overall_team_stats_many(ctx['team_ids']),
+        'get_overall_manufacturer_stats_many': lambda: db_sync.get_overall_manufacturer_stats_many(ctx['manufacturer_ids']),
+        'get_driver_race_results_for_season_many': lambda: db_sync.get_driver_race_results_for_season_many(ctx['driver_ids'], s, sid),
+        'get_team_race_results_for_season_many': lambda: db_sync.get_team_race_results_for_season_many(ctx['team_ids'], s, sid),
+    }
+
+
+def _measure(call, repeat: int, reset_caches: bool) -> dict:
+    times = []
+    for _ in range(repeat):
+        if reset_caches:
+            db_sync.clear_career_stats_cache()
+        started = time.perf_counter()
+        call()
+        times.append((time.perf_counter() - started) * 1000)
+    times.sort()
+    return {
+        'min_ms': round(times[0], 3),
+        'median_ms': round(statistics.median(times), 3),
+        'p95_ms': round(times[min(len(times) - 1, int(len(times) * 0.95))], 3),
+        'max_ms': round(times[-1], 3),
+    }
+
+
+def _table_sizes() -> dict:
+    with db_sync.engine.connect() as connection:
+        return {name: connection.execute(sa.select(sa.func.count()).select_from(db_sync.metadata.tables[name])).scalar_one()
+                for name in ('Races', 'RaceEntries', 'Drivers')}
+
+
+def run_scale(url: str, args) -> dict:
+    db_sync.configure_engine(url)
+    db_sync.reflect_db_schema()
+    db_sync.QUERY_CACHE.enabled = args.cache
+    if args.snapshot:
+        db_sync.load_snapshot()
+    ctx = _context(args.series)
+    cases = _cases(ctx)
+    if args.only:
+        cases = {name: call for name, call in cases.items() if name in args.only}
+
+    results = {}
+    for name, call in cases.items():
+        call() # Прогрев: компиляция SQL, справочники, соединения пула
+        results[name] = _measure(call, args.repeat, reset_caches=not args.cache)
+        print(f"  {name:<42}{results[name]['median_ms']:>10.2f} мс")
+    db_sync.drop_snapshot()
+    return {'tables': _table_sizes(), 'functions': results}
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_comparison(previous: dict, current: dict):
+    """Медианы текущего прогона относительно предыдущего (по совпадающим масштабам и функциям)."""
+    print(f"\nСравнение с {previous['meta'].get('commit')} ({previous['meta'].get('started_at')}):")
+    for scale, data in current['scales'].items():
+        old = previous['scales'].get(scale)
+        if old is None:
+            continue
+        print(f"Масштаб {scale}:")
+        for name, result in data['functions'].items():
+            before = old['functions'].get(name)
+            if before is None or not before['median_ms']:
+                continue
+            ratio = result['median_ms'] / before['median_ms']
+            mark = '  <-- медленнее' if ratio > 1.2 else ''
+            print(f"  {name:<42}{before['median_ms']:>10.2f} -> {result['median_ms']:>8.2f} мс  (x{ratio:.2f}){mark}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', default='5,20', help='числа сезонов через запятую')
+    parser.add_argument('--url', help='замерить готовую БД вместо синтетических')
+    parser.add_argument('--workdir', default='bench_data', help='каталог для синтетических БД')
+    parser.add_argument('--series', default='Cup')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--only', type=lambda value: value.split(','), help='только эти функции (через запятую)')
+    parser.add_argument('--rollups', action='store_true', help='строить таблицы посезонных агрегатов')
+    parser.add_argument('--indexes', action='store_true', help='применять индексы из data/migrations.py')
+    parser.add_argument('--snapshot', action='store_true', help='замерять с загруженным снимком RaceEntries')
+    parser.add_argument('--cache', action='store_true', help='не отключать кэши запросов')
+    parser.add_argument('-o', '--output', default='bench_db_sync.json')
+    parser.add_argument('--compare', help='JSON предыдущего прогона для сравнения')
+    args = parser.parse_args()
+
+    db_sync.SCHEMA_CACHE_PATH = None # Схема синтетических БД всегда отражается заново
+    report = {
+        'meta': {
+            'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'commit': _git_commit(), 'python': platform.python_version(), 'sqlalchemy': sa.__version__,
+            'options': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        },
+        'scales': {},
+    }
+
+    if args.url:
+        targets = {'custom': args.url}
+    else:
+        os.makedirs(args.workdir, exist_ok=True)
+        targets = {}
+        for seasons in (int(value) for value in args.scales.split(',')):
+            suffix = ('_r' if args.rollups else '') + ('_i' if args.indexes else '')
+            path = os.path.join(args.workdir, f"synthetic_{seasons}{suffix}.db")
+            if not os.path.exists(path):
+                print(f"Генерация {path} ({seasons} сезонов)...")
+                generate_synthetic.generate_database(f"sqlite:///{path}", seasons, rollups=args.rollups, indexes=args.indexes)
+            targets[str(seasons)] = f"sqlite:///{path}"
+
+    for scale, url in targets.items():
+        print(f"Масштаб {scale}: {url}")
+        report['scales'][scale] = run_scale(url, args)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=1)
+    print(f"Результаты записаны в {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            print_comparison(json.load(f), report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""
+Пропускная способность рассылки data/notification_dispatcher.py (сообщений в секунду)
+на заглушке транспорта с заданной задержкой «сети»: без БД и без Telegram.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_notification_dispatcher -n 2000 --latency 0.05
+    python -m benchmarks.bench_notification_dispatcher -n 2000 --latency 0.05 --rate 25 --failure-rate 0.05
+
+Без --rate темп ограничивает только число обработчиков: около workers / latency сообщений в секунду.
+С --rate рассылка не превышает заданный лимит (у Telegram — около 30 сообщений в секунду на бота).
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data.notification_dispatcher import StubTransport, dispatch
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк рассылки уведомлений")
+    parser.add_argument('-n', '--messages', type=int, default=2000)
+    parser.add_argument('--latency', type=float, default=0.05, help='задержка одной отправки, с')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='доля временных сбоев заглушки')
+    parser.add_argument('--rate', type=float, default=0.0, help='лимит сообщений в секунду (0 — без лимита)')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 16, 64])
+    args = parser.parse_args()
+
+    messages = [(100000 + i, f"NASCAR Cup: новые результаты #{i}") for i in range(args.messages)]
+    print(f"{'обработчиков':>12} {'отправлено':>10} {'сбоев':>6} {'повторов':>8} {'секунд':>8} {'сообщ./с':>9}")
+    for workers in args.workers:
+        transport = StubTransport(latency=args.latency, failure_rate=args.failure_rate, seed=1)
+        stats = asyncio.run(dispatch(messages, transport, workers=workers, rate=args.rate, backoff=0.01))
+        print(f"{workers:>12} {stats['sent']:>10} {stats['failed']:>6} {stats['retries']:>8} "
+              f"{stats['seconds']:>8} {stats['messages_per_second']:>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Микробенчмарк готовых запросов db_sync: сколько стоит на Python один вызов,
+если конструкция select() собирается заново (как раньше), и если берётся готовая.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_statement_cache --url sqlite:///nascar_stats.db -n 2000
+
+«Сборка» — только построение запроса и его ключа кэша (без БД): это та часть,
+которую убирают готовые запросы. «Выполнение» — полный session.execute() с выборкой строк.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_sync
+
+
+def _time_per_call(func, iterations: int) -> float:
+    """Среднее время вызова, мкс."""
+    func() # Прогрев: компиляция SQL попадает в кэш движка
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def _cases(season: int, series_id: int, race_id: int, driver_id: int, team_id: int):
+    """(имя, построитель запроса, параметры) для горячих запросов."""
+    page = {'limit': 10, 'offset': 0}
+    return [
+        ('races_page', db_sync._build_races_page_statement,
+         {'season': season, 'series_id': series_id, 'limit': 7, 'offset': 0}),
+        ('race_details', db_sync._build_race_details_statement, {'race_id': race_id}),
+        ('race_results', db_sync._build_race_results_statement, {'race_id': race_id}),
+        ('driver_standings', lambda: db_sync._build_driver_standings_statements()[1],
+         {'season': season, 'series_id': series_id, **page}),
+        ('team_standings', lambda: db_sync._build_team_standings_statements()[1],
+         {'season': season, 'series_id': series_id, **page}),
+        ('driver_race_results', db_sync._build_driver_race_results_statement,
+         {'driver_id': driver_id, 'season': season, 'series_id': series_id}),
+        ('team_race_results', db_sync._build_team_race_results_statement,
+         {'team_id': team_id, 'season': season, 'series_id': series_id}),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='строка подключения (по умолчанию — настройки db_config)')
+    parser.add_argument('-n', '--iterations', type=int, default=1000)
+    parser.add_argument('--series', default='Cup')
+    args = parser.parse_args()
+
+    db_sync.configure_engine(args.url)
+    db_sync.reflect_db_schema()
+    season = db_sync.get_latest_season()
+
+    with db_sync.get_db_session() as session:
+        series_id = db_sync.get_series_id_by_name(session, args.series)
+        races, _, _ = db_sync.get_races_for_season.uncached(season, args.series, 1, 1)
+        standings, _, _ = db_sync.get_driver_standings.uncached(season, args.series, 1, 1)
+        teams, _, _ = db_sync.get_team_standings.uncached(season, args.series, 1, 1)
+        if not (series_id and races and standings and teams):
+            sys.exit(f"Нет данных для сезона {season}, серии {args.series}.")
+        cases = _cases(season, series_id, races[0].race_id, standings[0].driver_id, teams[0].team_id)
+
+        print(f"Сезон {season}, серия {args.series}, итераций: {args.iterations}")
+        print(f"{'запрос':<22}{'сборка, мкс':>14}{'готовый, мкс':>14}{'выполнение, мкс':>18}{'готовый, мкс':>14}")
+        for name, build, params in cases:
+            cached_stmt = build()
+            build_us = _time_per_call(lambda: build()._generate_cache_key(), args.iterations)
+            cached_key_us = _time_per_call(lambda: cached_stmt._generate_cache_key(), args.iterations)
+            execute_us = _time_per_call(lambda: session.execute(build(), params).fetchall(), args.iterations)
+            cached_execute_us = _time_per_call(lambda: session.execute(cached_stmt, params).fetchall(), args.iterations)
+            print(f"{name:<22}{build_us:>14.1f}{cached_key_us:>14.1f}{execute_us:>18.1f}{cached_execute_us:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
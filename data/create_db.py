@@ -69,6 +69,17 @@ race_entries_table = sa.Table('RaceEntries', metadata,
     # sa.UniqueConstraint('race_id', 'driver_id', 'car_number', name='uq_race_entry')
 )
 
+# Журнал загрузок: строка на каждую загрузку результатов (data/load_data.py, data/bulk_load.py).
+# max(load_id) входит в версию данных приложения — так замечаются и исправления уже загруженных гонок.
+# AUTOINCREMENT: SQLite не выдаёт повторно id удалённых строк
+data_loads_table = sa.Table('DataLoads', metadata,
+    sa.Column('load_id', sa.Integer, primary_key=True),
+    sa.Column('loaded_at', sa.DateTime, nullable=False),
+    sa.Column('source', sa.String(50), nullable=False),
+    sa.Column('pairs', sa.Integer, nullable=False), # Число затронутых пар (season, series_id)
+    sqlite_autoincrement=True
+)
+
 # --- Функция для создания таблиц и заполнения начальных данных ---
 def create_database():
     """Создает все таблицы в базе данных и заполняет таблицу Series."""
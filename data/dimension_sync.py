@@ -0,0 +1,81 @@
+# dimension_sync.py
+# Синхронизация справочников (Drivers, Teams, Manufacturers, Tracks) одним запросом на таблицу
+# вместо INSERT ... ON CONFLICT DO NOTHING на каждое имя (upsert_and_get_ids_pg в load_data.R).
+#   PostgreSQL: INSERT ... SELECT FROM unnest(массивы) ON CONFLICT (имя) DO UPDATE ... RETURNING id, имя —
+#     весь справочник передаётся одним параметром-массивом, ответ сразу содержит карту имя -> id
+#     (и для новых, и для существующих имён); признак вставки — xmax = 0.
+#   SQLite: тот же upsert через многострочный VALUES (пачками в пределах лимита параметров) и RETURNING.
+# Для трасс DO UPDATE обновляет длину и покрытие, если во входных данных они заданы.
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql, sqlite
+
+from data import create_db
+
+SQLITE_BATCH_SIZE = 10000 # Строк в одном многострочном VALUES (лимит параметров SQLite — 32766)
+
+# Справочник -> (таблица, столбец id, столбец имени)
+NAME_DIMENSIONS = {
+    'drivers': (create_db.drivers_table, 'driver_id', 'driver_name'),
+    'teams': (create_db.teams_table, 'team_id', 'team_name'),
+    'manufacturers': (create_db.manufacturers_table, 'manufacturer_id', 'manufacturer_name'),
+}
+
+
+def _array(name: str, item_type):
+    return sa.bindparam(name, type_=postgresql.ARRAY(item_type))
+
+
+def _upsert(connection, table, rows: list, columns: list, key_column: str, id_column: str, set_: callable) -> tuple[dict, int]:
+    """
+    Общий upsert: rows — список словарей по columns, set_(excluded) — значения DO UPDATE.
+    Возвращает (имя -> id, сколько строк вставлено).
+    """
+    if not rows:
+        return {}, 0
+    id_col, key_col = table.c[id_column], table.c[key_column]
+
+    if connection.dialect.name == 'postgresql':
+        source = sa.func.unnest(*(_array(column, table.c[column].type) for column in columns)) \
+            .table_valued(*columns).render_derived()
+        statement = postgresql.insert(table).from_select(columns, sa.select(*(source.c[column] for column in columns)))
+        statement = statement.on_conflict_do_update(index_elements=[key_col], set_=set_(statement.excluded)) \
+            .returning(id_col, key_col, sa.literal_column('xmax = 0').label('inserted'))
+        params = {column: [row[column] for row in rows] for column in columns}
+        result = connection.execute(statement, params).all()
+        return {row[1]: row[0] for row in result}, sum(1 for row in result if row.inserted)
+
+    # SQLite: новые строки — с id больше прежнего максимума
+    previous_max = connection.execute(sa.select(sa.func.max(id_col))).scalar() or 0
+    ids, inserted = {}, 0
+    for start in range(0, len(rows), SQLITE_BATCH_SIZE):
+        statement = sqlite.insert(table).values(rows[start:start + SQLITE_BATCH_SIZE])
+        statement = statement.on_conflict_do_update(index_elements=[key_col], set_=set_(statement.excluded)) \
+            .returning(id_col, key_col)
+        for row_id, name in connection.execute(statement):
+            ids[name] = row_id
+            inserted += row_id > previous_max
+    return ids, inserted
+
+
+def upsert_names(connection, dimension: str, names) -> tuple[dict, int]:
+    """Добавляет отсутствующие имена справочника ('drivers', 'teams', 'manufacturers'); возвращает (имя -> id, добавлено)."""
+    table, id_column, name_column = NAME_DIMENSIONS[dimension]
+    rows = [{name_column: name} for name in sorted(set(names))]
+    # DO UPDATE без фактических изменений нужен, чтобы RETURNING вернул и уже существующие строки
+    return _upsert(connection, table, rows, [name_column], name_column, id_column,
+                   lambda excluded: {name_column: excluded[name_column]})
+
+
+def upsert_tracks(connection, details: dict) -> tuple[dict, int]:
+    """
+    details — {название: (длина, покрытие)}; пустые длина/покрытие не затирают сохранённые.
+    Возвращает (название -> track_id, добавлено).
+    """
+    table = create_db.tracks_table
+    rows = [{'track_name': name, 'track_length': length, 'track_surface': surface or None}
+            for name, (length, surface) in sorted(details.items())]
+    return _upsert(connection, table, rows, ['track_name', 'track_length', 'track_surface'], 'track_name', 'track_id',
+                   lambda excluded: {
+                       'track_length': sa.func.coalesce(excluded.track_length, table.c.track_length),
+                       'track_surface': sa.func.coalesce(excluded.track_surface, table.c.track_surface),
+                   })
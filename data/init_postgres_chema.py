@@ -1,7 +1,13 @@
 # init_postgres_schema.py
+# Запуск из корня проекта:
+#   python -m data.init_postgres_chema                 -> обычная схема
+#   python -m data.init_postgres_chema --partitioned   -> RaceEntries секционирована по series_id (см. data/partitioning.py)
+import sys
 import sqlalchemy as sa
 from sqlalchemy.dialects.postgresql import BIGINT # Для telegram_user_id
 
+from data import partitioning
+
 # --- Конфигурация для ЛОКАЛЬНОЙ PostgreSQL ---
 # Замените на ваши данные, если отличаются от стандартных
 DB_USER_LOCAL = "nascar_user"  # Или 'postgres'
@@ -96,11 +102,18 @@ user_subscriptions_table = sa.Table('UserSubscriptions', metadata,
 )
 
 # --- Функция для создания таблиц и заполнения начальных данных ---
-def create_database_structure():
-    """Создает все таблицы в базе данных PostgreSQL и заполняет таблицу Series."""
+def create_database_structure(partitioned: bool = False):
+    """
+    Создает все таблицы в базе данных PostgreSQL и заполняет таблицу Series.
+    partitioned — RaceEntries создаётся секционированной по series_id (с денормализованными season/series_id).
+    """
     print(f"Создание структуры таблиц в PostgreSQL базе: {DB_NAME_LOCAL_PG}...")
     try:
-        metadata.create_all(engine) # Эта команда создаст все определенные таблицы
+        if partitioned:
+            # RaceEntries создаётся отдельно, после заполнения Series (секции — по одной на серию)
+            metadata.create_all(engine, tables=[table for table in metadata.sorted_tables if table is not race_entries_table])
+        else:
+            metadata.create_all(engine) # Эта команда создаст все определенные таблицы
         print("Структура таблиц успешно создана в PostgreSQL.")
 
         # Заполнение таблицы Series начальными данными
@@ -120,9 +133,19 @@ def create_database_structure():
                 print("Таблица 'Series' успешно заполнена.")
             else:
                 print("Таблица 'Series' уже содержит данные.")
+
+        if partitioned:
+            with engine.begin() as connection:
+                if sa.inspect(connection).has_table(partitioning.ENTRIES_TABLE) and not partitioning.is_partitioned(connection):
+                    print("Таблица 'RaceEntries' уже существует без секций: данные переносит python -m data.migrations <DB_URL> --partition-entries.")
+                    return
+                if not partitioning.is_partitioned(connection):
+                    partitioning.create_partitioned_entries_table(connection)
+                created = partitioning.create_series_partitions(connection)
+            print(f"Секционированная таблица 'RaceEntries' готова, создано секций: {len(created)}.")
     except Exception as e:
         print(f"Ошибка при создании/заполнении таблиц в PostgreSQL: {e}")
 
 # --- Точка входа ---
 if __name__ == "__main__":
-    create_database_structure()
\ No newline at end of file
+    create_database_structure(partitioned='--partitioned' in sys.argv)
\ No newline at end of file
@@ -0,0 +1,332 @@
+# migrations.py
+# Версионные миграции (индексы) и секционирование RaceEntries по запросу для схем data/create_db.py (SQLite) и data/init_postgres_chema.py (PostgreSQL).
+#
+# Запуск из корня проекта:
+#   python -m data.migrations                      -> SQLite из create_db.py (nascar_stats.db)
+#   python -m data.migrations <DB_URL>             -> произвольная БД (например, postgresql+psycopg2://...)
+#   python -m data.migrations <DB_URL> --plans     -> только показать планы контрольных запросов
+#   python -m data.migrations <DB_URL> --partition-entries   -> перенести RaceEntries в секции по series_id (PostgreSQL)
+#   python -m data.migrations <DB_URL> --unpartition-entries -> вернуть обычную таблицу RaceEntries
+#
+# Перенос RaceEntries в секции переписывает всю таблицу, поэтому он не входит в цепочку версий
+# и выполняется только явной командой: одной транзакцией (при любой ошибке — полный откат,
+# прежняя таблица остаётся), обратная команда возвращает обычную таблицу тем же способом.
+import logging
+import sys
+import sqlalchemy as sa
+
+from data import partitioning
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_URL = 'sqlite:///nascar_stats.db'
+
+# Таблица с применёнными версиями
+MIGRATIONS_TABLE = 'SchemaMigrations'
+
+# Столбцы, которые читают агрегирующие запросы db_sync. В PostgreSQL они идут в INCLUDE,
+# в SQLite (нет INCLUDE) — в хвост составного ключа, чтобы индекс тоже был покрывающим.
+_ENTRY_STAT_COLUMNS = ['finish_position', 'start_position', 'points', 'won_race', 'laps_led', 'laps_completed']
+
+
+def _covering_index(name: str, table: str, key_columns: list, include_columns: list) -> dict:
+    """Возвращает DDL покрывающего индекса для обоих диалектов."""
+    keys = ', '.join(key_columns)
+    return {
+        'postgresql': f'CREATE INDEX IF NOT EXISTS {name} ON "{table}" ({keys}) INCLUDE ({", ".join(include_columns)})',
+        'sqlite': f'CREATE INDEX IF NOT EXISTS {name} ON "{table}" ({", ".join(key_columns + include_columns)})',
+    }
+
+
+def _plain_index(name: str, table: str, expression: str) -> dict:
+    """DDL обычного (в т.ч. функционального) индекса — синтаксис общий для обоих диалектов."""
+    ddl = f'CREATE INDEX IF NOT EXISTS {name} ON "{table}" ({expression})'
+    return {'postgresql': ddl, 'sqlite': ddl}
+
+
+# Индексы RaceEntries из миграций 1 и 2 (пересоздаются после секционирования в миграции 5)
+_ENTRY_INDEXES_BY_ENTITY = [
+    _covering_index('ix_raceentries_driver', 'RaceEntries', ['driver_id', 'race_id'], _ENTRY_STAT_COLUMNS),
+    _covering_index('ix_raceentries_team', 'RaceEntries', ['team_id', 'race_id'], _ENTRY_STAT_COLUMNS + ['driver_id']),
+    _covering_index('ix_raceentries_manufacturer', 'RaceEntries', ['manufacturer_id', 'race_id'], _ENTRY_STAT_COLUMNS + ['driver_id']),
+]
+_ENTRY_INDEX_BY_RACE = _covering_index('ix_raceentries_race', 'RaceEntries', ['race_id', 'finish_position'], ['driver_id', 'team_id', 'manufacturer_id'])
+
+
+_SEASON_INDEX_DDL = (
+    'CREATE INDEX IF NOT EXISTS ix_raceentries_season ON "RaceEntries" (season, driver_id) '
+    f'INCLUDE ({", ".join(_ENTRY_STAT_COLUMNS + ["team_id", "manufacturer_id"])})'
+)
+
+
+def _prepare_partitioned_entries(connection):
+    """
+    Миграция 5 (PostgreSQL): для уже секционированной RaceEntries (init_postgres_chema.py --partitioned
+    или --partition-entries) досоздаёт секции и индекс сезона. Обычную таблицу не трогает.
+    """
+    if partitioning.is_partitioned(connection):
+        partitioning.create_series_partitions(connection)
+        # Внутри секции серии: выборки сезона (рейтинги, статистика сезона)
+        connection.execute(sa.text(_SEASON_INDEX_DDL))
+
+
+def _recreate_entry_indexes(connection):
+    """Индексы миграций 1 и 2 удаляются вместе с прежней таблицей — создаём их на новой."""
+    for ddl in _ENTRY_INDEXES_BY_ENTITY + [_ENTRY_INDEX_BY_RACE]:
+        connection.execute(sa.text(ddl['postgresql']))
+
+
+def partition_race_entries(engine) -> int:
+    """
+    Переносит обычную RaceEntries в LIST-секции по series_id (только PostgreSQL) одной транзакцией.
+    Возвращает число перенесённых строк (0 — таблица уже секционирована).
+    """
+    if engine.dialect.name != 'postgresql':
+        raise ValueError("Секционирование RaceEntries поддерживается только для PostgreSQL.")
+    try:
+        with engine.begin() as connection:
+            if partitioning.is_partitioned(connection):
+                _prepare_partitioned_entries(connection)
+                return 0
+            moved = partitioning.partition_existing_entries(connection)
+            _recreate_entry_indexes(connection)
+            connection.execute(sa.text(_SEASON_INDEX_DDL))
+    except Exception:
+        logger.error("Перенос RaceEntries в секции не удался, транзакция откатана — таблица не изменена.", exc_info=True)
+        raise
+    with engine.begin() as connection:
+        connection.execute(sa.text('ANALYZE "RaceEntries"'))
+    return moved
+
+
+def unpartition_race_entries(engine) -> int:
+    """Обратный перенос секционированной RaceEntries в обычную таблицу одной транзакцией; возвращает число строк."""
+    if engine.dialect.name != 'postgresql':
+        raise ValueError("Секционирование RaceEntries поддерживается только для PostgreSQL.")
+    try:
+        with engine.begin() as connection:
+            if not partitioning.is_partitioned(connection):
+                return 0
+            moved = partitioning.unpartition_entries(connection)
+            _recreate_entry_indexes(connection)
+    except Exception:
+        logger.error("Возврат обычной RaceEntries не удался, транзакция откатана — таблица не изменена.", exc_info=True)
+        raise
+    with engine.begin() as connection:
+        connection.execute(sa.text('ANALYZE "RaceEntries"'))
+    return moved
+
+
+class MigrationSkipped(Exception):
+    """Шаг миграции невыполним в этой БД: миграция откатывается, не отмечается применённой и повторится при следующем запуске."""
+
+
+def _ensure_pg_trgm(connection):
+    """
+    Миграция 6 (PostgreSQL): расширение pg_trgm. Если его нет среди доступных или у роли нет права
+    его создать, миграция пропускается (поиск db_sync.search_entities работает через LIKE),
+    а последующие миграции применяются как обычно.
+    """
+    installed, available = connection.execute(sa.text(
+        "SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'), "
+        "EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm')")).one()
+    if installed:
+        return
+    if not available:
+        raise MigrationSkipped("расширение pg_trgm не установлено на сервере (нет в pg_available_extensions)")
+    try:
+        connection.execute(sa.text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+    except sa.exc.DBAPIError as e:
+        # Обычно нет права CREATE на БД (или расширение не trusted для этой роли)
+        raise MigrationSkipped(f"не удалось создать расширение pg_trgm: {e.orig}") from e
+
+
+def _trigram_index(name: str, table: str, column: str) -> str:
+    """GIN-индекс pg_trgm по lower(столбец): оператор % и LIKE 'префикс%' для db_sync.search_entities."""
+    return f'CREATE INDEX IF NOT EXISTS {name} ON "{table}" USING gin (lower({column}) gin_trgm_ops)'
+
+
+# --- Список миграций: (версия, описание, [DDL по диалектам]) ---
+# DDL — строка SQL или функция (connection), если шаг зависит от данных; диалекта нет в словаре — шаг пропускается.
+# Функция может выбросить MigrationSkipped: миграция откатывается целиком и остаётся неприменённой.
+# Новые миграции добавляются только в конец, с возрастающим номером версии.
+MIGRATIONS = [
+    (1, "RaceEntries: покрывающие индексы по driver_id / team_id / manufacturer_id", _ENTRY_INDEXES_BY_ENTITY),
+    (2, "RaceEntries: индекс по race_id (результаты гонки, JOIN с Races)", [_ENTRY_INDEX_BY_RACE]),
+    (3, "Races: индекс (season, series_id, race_num_in_season)", [
+        _covering_index('ix_races_season_series', 'Races', ['season', 'series_id', 'race_num_in_season'], ['race_id', 'track_id']),
+    ]),
+    (4, "Справочники: функциональные индексы lower(name) для get_id_by_name", [
+        _plain_index('ix_drivers_lower_name', 'Drivers', 'lower(driver_name)'),
+        _plain_index('ix_teams_lower_name', 'Teams', 'lower(team_name)'),
+        _plain_index('ix_manufacturers_lower_name', 'Manufacturers', 'lower(manufacturer_name)'),
+    ]),
+    (5, "RaceEntries: секции и индекс сезона для секционированной таблицы (только PostgreSQL)", [
+        {'postgresql': _prepare_partitioned_entries},
+    ]),
+    (6, "Поиск по именам: pg_trgm и триграммные индексы (только PostgreSQL)", [
+        {'postgresql': _ensure_pg_trgm},
+        {'postgresql': _trigram_index('ix_drivers_name_trgm', 'Drivers', 'driver_name')},
+        {'postgresql': _trigram_index('ix_teams_name_trgm', 'Teams', 'team_name')},
+        {'postgresql': _trigram_index('ix_manufacturers_name_trgm', 'Manufacturers', 'manufacturer_name')},
+        {'postgresql': _trigram_index('ix_tracks_name_trgm', 'Tracks', 'track_name')},
+        {'postgresql': _trigram_index('ix_races_name_trgm', 'Races', 'race_name')},
+    ]),
+]
+
+# --- Контрольные запросы для сравнения планов до/после (повторяют фильтры db_sync) ---
+# (название, проверяемая таблица, её алиас в запросе, SQL)
+QUERY_PLAN_CHECKS = [
+    ("Сезон гонщика", 'RaceEntries', 'e',
+     'SELECT count(e.race_id), sum(e.won_race), avg(e.finish_position) FROM "RaceEntries" e '
+     'JOIN "Races" r ON e.race_id = r.race_id '
+     'WHERE e.driver_id = :entity_id AND r.season = :season AND r.series_id = :series_id'),
+    ("Карьера команды", 'RaceEntries', 'e',
+     'SELECT count(e.driver_id), sum(e.won_race), sum(e.points) FROM "RaceEntries" e '
+     'WHERE e.team_id = :entity_id AND e.finish_position IS NOT NULL'),
+    ("Карьера производителя", 'RaceEntries', 'e',
+     'SELECT count(e.driver_id), sum(e.won_race) FROM "RaceEntries" e '
+     'WHERE e.manufacturer_id = :entity_id AND e.driver_id IS NOT NULL'),
+    ("Результаты гонки", 'RaceEntries', 'e',
+     'SELECT e.finish_position, e.driver_id FROM "RaceEntries" e '
+     'WHERE e.race_id = :entity_id ORDER BY e.finish_position'),
+    ("Гонки сезона", 'Races', 'r',
+     'SELECT r.race_id, r.race_num_in_season FROM "Races" r '
+     'WHERE r.season = :season AND r.series_id = :series_id ORDER BY r.race_num_in_season'),
+    ("Поиск гонщика по имени", 'Drivers', 'd',
+     'SELECT d.driver_id FROM "Drivers" d WHERE lower(d.driver_name) = lower(:name)'),
+]
+_PLAN_PARAMS = {'entity_id': 1, 'season': 2024, 'series_id': 1, 'name': 'Kyle Busch'}
+
+
+def _ensure_migrations_table(connection):
+    connection.execute(sa.text(
+        f'CREATE TABLE IF NOT EXISTS "{MIGRATIONS_TABLE}" ('
+        'version INTEGER PRIMARY KEY, '
+        'description VARCHAR(255) NOT NULL, '
+        'applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)'
+    ))
+
+
+def get_applied_versions(connection) -> set:
+    """Возвращает множество уже применённых версий миграций."""
+    _ensure_migrations_table(connection)
+    rows = connection.execute(sa.text(f'SELECT version FROM "{MIGRATIONS_TABLE}"')).scalars().all()
+    return set(rows)
+
+
+def pending_versions(connection) -> list:
+    """Версии миграций, ещё не применённые к БД (по возрастанию)."""
+    applied = get_applied_versions(connection)
+    return [version for version, _, _ in MIGRATIONS if version not in applied]
+
+
+def apply_migrations(engine, target_version: int | None = None) -> list:
+    """
+    Применяет все неприменённые миграции (до target_version включительно).
+    Каждая миграция выполняется в своей транзакции. Возвращает список применённых версий.
+    """
+    dialect = engine.dialect.name
+    if dialect not in ('postgresql', 'sqlite'):
+        raise ValueError(f"Диалект '{dialect}' не поддерживается миграциями.")
+
+    applied_now = []
+    with engine.begin() as connection:
+        applied = get_applied_versions(connection)
+
+    for version, description, statements in MIGRATIONS:
+        if version in applied or (target_version is not None and version > target_version):
+            continue
+        logger.info(f"Применение миграции {version}: {description}...")
+        try:
+            with engine.begin() as connection:
+                for ddl in statements:
+                    step = ddl.get(dialect)
+                    if callable(step):
+                        step(connection)
+                    elif step:
+                        connection.execute(sa.text(step))
+                connection.execute(
+                    sa.text(f'INSERT INTO "{MIGRATIONS_TABLE}" (version, description) VALUES (:version, :description)'),
+                    {'version': version, 'description': description}
+                )
+        except MigrationSkipped as e:
+            logger.warning(f"Миграция {version} пропущена: {e}. Она будет повторена при следующем запуске.")
+            continue
+        applied_now.append(version)
+
+    if applied_now:
+        # Обновляем статистику планировщика, иначе новые индексы могут игнорироваться
+        with engine.begin() as connection:
+            connection.execute(sa.text('ANALYZE'))
+        logger.info(f"Применено миграций: {len(applied_now)}.")
+    else:
+        logger.info("Схема уже в актуальной версии.")
+    return applied_now
+
+
+def explain(connection, sql: str, params: dict) -> str:
+    """Возвращает план запроса в виде текста (EXPLAIN / EXPLAIN QUERY PLAN)."""
+    if connection.dialect.name == 'postgresql':
+        rows = connection.execute(sa.text(f'EXPLAIN {sql}'), params).scalars().all()
+        return '\n'.join(rows)
+    rows = connection.execute(sa.text(f'EXPLAIN QUERY PLAN {sql}'), params).fetchall()
+    return '\n'.join(row[-1] for row in rows)
+
+
+def uses_full_scan(plan: str, table: str, alias: str, dialect: str) -> bool:
+    """Определяет, читает ли план таблицу целиком (Seq Scan / SCAN без индекса)."""
+    if dialect == 'postgresql':
+        return f'Seq Scan on "{table}"' in plan
+    for line in plan.splitlines():
+        words = line.split()
+        if len(words) >= 2 and words[0] == 'SCAN' and words[1] in (table, alias) and 'INDEX' not in line:
+            return True
+    return False
+
+
+def check_query_plans(engine) -> dict:
+    """Прогоняет контрольные запросы и возвращает {название: (план, полный_скан)}."""
+    results = {}
+    with engine.connect() as connection:
+        for name, table, alias, sql in QUERY_PLAN_CHECKS:
+            plan = explain(connection, sql, _PLAN_PARAMS)
+            results[name] = (plan, uses_full_scan(plan, table, alias, engine.dialect.name))
+    return results
+
+
+def print_plan_comparison(before: dict, after: dict):
+    """Печатает сравнение планов до и после миграций."""
+    for name in before:
+        _, scan_before = before[name]
+        plan_after, scan_after = after[name]
+        status_before = "ПОЛНЫЙ СКАН" if scan_before else "индекс"
+        status_after = "ПОЛНЫЙ СКАН" if scan_after else "индекс"
+        print(f"- {name}: {status_before} -> {status_after}")
+        if scan_after:
+            print(f"  План после миграций:\n    " + plan_after.replace('\n', '\n    '))
+
+
+# --- Точка входа ---
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    db_url = args[0] if args else DEFAULT_DB_URL
+    engine = sa.create_engine(db_url)
+    logging.basicConfig(level=logging.INFO, format='%(message)s') # Ход миграций выводится через logging
+
+    if '--partition-entries' in sys.argv or '--unpartition-entries' in sys.argv:
+        if '--partition-entries' in sys.argv:
+            print(f"RaceEntries секционирована, перенесено строк: {partition_race_entries(engine)}")
+        else:
+            print(f"RaceEntries снова обычная таблица, перенесено строк: {unpartition_race_entries(engine)}")
+        sys.exit(0)
+
+    print(f"Проверка планов контрольных запросов ({engine.dialect.name})...")
+    plans_before = check_query_plans(engine)
+    if '--plans' in sys.argv:
+        for name, (plan, full_scan) in plans_before.items():
+            print(f"- {name}: {'ПОЛНЫЙ СКАН' if full_scan else 'индекс'}\n    " + plan.replace('\n', '\n    '))
+    else:
+        apply_migrations(engine)
+        print("Сравнение планов до/после миграций:")
+        print_plan_comparison(plans_before, check_query_plans(engine))
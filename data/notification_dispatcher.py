@@ -0,0 +1,365 @@
+# notification_dispatcher.py
+# Рассылка итогов гонок подписчикам UserSubscriptions (notification_type = 'race_results_update')
+# пользователям Users с привязанным telegram_user_id (схема data/init_postgres_chema.py).
+#   1. Сводка по каждой серии считается один раз: гонки загрузки, первая тройка, лидер чемпионата.
+#   2. Подписчику уходит одно сообщение со сводками всех его серий.
+#   3. Сообщения отправляют несколько asyncio-обработчиков из ограниченной очереди; общий
+#      ограничитель скорости (token bucket) держит поток в пределах лимита Telegram, временные
+#      ошибки повторяются с экспоненциальной задержкой (или через retry_after из ответа 429).
+# Транспорт подключаемый: TelegramTransport (Bot API, токен в NASTATS_TELEGRAM_TOKEN) или
+# StubTransport — локальная заглушка (задержка и доля сбоев задаются), для проверок без Telegram.
+# Итог рассылки: отправлено / не доставлено / повторов и пропускная способность в сообщениях в секунду.
+#
+# Запуск из корня проекта:
+#   python -m data.notification_dispatcher <DB_URL> 2025:1 2025:2          -> итоги последних гонок пар сезон:серия
+#   python -m data.notification_dispatcher <DB_URL> --listen               -> рассылать новые гонки каждой загрузки (LISTEN, см. change_events.py)
+#   python -m data.notification_dispatcher <DB_URL> 2025:1 --stub          -> вместо Telegram — заглушка
+#   ... --workers 8 --rate 25                                               -> число обработчиков и сообщений в секунду
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+import urllib.error
+import urllib.request
+
+import sqlalchemy as sa
+
+from data import change_events
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATION_TYPE = 'race_results_update'
+MAX_MESSAGE_LENGTH = 4096 # Ограничение Telegram на длину сообщения
+MAX_RACES_PER_SERIES = 5
+
+# --- Лёгкие описания таблиц ---
+users = sa.table('Users', sa.column('user_id'), sa.column('telegram_user_id'))
+subscriptions = sa.table('UserSubscriptions', sa.column('user_id'), sa.column('series_id'),
+                         sa.column('notification_type'), sa.column('is_active'))
+series = sa.table('Series', sa.column('series_id'), sa.column('series_name'))
+tracks = sa.table('Tracks', sa.column('track_id'), sa.column('track_name'))
+races = sa.table('Races', sa.column('race_id'), sa.column('season'), sa.column('series_id'),
+                 sa.column('race_num_in_season'), sa.column('race_name'), sa.column('track_id'))
+race_entries = sa.table('RaceEntries', sa.column('race_id'), sa.column('driver_id'), sa.column('finish_position'),
+                        sa.column('points'), sa.column('won_race'))
+drivers = sa.table('Drivers', sa.column('driver_id'), sa.column('driver_name'))
+
+
+# --- Сводки ---
+def latest_race_keys(connection, pairs) -> list:
+    """Ключи (season, race_num_in_season, series_id) последних гонок пар (season, series_id)."""
+    keys = []
+    for season, series_id in sorted(set(pairs)):
+        race_num = connection.execute(sa.select(sa.func.max(races.c.race_num_in_season))
+                                      .where((races.c.season == season) & (races.c.series_id == series_id))).scalar()
+        if race_num is not None:
+            keys.append((season, race_num, series_id))
+    return keys
+
+
+def _race_digest(connection, race) -> str:
+    podium = connection.execute(
+        sa.select(race_entries.c.finish_position, drivers.c.driver_name)
+        .select_from(race_entries.join(drivers, race_entries.c.driver_id == drivers.c.driver_id))
+        .where((race_entries.c.race_id == race.race_id) & (race_entries.c.finish_position <= 3))
+        .order_by(race_entries.c.finish_position)
+    ).all()
+    points = sa.func.sum(race_entries.c.points)
+    leader = connection.execute(
+        sa.select(drivers.c.driver_name, points.label('points'))
+        .select_from(race_entries.join(races, race_entries.c.race_id == races.c.race_id)
+                     .join(drivers, race_entries.c.driver_id == drivers.c.driver_id))
+        .where((races.c.season == race.season) & (races.c.series_id == race.series_id) &
+               (races.c.race_num_in_season <= race.race_num_in_season) & race_entries.c.points.isnot(None))
+        .group_by(drivers.c.driver_id, drivers.c.driver_name)
+        .order_by(points.desc(), sa.func.sum(race_entries.c.won_race).desc(), drivers.c.driver_name)
+        .limit(1)
+    ).first()
+
+    track = f" ({race.track_name})" if race.track_name else ""
+    lines = [f"{race.season}, гонка {race.race_num_in_season}: {race.race_name}{track}"]
+    lines += [f"{position}. {name}" for position, name in podium]
+    if leader is not None:
+        lines.append(f"Лидер чемпионата: {leader.driver_name} — {leader.points} очк.")
+    return '\n'.join(lines)
+
+
+def build_digests(connection, race_keys) -> dict:
+    """
+    Сводки по сериям {series_id: текст} для гонок race_keys (season, race_num_in_season, series_id).
+    Считаются один раз на серию и затем раздаются всем её подписчикам.
+    """
+    by_series = {}
+    for season, race_num, series_id in sorted(set(race_keys)):
+        by_series.setdefault(series_id, []).append((season, race_num))
+    if not by_series:
+        return {}
+    series_names = dict(connection.execute(sa.select(series.c.series_id, series.c.series_name)
+                                           .where(series.c.series_id.in_(list(by_series)))).all())
+
+    digests = {}
+    for series_id, keys in by_series.items():
+        shown = keys[-MAX_RACES_PER_SERIES:] # Самые поздние гонки серии
+        race_rows = connection.execute(
+            sa.select(races.c.race_id, races.c.season, races.c.series_id, races.c.race_num_in_season,
+                      races.c.race_name, tracks.c.track_name)
+            .select_from(races.outerjoin(tracks, races.c.track_id == tracks.c.track_id))
+            .where((races.c.series_id == series_id) &
+                   sa.tuple_(races.c.season, races.c.race_num_in_season).in_(shown))
+            .order_by(races.c.season, races.c.race_num_in_season)
+        ).all()
+        if not race_rows:
+            continue
+        parts = [f"NASCAR {series_names.get(series_id, series_id)}: новые результаты"]
+        parts += [_race_digest(connection, race) for race in race_rows]
+        if len(keys) > len(shown):
+            parts.append(f"…и ещё гонок: {len(keys) - len(shown)}")
+        digests[series_id] = '\n\n'.join(parts)
+    return digests
+
+
+def load_recipients(connection, series_ids) -> dict:
+    """{series_id: [telegram_user_id, ...]} активных подписок на итоги гонок."""
+    rows = connection.execute(
+        sa.select(subscriptions.c.series_id, users.c.telegram_user_id)
+        .select_from(subscriptions.join(users, subscriptions.c.user_id == users.c.user_id))
+        .where(subscriptions.c.series_id.in_(list(series_ids)) & subscriptions.c.is_active.is_(True) &
+               (subscriptions.c.notification_type == NOTIFICATION_TYPE) & users.c.telegram_user_id.isnot(None))
+        .order_by(users.c.telegram_user_id, subscriptions.c.series_id)
+    ).all()
+    recipients = {}
+    for series_id, chat_id in rows:
+        recipients.setdefault(series_id, []).append(chat_id)
+    return recipients
+
+
+def fan_out(digests: dict, recipients: dict) -> list:
+    """Одно сообщение (chat_id, текст) на подписчика: сводки всех его серий подряд."""
+    per_chat = {}
+    for series_id, digest in digests.items():
+        for chat_id in recipients.get(series_id, ()):
+            per_chat.setdefault(chat_id, []).append(digest)
+    messages = []
+    for chat_id, parts in per_chat.items():
+        text = '\n\n'.join(parts)
+        if len(text) > MAX_MESSAGE_LENGTH:
+            text = text[:MAX_MESSAGE_LENGTH - 1] + '…'
+        messages.append((chat_id, text))
+    return messages
+
+
+def prepare_messages(connection, race_keys=None, pairs=None) -> list:
+    """Сообщения подписчикам по гонкам race_keys или (если их нет) по последним гонкам пар pairs."""
+    race_keys = list(race_keys or []) or latest_race_keys(connection, pairs or [])
+    digests = build_digests(connection, race_keys)
+    if not digests:
+        return []
+    return fan_out(digests, load_recipients(connection, digests))
+
+
+# --- Транспорт ---
+class TransportError(Exception):
+    """Сбой отправки. permanent — повтор бесполезен (бот заблокирован, чат не найден); retry_after — пауза из ответа."""
+
+    def __init__(self, message: str, retry_after: float | None = None, permanent: bool = False):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.permanent = permanent
+
+
+class StubTransport:
+    """Заглушка вместо Telegram: запоминает отправленное, может имитировать задержку сети и сбои."""
+
+    def __init__(self, latency: float = 0.0, failure_rate: float = 0.0, seed: int | None = None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.sent = []
+        self.attempts = 0
+        self._random = random.Random(seed)
+
+    async def send(self, chat_id: int, text: str):
+        self.attempts += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.failure_rate and self._random.random() < self.failure_rate:
+            raise TransportError("имитация временного сбоя")
+        self.sent.append((chat_id, text))
+
+
+class TelegramTransport:
+    """Telegram Bot API (sendMessage). Запрос выполняется в пуле потоков asyncio, без сторонних HTTP-библиотек."""
+    API_URL = 'https://api.telegram.org/bot{token}/sendMessage'
+
+    def __init__(self, token: str, timeout: float = 10.0):
+        self._url = self.API_URL.format(token=token)
+        self.timeout = timeout
+
+    async def send(self, chat_id: int, text: str):
+        await asyncio.to_thread(self._post, chat_id, text)
+
+    def _post(self, chat_id: int, text: str):
+        body = json.dumps({'chat_id': chat_id, 'text': text, 'disable_web_page_preview': True}).encode('utf-8')
+        request = urllib.request.Request(self._url, data=body, headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+        except urllib.error.HTTPError as e:
+            try:
+                details = json.loads(e.read().decode('utf-8'))
+            except (ValueError, UnicodeDecodeError):
+                details = {}
+            retry_after = (details.get('parameters') or {}).get('retry_after')
+            description = details.get('description', str(e))
+            # 400/403 — чат не найден или бот заблокирован пользователем; 429 и 5xx — временные
+            raise TransportError(description, retry_after=retry_after, permanent=e.code in (400, 403)) from e
+        except (urllib.error.URLError, TimeoutError) as e:
+            raise TransportError(str(e)) from e
+
+
+# --- Рассылка ---
+class RateLimiter:
+    """Token bucket на цикл asyncio: не больше rate сообщений в секунду, допускается всплеск до burst."""
+
+    def __init__(self, rate: float, burst: int | None = None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        """Общая пауза (ответ 429 относится ко всему боту, а не к одному чату)."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+async def dispatch(messages, transport, workers: int = 8, rate: float = 25.0,
+                   max_retries: int = 3, backoff: float = 0.5) -> dict:
+    """
+    Отправляет (chat_id, текст) через transport: workers обработчиков читают ограниченную очередь,
+    общий RateLimiter задаёт темп. Возвращает статистику рассылки.
+    """
+    messages = list(messages)
+    limiter = RateLimiter(rate) if rate else None
+    queue = asyncio.Queue(maxsize=workers * 4)
+    stats = {'messages': len(messages), 'sent': 0, 'failed': 0, 'retries': 0}
+
+    async def deliver(chat_id, text):
+        for attempt in range(max_retries + 1):
+            if limiter is not None:
+                await limiter.acquire()
+            try:
+                await transport.send(chat_id, text)
+                stats['sent'] += 1
+                return
+            except Exception as e:
+                permanent = isinstance(e, TransportError) and e.permanent
+                if permanent or attempt == max_retries:
+                    stats['failed'] += 1
+                    logger.warning(f"Сообщение для {chat_id} не доставлено ({attempt + 1} попыток): {e}")
+                    return
+                retry_after = e.retry_after if isinstance(e, TransportError) else None
+                if retry_after and limiter is not None:
+                    limiter.pause(retry_after)
+                stats['retries'] += 1
+                await asyncio.sleep(retry_after or backoff * 2 ** attempt)
+
+    async def worker():
+        while True:
+            item = await queue.get()
+            try:
+                if item is None:
+                    return
+                await deliver(*item)
+            finally:
+                queue.task_done()
+
+    started = time.perf_counter()
+    tasks = [asyncio.create_task(worker()) for _ in range(max(1, workers))]
+    for message in messages:
+        await queue.put(message)
+    for _ in tasks:
+        await queue.put(None)
+    await asyncio.gather(*tasks)
+    seconds = time.perf_counter() - started
+    stats['seconds'] = round(seconds, 3)
+    stats['messages_per_second'] = round(stats['sent'] / seconds, 1) if seconds > 0 else None
+    return stats
+
+
+def default_transport():
+    """TelegramTransport с токеном из NASTATS_TELEGRAM_TOKEN."""
+    token = os.getenv('NASTATS_TELEGRAM_TOKEN')
+    if not token:
+        raise ValueError("Не задан NASTATS_TELEGRAM_TOKEN (или используйте StubTransport / --stub).")
+    return TelegramTransport(token)
+
+
+def notify_subscribers(engine, race_keys=None, pairs=None, transport=None, **options) -> dict:
+    """
+    Сводки по гонкам (или последним гонкам пар) и их рассылка подписчикам.
+    options — параметры dispatch (workers, rate, max_retries, backoff).
+    """
+    with engine.connect() as connection:
+        messages = prepare_messages(connection, race_keys, pairs)
+    if not messages:
+        return {'messages': 0, 'sent': 0, 'failed': 0, 'retries': 0, 'seconds': 0.0, 'messages_per_second': None}
+    return asyncio.run(dispatch(messages, transport or default_transport(), **options))
+
+
+def print_stats(stats: dict):
+    print(f"Сообщений: {stats['messages']}, отправлено {stats['sent']}, не доставлено {stats['failed']}, "
+          f"повторов {stats['retries']}; {stats['seconds']} с, {stats['messages_per_second']} сообщ./с")
+
+
+# --- Точка входа ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Рассылка итогов гонок подписчикам")
+    parser.add_argument('url', help='строка подключения к PostgreSQL (схема init_postgres_chema.py)')
+    parser.add_argument('pairs', nargs='*', metavar='СЕЗОН:СЕРИЯ', help='например 2025:1')
+    parser.add_argument('--listen', action='store_true', help='рассылать итоги новых гонок после каждой загрузки (уведомления change_events)')
+    parser.add_argument('--stub', action='store_true', help='заглушка вместо Telegram')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--rate', type=float, default=25.0, help='сообщений в секунду (лимит Telegram — около 30)')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    engine = sa.create_engine(args.url)
+    transport = StubTransport() if args.stub else default_transport()
+    options = {'workers': args.workers, 'rate': args.rate}
+    if args.pairs:
+        print_stats(notify_subscribers(engine, pairs=[tuple(int(part) for part in pair.split(':')) for pair in args.pairs],
+                                       transport=transport, **options))
+    if args.listen:
+        def _on_load(pairs, new_races):
+            # Исправления уже загруженных гонок и повторная загрузка новых гонок не дают — рассылки нет
+            if not new_races:
+                logger.info(f"Загрузка без новых гонок ({len(pairs)} пар сезон:серия) — рассылка не нужна.")
+                return
+            print_stats(notify_subscribers(engine, race_keys=new_races, transport=transport, **options))
+
+        listener = change_events.ChangeListener(engine, _on_load, with_new_races=True)
+        listener.start()
+        print(f"Ожидание уведомлений {change_events.CHANNEL} (Ctrl+C — выход)...")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            listener.stop()
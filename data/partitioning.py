@@ -0,0 +1,150 @@
+# partitioning.py
+# Секционированная схема RaceEntries для PostgreSQL: LIST-секции по series_id (по одной на серию
+# плюс секция DEFAULT для новых серий), season и series_id денормализованы из Races.
+# Запросы db_sync, фильтрующие по RaceEntries.series_id, читают только секцию своей серии (partition pruning).
+# Используется в data/init_postgres_chema.py (--partitioned) и командами data/migrations.py
+# --partition-entries / --unpartition-entries (перенос существующей таблицы — только по явному запросу).
+import sqlalchemy as sa
+
+ENTRIES_TABLE = 'RaceEntries'
+DEFAULT_PARTITION = 'RaceEntries_default'
+
+# Столбцы RaceEntries без entry_id (тот же состав и типы, что в init_postgres_chema.py)
+ENTRY_COLUMNS_DDL = [
+    ('race_id', 'INTEGER NOT NULL REFERENCES "Races" (race_id)'),
+    ('driver_id', 'INTEGER NOT NULL REFERENCES "Drivers" (driver_id)'),
+    ('team_id', 'INTEGER NOT NULL REFERENCES "Teams" (team_id)'),
+    ('manufacturer_id', 'INTEGER NOT NULL REFERENCES "Manufacturers" (manufacturer_id)'),
+    ('car_number', 'VARCHAR(10)'),
+    ('start_position', 'INTEGER'),
+    ('finish_position', 'INTEGER'),
+    ('points', 'INTEGER'),
+    ('laps_completed', 'INTEGER'),
+    ('laps_led', 'INTEGER'),
+    ('status', 'VARCHAR(50)'),
+    ('segment1_finish', 'INTEGER'),
+    ('segment2_finish', 'INTEGER'),
+    ('driver_rating', 'REAL'),
+    ('won_race', 'INTEGER NOT NULL DEFAULT 0'),
+]
+ENTRY_COLUMNS = [name for name, _ in ENTRY_COLUMNS_DDL]
+
+
+def partition_name(series_id: int) -> str:
+    return f'{ENTRIES_TABLE}_series_{series_id}'
+
+
+def is_partitioned(connection, table_name: str = ENTRIES_TABLE) -> bool:
+    """True, если таблица уже секционирована (relkind = 'p')."""
+    relkind = connection.execute(
+        sa.text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)"), {'name': f'"{table_name}"'}
+    ).scalar()
+    return relkind == 'p'
+
+
+def create_partitioned_entries_table(connection, table_name: str = ENTRIES_TABLE, sequence: str | None = None):
+    """
+    Создаёт секционированную RaceEntries (без секций).
+    sequence — существующая последовательность для entry_id (при переносе данных); None — новый SERIAL.
+    Первичный ключ секционированной таблицы обязан включать ключ секционирования: (entry_id, series_id).
+    """
+    entry_id = 'SERIAL' if sequence is None else f"INTEGER NOT NULL DEFAULT nextval('{sequence}'::regclass)"
+    columns = ',\n            '.join(f'{name} {ddl}' for name, ddl in ENTRY_COLUMNS_DDL)
+    connection.execute(sa.text(f'''
+        CREATE TABLE "{table_name}" (
+            entry_id {entry_id},
+            {columns},
+            series_id INTEGER NOT NULL REFERENCES "Series" (series_id),
+            season INTEGER NOT NULL,
+            CONSTRAINT pk_raceentries PRIMARY KEY (entry_id, series_id)
+        ) PARTITION BY LIST (series_id)
+    '''))
+
+
+def create_series_partitions(connection, table_name: str = ENTRIES_TABLE) -> list:
+    """
+    Создаёт недостающие секции: по одной на каждую серию из Series и DEFAULT.
+    Серия, добавленная позже, попадает в DEFAULT, пока для неё не создана секция
+    (создать секцию можно, только если в DEFAULT ещё нет её строк). Возвращает имена созданных секций.
+    """
+    existing = set(connection.execute(sa.text(
+        "SELECT child.relname FROM pg_inherits JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE pg_inherits.inhparent = to_regclass(:parent)"), {'parent': f'"{table_name}"'}).scalars())
+    created = []
+    for series_id in connection.execute(sa.text('SELECT series_id FROM "Series" ORDER BY series_id')).scalars():
+        name = partition_name(series_id)
+        if name not in existing:
+            connection.execute(sa.text(f'CREATE TABLE "{name}" PARTITION OF "{table_name}" FOR VALUES IN ({int(series_id)})'))
+            created.append(name)
+    if DEFAULT_PARTITION not in existing:
+        connection.execute(sa.text(f'CREATE TABLE "{DEFAULT_PARTITION}" PARTITION OF "{table_name}" DEFAULT'))
+        created.append(DEFAULT_PARTITION)
+    return created
+
+
+def partition_existing_entries(connection) -> int:
+    """
+    Переносит обычную RaceEntries в секционированную в рамках текущей транзакции:
+    новая таблица с секциями -> копирование строк с season/series_id из Races -> замена старой таблицы.
+    entry_id и его последовательность сохраняются. Индексы создаёт вызывающий код. Возвращает число строк.
+    """
+    staging = f'{ENTRIES_TABLE}_partitioned'
+    sequence = connection.execute(sa.text(f"SELECT pg_get_serial_sequence('\"{ENTRIES_TABLE}\"', 'entry_id')")).scalar()
+    if sequence:
+        # Иначе последовательность удалится вместе со старой таблицей
+        connection.execute(sa.text(f'ALTER SEQUENCE {sequence} OWNED BY NONE'))
+    create_partitioned_entries_table(connection, staging, sequence)
+    create_series_partitions(connection, staging)
+
+    columns = ', '.join(['entry_id'] + ENTRY_COLUMNS)
+    source_columns = ', '.join(f'e.{name}' for name in ['entry_id'] + ENTRY_COLUMNS)
+    moved = connection.execute(sa.text(
+        f'INSERT INTO "{staging}" ({columns}, series_id, season) '
+        f'SELECT {source_columns}, r.series_id, r.season FROM "{ENTRIES_TABLE}" e JOIN "Races" r ON r.race_id = e.race_id'
+    )).rowcount
+    total = connection.execute(sa.text(f'SELECT count(*) FROM "{ENTRIES_TABLE}"')).scalar_one()
+    if moved != total:
+        raise RuntimeError(f"Перенесено {moved} из {total} строк RaceEntries (записи без гонки в Races?)")
+
+    connection.execute(sa.text(f'DROP TABLE "{ENTRIES_TABLE}"'))
+    connection.execute(sa.text(f'ALTER TABLE "{staging}" RENAME TO "{ENTRIES_TABLE}"'))
+    if sequence:
+        connection.execute(sa.text(f'ALTER SEQUENCE {sequence} OWNED BY "{ENTRIES_TABLE}".entry_id'))
+    return moved
+
+
+def unpartition_entries(connection) -> int:
+    """
+    Обратный перенос: секционированная RaceEntries -> обычная таблица (без season/series_id)
+    в рамках текущей транзакции. entry_id и его последовательность сохраняются.
+    Индексы создаёт вызывающий код. Возвращает число строк.
+    """
+    staging = f'{ENTRIES_TABLE}_plain'
+    sequence = connection.execute(sa.text(f"SELECT pg_get_serial_sequence('\"{ENTRIES_TABLE}\"', 'entry_id')")).scalar()
+    if sequence:
+        connection.execute(sa.text(f'ALTER SEQUENCE {sequence} OWNED BY NONE'))
+    entry_id = 'SERIAL PRIMARY KEY' if sequence is None else f"INTEGER PRIMARY KEY DEFAULT nextval('{sequence}'::regclass)"
+    columns = ',\n            '.join(f'{name} {ddl}' for name, ddl in ENTRY_COLUMNS_DDL)
+    connection.execute(sa.text(f'''
+        CREATE TABLE "{staging}" (
+            entry_id {entry_id},
+            {columns}
+        )
+    '''))
+
+    column_list = ', '.join(['entry_id'] + ENTRY_COLUMNS)
+    moved = connection.execute(sa.text(
+        f'INSERT INTO "{staging}" ({column_list}) SELECT {column_list} FROM "{ENTRIES_TABLE}"')).rowcount
+    total = connection.execute(sa.text(f'SELECT count(*) FROM "{ENTRIES_TABLE}"')).scalar_one()
+    if moved != total:
+        raise RuntimeError(f"Перенесено {moved} из {total} строк RaceEntries")
+    if sequence is None: # Новый SERIAL должен продолжить нумерацию перенесённых строк
+        connection.execute(sa.text(
+            f"SELECT setval(pg_get_serial_sequence('\"{staging}\"', 'entry_id'), "
+            f'(SELECT coalesce(max(entry_id), 0) + 1 FROM "{staging}"), false)'))
+
+    connection.execute(sa.text(f'DROP TABLE "{ENTRIES_TABLE}"')) # Вместе с секциями
+    connection.execute(sa.text(f'ALTER TABLE "{staging}" RENAME TO "{ENTRIES_TABLE}"'))
+    if sequence:
+        connection.execute(sa.text(f'ALTER SEQUENCE {sequence} OWNED BY "{ENTRIES_TABLE}".entry_id'))
+    return moved
@@ -0,0 +1,219 @@
+# season_rollups.py
+# Материализованные посезонные агрегаты (DriverSeasonStats, TeamSeasonStats, ManufacturerSeasonStats)
+# и их инкрементальное обновление по затронутым парам (season, series_id).
+#
+# Запуск из корня проекта:
+#   python -m data.season_rollups                          -> создать таблицы и полностью пересчитать (SQLite из create_db.py)
+#   python -m data.season_rollups <DB_URL>                 -> то же для произвольной БД
+#   python -m data.season_rollups <DB_URL> 2025:1 2025:2   -> пересчитать только указанные пары сезон:серия
+import sys
+import time
+import sqlalchemy as sa
+
+DEFAULT_DB_URL = 'sqlite:///nascar_stats.db'
+
+metadata = sa.MetaData()
+
+# --- Определение таблиц агрегатов ---
+# Столбцы standings_* считаются по тем же фильтрам, что и рейтинги в db_sync,
+# остальные — по записям с finish_position IS NOT NULL (как детальная статистика сезона/карьеры).
+# Средние хранятся как сумма + количество, чтобы их можно было точно складывать между сезонами.
+
+driver_season_stats_table = sa.Table('DriverSeasonStats', metadata,
+    sa.Column('driver_id', sa.Integer, primary_key=True),
+    sa.Column('season', sa.Integer, primary_key=True),
+    sa.Column('series_id', sa.Integer, primary_key=True),
+    # Для рейтинга гонщиков (записи с points IS NOT NULL)
+    sa.Column('standings_races', sa.Integer, nullable=False),
+    sa.Column('standings_wins', sa.Integer, nullable=False),
+    sa.Column('standings_points', sa.Integer, nullable=False),
+    # Для детальной статистики (записи с finish_position IS NOT NULL)
+    sa.Column('races', sa.Integer, nullable=False),
+    sa.Column('wins', sa.Integer, nullable=False),
+    sa.Column('top5', sa.Integer, nullable=False),
+    sa.Column('top10', sa.Integer, nullable=False),
+    sa.Column('laps_led', sa.Integer, nullable=False),
+    sa.Column('laps_completed', sa.Integer, nullable=False),
+    sa.Column('start_sum', sa.Integer, nullable=False),
+    sa.Column('start_count', sa.Integer, nullable=False),
+    sa.Column('finish_sum', sa.Integer, nullable=False),
+    sa.Column('points', sa.Integer, nullable=False),
+    sa.Index('ix_driverseasonstats_season_series', 'season', 'series_id')
+)
+
+team_season_stats_table = sa.Table('TeamSeasonStats', metadata,
+    sa.Column('team_id', sa.Integer, primary_key=True),
+    sa.Column('season', sa.Integer, primary_key=True),
+    sa.Column('series_id', sa.Integer, primary_key=True),
+    # Для рейтинга команд (все записи с гонщиком)
+    sa.Column('standings_entries', sa.Integer, nullable=False),
+    sa.Column('standings_wins', sa.Integer, nullable=False),
+    sa.Column('standings_points', sa.Integer, nullable=False),
+    sa.Column('standings_top5', sa.Integer, nullable=False),
+    # Для детальной статистики (записи с finish_position IS NOT NULL)
+    sa.Column('entries', sa.Integer, nullable=False),
+    sa.Column('wins', sa.Integer, nullable=False),
+    sa.Column('top5', sa.Integer, nullable=False),
+    sa.Column('top10', sa.Integer, nullable=False),
+    sa.Column('laps_led', sa.Integer, nullable=False),
+    sa.Column('laps_completed', sa.Integer, nullable=False),
+    sa.Column('start_sum', sa.Integer, nullable=False),
+    sa.Column('start_count', sa.Integer, nullable=False),
+    sa.Column('finish_sum', sa.Integer, nullable=False),
+    sa.Column('points', sa.Integer, nullable=False),
+    sa.Index('ix_teamseasonstats_season_series', 'season', 'series_id')
+)
+
+manufacturer_season_stats_table = sa.Table('ManufacturerSeasonStats', metadata,
+    sa.Column('manufacturer_id', sa.Integer, primary_key=True),
+    sa.Column('season', sa.Integer, primary_key=True),
+    sa.Column('series_id', sa.Integer, primary_key=True),
+    sa.Column('entries', sa.Integer, nullable=False),
+    sa.Column('wins', sa.Integer, nullable=False),
+    sa.Column('top5', sa.Integer, nullable=False),
+    sa.Column('top10', sa.Integer, nullable=False),
+    sa.Column('laps_led', sa.Integer, nullable=False),
+    sa.Index('ix_manufacturerseasonstats_season_series', 'season', 'series_id')
+)
+
+# --- Лёгкие описания исходных таблиц (без привязки к конкретной схеме SQLite/PostgreSQL) ---
+races = sa.table('Races',
+    sa.column('race_id'), sa.column('season'), sa.column('series_id')
+)
+race_entries = sa.table('RaceEntries',
+    sa.column('race_id'), sa.column('driver_id'), sa.column('team_id'), sa.column('manufacturer_id'),
+    sa.column('start_position'), sa.column('finish_position'), sa.column('points'),
+    sa.column('laps_completed'), sa.column('laps_led'), sa.column('won_race')
+)
+
+
+def _sum_if(condition, value=None):
+    """SUM(CASE WHEN condition THEN value ELSE 0 END); без value — количество, NULL в value считается нулём."""
+    value = 1 if value is None else sa.func.coalesce(value, 0)
+    return sa.func.coalesce(sa.func.sum(sa.case((condition, value), else_=0)), 0)
+
+
+def _sum(value):
+    """SUM(value) с NULL -> 0."""
+    return sa.func.coalesce(sa.func.sum(sa.func.coalesce(value, 0)), 0)
+
+
+def _finished_stats(finished, count_label: str) -> list:
+    """Общие столбцы детальной статистики по финишировавшим записям."""
+    e = race_entries.c
+    return [
+        _sum_if(finished).label(count_label),
+        _sum_if(finished, e.won_race).label('wins'),
+        _sum_if(finished & (e.finish_position <= 5)).label('top5'),
+        _sum_if(finished & (e.finish_position <= 10)).label('top10'),
+        _sum_if(finished, e.laps_led).label('laps_led'),
+        _sum_if(finished, e.laps_completed).label('laps_completed'),
+        _sum_if(finished & e.start_position.isnot(None), e.start_position).label('start_sum'),
+        _sum_if(finished & e.start_position.isnot(None)).label('start_count'),
+        _sum_if(finished, e.finish_position).label('finish_sum'),
+        _sum_if(finished, e.points).label('points'),
+    ]
+
+
+def _driver_rollup_select():
+    e = race_entries.c
+    finished = e.finish_position.isnot(None)
+    scored = e.points.isnot(None)
+    return sa.select(
+        e.driver_id, races.c.season, races.c.series_id,
+        _sum_if(scored).label('standings_races'),
+        _sum_if(scored, e.won_race).label('standings_wins'),
+        _sum_if(scored, e.points).label('standings_points'),
+        *_finished_stats(finished, 'races')
+    ).select_from(race_entries.join(races, e.race_id == races.c.race_id)
+    ).where(e.driver_id.isnot(None)
+    ).group_by(e.driver_id, races.c.season, races.c.series_id)
+
+
+def _team_rollup_select():
+    e = race_entries.c
+    finished = e.finish_position.isnot(None)
+    return sa.select(
+        e.team_id, races.c.season, races.c.series_id,
+        sa.func.count(e.driver_id).label('standings_entries'),
+        _sum(e.won_race).label('standings_wins'),
+        _sum(e.points).label('standings_points'),
+        _sum_if(e.finish_position <= 5).label('standings_top5'),
+        *_finished_stats(finished, 'entries')
+    ).select_from(race_entries.join(races, e.race_id == races.c.race_id)
+    ).where(e.team_id.isnot(None) & e.driver_id.isnot(None)
+    ).group_by(e.team_id, races.c.season, races.c.series_id)
+
+
+def _manufacturer_rollup_select():
+    e = race_entries.c
+    return sa.select(
+        e.manufacturer_id, races.c.season, races.c.series_id,
+        sa.func.count(e.driver_id).label('entries'),
+        _sum(e.won_race).label('wins'),
+        _sum_if(e.finish_position <= 5).label('top5'),
+        _sum_if(e.finish_position <= 10).label('top10'),
+        _sum(e.laps_led).label('laps_led'),
+    ).select_from(race_entries.join(races, e.race_id == races.c.race_id)
+    ).where(e.manufacturer_id.isnot(None) & e.driver_id.isnot(None)
+    ).group_by(e.manufacturer_id, races.c.season, races.c.series_id)
+
+
+# (таблица агрегатов, построитель SELECT)
+ROLLUPS = [
+    (driver_season_stats_table, _driver_rollup_select),
+    (team_season_stats_table, _team_rollup_select),
+    (manufacturer_season_stats_table, _manufacturer_rollup_select),
+]
+
+
+def create_rollup_tables(engine):
+    """Создаёт таблицы агрегатов, если их ещё нет."""
+    metadata.create_all(engine)
+
+
+def touched_pairs_since(connection, race_id: int) -> list:
+    """Возвращает пары (season, series_id) гонок с race_id больше указанного (новые после загрузки)."""
+    stmt = sa.select(races.c.season, races.c.series_id).where(races.c.race_id > race_id).distinct()
+    return [tuple(row) for row in connection.execute(stmt).all()]
+
+
+def refresh_season_rollups(connection, pairs=None) -> int:
+    """
+    Пересчитывает агрегаты для пар (season, series_id) из pairs (или полностью, если pairs=None).
+    Выполняется на переданном соединении — вызывающий управляет транзакцией.
+    Возвращает число записанных строк агрегатов.
+    """
+    if pairs is not None:
+        pairs = sorted({(int(season), int(series_id)) for season, series_id in pairs})
+        if not pairs:
+            return 0
+
+    written = 0
+    for table, build_select in ROLLUPS:
+        source = build_select()
+        delete_stmt = table.delete()
+        if pairs is not None:
+            delete_stmt = delete_stmt.where(sa.tuple_(table.c.season, table.c.series_id).in_(pairs))
+            source = source.where(sa.tuple_(races.c.season, races.c.series_id).in_(pairs))
+        connection.execute(delete_stmt)
+        result = connection.execute(
+            table.insert().from_select([column.name for column in table.columns], source)
+        )
+        written += max(result.rowcount or 0, 0)
+    return written
+
+
+# --- Точка входа ---
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    db_url = args.pop(0) if args and ':' in args[0] and '//' in args[0] else DEFAULT_DB_URL
+    requested_pairs = [tuple(int(part) for part in arg.split(':')) for arg in args] or None
+
+    engine = sa.create_engine(db_url)
+    create_rollup_tables(engine)
+    started = time.perf_counter()
+    with engine.begin() as connection:
+        rows = refresh_season_rollups(connection, requested_pairs)
+    scope = "полный пересчёт" if requested_pairs is None else f"пары {requested_pairs}"
+    print(f"Агрегаты обновлены ({scope}): {rows} строк за {time.perf_counter() - started:.2f} с.")
@@ -0,0 +1,168 @@
+# standings_snapshots.py
+# Таблица StandingsSnapshots: положение в чемпионате гонщиков после каждой гонки сезона
+# (season, series_id, race_num_in_season, driver_id) -> накопленные очки, победы, гонки и место.
+# Правила те же, что у рейтинга гонщиков в db_sync: учитываются записи с points IS NOT NULL,
+# порядок — очки (убыв.), победы (убыв.), имя гонщика, driver_id. Снимок после последней гонки
+# совпадает с текущим рейтингом сезона.
+#
+# Обновление инкрементальное: для пары (season, series_id) досчитываются только гонки после
+# последнего сохранённого снимка, начиная с накопленных значений этого снимка. Если изменились
+# результаты уже учтённой гонки, снимки пересчитываются с неё (from_races).
+#
+# Запуск из корня проекта:
+#   python -m data.standings_snapshots                          -> создать таблицу и досчитать все пары (SQLite из create_db.py)
+#   python -m data.standings_snapshots <DB_URL>                 -> то же для произвольной БД
+#   python -m data.standings_snapshots <DB_URL> --rebuild       -> пересчитать всё заново
+#   python -m data.standings_snapshots <DB_URL> 2025:1 2025:2   -> только указанные пары сезон:серия
+import sys
+import time
+import sqlalchemy as sa
+
+DEFAULT_DB_URL = 'sqlite:///nascar_stats.db'
+BATCH_SIZE = 5000
+
+metadata = sa.MetaData()
+
+standings_snapshots_table = sa.Table('StandingsSnapshots', metadata,
+    sa.Column('season', sa.Integer, primary_key=True),
+    sa.Column('series_id', sa.Integer, primary_key=True),
+    sa.Column('race_num_in_season', sa.Integer, primary_key=True),
+    sa.Column('driver_id', sa.Integer, primary_key=True),
+    sa.Column('cumulative_points', sa.Integer, nullable=False),
+    sa.Column('cumulative_wins', sa.Integer, nullable=False),
+    sa.Column('races_entered', sa.Integer, nullable=False),
+    sa.Column('rank', sa.Integer, nullable=False),
+    # Первичный ключ отвечает на «таблица после гонки N»; этот индекс — на «траектория места гонщика»
+    sa.Index('ix_standingssnapshots_driver', 'driver_id', 'season', 'series_id', 'race_num_in_season')
+)
+
+# --- Лёгкие описания исходных таблиц ---
+races = sa.table('Races',
+    sa.column('race_id'), sa.column('season'), sa.column('series_id'), sa.column('race_num_in_season')
+)
+race_entries = sa.table('RaceEntries',
+    sa.column('race_id'), sa.column('driver_id'), sa.column('points'), sa.column('won_race')
+)
+drivers = sa.table('Drivers', sa.column('driver_id'), sa.column('driver_name'))
+
+
+def create_snapshot_table(engine):
+    """Создаёт таблицу снимков, если её ещё нет."""
+    metadata.create_all(engine)
+
+
+def compute_pair_snapshots(connection, season: int, series_id: int, start_race: int = 1, previous: dict | None = None) -> list:
+    """
+    Снимки пары (season, series_id) для гонок с номером >= start_race.
+    previous — накопленные значения до start_race {driver_id: [очки, победы, гонки]}.
+    Возвращает список словарей строк StandingsSnapshots (без записи в БД).
+    """
+    standings = {driver_id: list(values) for driver_id, values in (previous or {}).items()}
+    race_nums = connection.execute(
+        sa.select(races.c.race_num_in_season).distinct()
+        .where((races.c.season == season) & (races.c.series_id == series_id) & (races.c.race_num_in_season >= start_race))
+        .order_by(races.c.race_num_in_season)
+    ).scalars().all()
+    if not race_nums:
+        return []
+
+    entries_by_race = {}
+    for row in connection.execute(
+        sa.select(races.c.race_num_in_season, race_entries.c.driver_id, race_entries.c.points, race_entries.c.won_race)
+        .select_from(race_entries.join(races, race_entries.c.race_id == races.c.race_id))
+        .where((races.c.season == season) & (races.c.series_id == series_id) &
+               (races.c.race_num_in_season >= start_race) &
+               race_entries.c.points.isnot(None) & race_entries.c.driver_id.isnot(None))
+    ):
+        entries_by_race.setdefault(row.race_num_in_season, []).append(row)
+
+    driver_ids = set(standings) | {row.driver_id for rows in entries_by_race.values() for row in rows}
+    names = {}
+    id_list = sorted(driver_ids)
+    for start in range(0, len(id_list), 500):
+        names.update(connection.execute(
+            sa.select(drivers.c.driver_id, drivers.c.driver_name).where(drivers.c.driver_id.in_(id_list[start:start + 500]))
+        ).all())
+
+    snapshots = []
+    for race_num in race_nums:
+        for row in entries_by_race.get(race_num, []):
+            values = standings.setdefault(row.driver_id, [0, 0, 0])
+            values[0] += row.points
+            values[1] += row.won_race or 0
+            values[2] += 1
+        order = sorted(standings, key=lambda driver_id: (-standings[driver_id][0], -standings[driver_id][1],
+                                                         names.get(driver_id) or '', driver_id))
+        snapshots.extend({
+            'season': season, 'series_id': series_id, 'race_num_in_season': race_num, 'driver_id': driver_id,
+            'cumulative_points': standings[driver_id][0], 'cumulative_wins': standings[driver_id][1],
+            'races_entered': standings[driver_id][2], 'rank': rank,
+        } for rank, driver_id in enumerate(order, 1))
+    return snapshots
+
+
+def _pairs_in_races(connection) -> list:
+    return [tuple(row) for row in connection.execute(
+        sa.select(races.c.season, races.c.series_id).distinct().order_by(races.c.season, races.c.series_id))]
+
+
+def refresh_standings_snapshots(connection, pairs=None, from_races: dict | None = None, rebuild: bool = False) -> int:
+    """
+    Досчитывает снимки для пар (season, series_id) из pairs (None — все пары из Races).
+    from_races — {(season, series_id): номер гонки}, начиная с которого снимки пересчитываются
+    (изменились результаты уже учтённых гонок); rebuild — пересчитать пары целиком.
+    Выполняется на переданном соединении — вызывающий управляет транзакцией. Возвращает число записанных строк.
+    """
+    snapshots = standings_snapshots_table
+    from_races = {(int(season), int(series_id)): int(race_num) for (season, series_id), race_num in (from_races or {}).items()}
+    pairs = _pairs_in_races(connection) if pairs is None else sorted({(int(s), int(sid)) for s, sid in pairs} | set(from_races))
+
+    written = 0
+    for season, series_id in pairs:
+        in_pair = (snapshots.c.season == season) & (snapshots.c.series_id == series_id)
+        last_race = connection.execute(sa.select(sa.func.max(snapshots.c.race_num_in_season)).where(in_pair)).scalar()
+        if rebuild or last_race is None:
+            start_race = 1
+        elif (season, series_id) in from_races:
+            start_race = min(from_races[(season, series_id)], last_race + 1)
+        else:
+            start_race = last_race + 1
+
+        connection.execute(snapshots.delete().where(in_pair & (snapshots.c.race_num_in_season >= start_race)))
+        previous = {}
+        base_race = connection.execute(
+            sa.select(sa.func.max(snapshots.c.race_num_in_season)).where(in_pair & (snapshots.c.race_num_in_season < start_race))
+        ).scalar()
+        if base_race is not None:
+            previous = {row.driver_id: [row.cumulative_points, row.cumulative_wins, row.races_entered]
+                        for row in connection.execute(sa.select(snapshots).where(in_pair & (snapshots.c.race_num_in_season == base_race)))}
+
+        rows = compute_pair_snapshots(connection, season, series_id, start_race, previous)
+        for start in range(0, len(rows), BATCH_SIZE):
+            connection.execute(snapshots.insert(), rows[start:start + BATCH_SIZE])
+        written += len(rows)
+    return written
+
+
+def first_races_since_entry(connection, entry_id: int) -> dict:
+    """{(season, series_id): минимальный номер гонки} для записей RaceEntries с entry_id >= указанного."""
+    entries = sa.table('RaceEntries', sa.column('entry_id'), sa.column('race_id'))
+    stmt = sa.select(races.c.season, races.c.series_id, sa.func.min(races.c.race_num_in_season)) \
+        .select_from(entries.join(races, entries.c.race_id == races.c.race_id)) \
+        .where(entries.c.entry_id >= entry_id).group_by(races.c.season, races.c.series_id)
+    return {(season, series_id): race_num for season, series_id, race_num in connection.execute(stmt)}
+
+
+# --- Точка входа ---
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    db_url = args.pop(0) if args and ':' in args[0] and '//' in args[0] else DEFAULT_DB_URL
+    requested_pairs = [tuple(int(part) for part in arg.split(':')) for arg in args] or None
+
+    engine = sa.create_engine(db_url)
+    create_snapshot_table(engine)
+    started = time.perf_counter()
+    with engine.begin() as connection:
+        rows = refresh_standings_snapshots(connection, requested_pairs, rebuild='--rebuild' in sys.argv)
+    scope = "все пары" if requested_pairs is None else f"пары {requested_pairs}"
+    print(f"Снимки положения обновлены ({scope}): {rows} строк за {time.perf_counter() - started:.2f} с.")
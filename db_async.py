@@ -0,0 +1,164 @@
+import asyncio
+import functools
+import logging
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+import db_config
+import db_sync
+
+logger = logging.getLogger(__name__)
+
+# Асинхронный доступ к данным: те же функции, что и в db_sync, но как корутины.
+# Каждая корутина открывает свою AsyncSession и выполняет синхронную функцию db_sync
+# через run_sync — SQL, кэши и снимок общие, а ожидание ответа БД не блокирует цикл событий,
+# поэтому независимые запросы (детали + результаты по гонкам) идут одновременно.
+#
+# Драйверы: asyncpg для PostgreSQL, aiosqlite для SQLite (ставятся отдельно).
+# Интеграция с Qt — через qasync (см. main.py): если он не установлен, виды используют QThread.
+
+# Синхронный драйвер -> асинхронный
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+# Асинхронные движки по строке подключения: свой для реплики чтения и для основной БД
+_async_engines = {} # async URL -> (движок, фабрика сессий)
+
+
+def async_url(url) -> str:
+    """Переводит строку подключения db_sync на асинхронный драйвер того же диалекта."""
+    url = make_url(url)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        raise ValueError(f"Для диалекта '{url.get_backend_name()}' нет асинхронного драйвера.")
+    return url.set(drivername=driver).render_as_string(hide_password=False)
+
+
+def _routed(route: str = 'read') -> tuple:
+    """
+    (движок, фабрика AsyncSession) для маршрута route: та же БД, что выбирает db_sync.ROUTER
+    для синхронных запросов (реплика чтения или — при отставании, обрыве, ожидании записи —
+    основная БД), с теми же настройками пула. Движки создаются по одному на БД; движки БД,
+    на которые db_sync.configure_engine больше не указывает, забываются.
+    """
+    target = db_sync.ROUTER.engine_for(route)
+    url = async_url(target.url)
+    current = {async_url(db_sync.engine.url), async_url(db_sync.write_engine.url)}
+    for stale_url in [known for known in _async_engines if known not in current]:
+        # Старый движок не закрываем здесь (нужен await) — его соединения закроет сборщик мусора
+        del _async_engines[stale_url]
+    if url not in _async_engines:
+        async_engine = create_async_engine(url, echo=False, **db_config.engine_kwargs(db_sync.ENGINE_SETTINGS, url))
+        _async_engines[url] = (async_engine, async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False))
+        db_sync.QUERY_METRICS.attach(async_engine.sync_engine)
+        if target is db_sync.ROUTER.read_engine:
+            db_sync.ROUTER.watch_engine(async_engine.sync_engine)
+        logger.info(f"Создан асинхронный движок: {async_engine.url.render_as_string(hide_password=True)}")
+    return _async_engines[url]
+
+
+def get_async_engine(route: str = 'read'):
+    """Асинхронный движок текущей цели маршрута route (см. _routed)."""
+    return _routed(route)[0]
+
+
+async def dispose():
+    """Закрывает соединения асинхронных движков (при выходе из приложения)."""
+    engines = [async_engine for async_engine, _ in _async_engines.values()]
+    _async_engines.clear()
+    for async_engine in engines:
+        await async_engine.dispose()
+
+
+def _call_with_session(sync_session, func, args, kwargs):
+    # Выполняется внутри run_sync: get_db_session в db_sync вернёт эту сессию
+    with db_sync.use_session(sync_session):
+        return func(*args, **kwargs)
+
+
+def _mirror(func):
+    """Асинхронная обёртка над функцией чтения db_sync с той же сигнатурой."""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        async with _routed()[1]() as session:
+            return await session.run_sync(_call_with_session, func, args, kwargs)
+    return wrapper
+
+
+# --- Функции чтения (те же имена и аргументы, что в db_sync) ---
+get_races_for_season = _mirror(db_sync.get_races_for_season)
+get_races_for_season_after = _mirror(db_sync.get_races_for_season_after)
+get_race_details_and_results = _mirror(db_sync.get_race_details_and_results)
+get_driver_standings = _mirror(db_sync.get_driver_standings)
+get_driver_standings_after = _mirror(db_sync.get_driver_standings_after)
+get_driver_season_details = _mirror(db_sync.get_driver_season_details)
+get_driver_race_results_for_season = _mirror(db_sync.get_driver_race_results_for_season)
+get_team_standings = _mirror(db_sync.get_team_standings)
+get_team_standings_after = _mirror(db_sync.get_team_standings_after)
+get_team_season_details = _mirror(db_sync.get_team_season_details)
+get_manufacturer_season_stats = _mirror(db_sync.get_manufacturer_season_stats)
+get_overall_driver_stats = _mirror(db_sync.get_overall_driver_stats)
+get_overall_team_stats = _mirror(db_sync.get_overall_team_stats)
+get_overall_manufacturer_stats = _mirror(db_sync.get_overall_manufacturer_stats)
+get_driver_standings_progression = _mirror(db_sync.get_driver_standings_progression)
+get_team_race_results_for_season = _mirror(db_sync.get_team_race_results_for_season)
+get_manufacturer_wins_by_season = _mirror(db_sync.get_manufacturer_wins_by_season)
+get_all_drivers_list = _mirror(db_sync.get_all_drivers_list)
+get_all_teams_list = _mirror(db_sync.get_all_teams_list)
+get_all_manufacturers_list = _mirror(db_sync.get_all_manufacturers_list)
+get_latest_season = _mirror(db_sync.get_latest_season)
+
+# --- Пакетные варианты ---
+get_driver_season_details_many = _mirror(db_sync.get_driver_season_details_many)
+get_team_season_details_many = _mirror(db_sync.get_team_season_details_many)
+get_overall_driver_stats_many = _mirror(db_sync.get_overall_driver_stats_many)
+get_overall_team_stats_many = _mirror(db_sync.get_overall_team_stats_many)
+get_overall_manufacturer_stats_many = _mirror(db_sync.get_overall_manufacturer_stats_many)
+get_driver_race_results_for_season_many = _mirror(db_sync.get_driver_race_results_for_season_many)
+get_team_race_results_for_season_many = _mirror(db_sync.get_team_race_results_for_season_many)
+
+
+async def get_series_id_by_name(series_name: str) -> int | None:
+    """Асинхронный вариант db_sync.get_series_id_by_name (сессия создаётся внутри)."""
+    async with _routed()[1]() as session:
+        return await session.run_sync(db_sync.get_series_id_by_name, series_name)
+
+
+# --- Интеграция с циклом событий Qt (qasync) ---
+
+def has_running_loop() -> bool:
+    """True, если в текущем потоке работает цикл asyncio (в GUI — QEventLoop из qasync)."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        # qasync запускает цикл через run_forever: в обработчиках Qt он не «текущий», но установлен
+        try:
+            return asyncio.get_event_loop_policy().get_event_loop().is_running()
+        except RuntimeError:
+            return False
+    return True
+
+
+def schedule(coro, on_result, on_error=None) -> asyncio.Task:
+    """
+    Запускает корутину в цикле событий и вызывает on_result(результат) или
+    on_error(текст ошибки) в том же (GUI) потоке, когда она завершится.
+    """
+    task = asyncio.ensure_future(coro)
+
+    def _done(finished: asyncio.Task):
+        if finished.cancelled():
+            return
+        error = finished.exception()
+        if error is None:
+            on_result(finished.result())
+        else:
+            logger.error(f"Ошибка асинхронной загрузки: {error}", exc_info=error)
+            if on_error is not None:
+                on_error(str(error))
+
+    task.add_done_callback(_done)
+    return task
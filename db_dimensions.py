@@ -0,0 +1,122 @@
+import logging
+import threading
+import time
+
+from db_search import SearchIndex
+
+logger = logging.getLogger(__name__)
+
+
+class Dimension:
+    """Содержимое одного справочника: id <-> имя, имена сравниваются без учета регистра."""
+
+    def __init__(self, rows):
+        # rows — пары (id, имя) в порядке, в котором их вернула БД (ORDER BY имя)
+        self.rows = [(row_id, name) for row_id, name in rows]
+        self.id_to_name = dict(self.rows)
+        self.name_to_id = {}
+        for row_id, name in self.rows:
+            if name is None:
+                continue
+            # При совпадении имён без учета регистра оставляем первое
+            self.name_to_id.setdefault(name.casefold(), row_id)
+        self._search_index = None
+
+    def get_id(self, name: str) -> int | None:
+        if name is None:
+            return None
+        return self.name_to_id.get(name.casefold())
+
+    def get_name(self, row_id: int) -> str | None:
+        return self.id_to_name.get(row_id)
+
+    @property
+    def search_index(self) -> SearchIndex:
+        # Строится при первом поиске: справочники, по которым не ищут, индекс не занимают
+        if self._search_index is None:
+            self._search_index = SearchIndex(self.rows)
+        return self._search_index
+
+
+class DimensionCache:
+    """
+    Кэш небольших справочников (Series, Drivers, Teams, Manufacturers) на весь процесс.
+    Каждый справочник загружается один раз через load_rows(ключ) и сбрасывается целиком,
+    когда get_version() возвращает новую версию данных. Версия проверяется не чаще,
+    чем раз в check_interval секунд.
+    """
+
+    def __init__(self, load_rows, get_version, check_interval: float = 60.0):
+        self._load_rows = load_rows
+        self._get_version = get_version
+        self.check_interval = check_interval
+        self._dimensions = {}
+        self._version = None
+        self._checked_at = None
+        self._generation = 0 # Растёт при каждом сбросе: загруженное до сброса в кэш не попадает
+        self._lock = threading.RLock() # Только для полей кэша — запросы к БД идут без неё
+
+    def invalidate(self):
+        """Сбрасывает все справочники и версию."""
+        with self._lock:
+            self._dimensions.clear()
+            self._version = None
+            self._checked_at = None
+            self._generation += 1
+
+    def _check_version(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.check_interval:
+                return
+            self._checked_at = now
+        version = self._get_version()
+        if version is None:
+            # Версию получить не удалось — оставляем то, что есть
+            return
+        with self._lock:
+            if version != self._version:
+                if self._version is not None:
+                    logger.info(f"Версия данных изменилась ({self._version} -> {version}), сброс справочников.")
+                self._dimensions.clear()
+                self._version = version
+                self._generation += 1
+
+    def get(self, key: str) -> Dimension | None:
+        """Возвращает справочник по ключу (имени таблицы), загружая его при необходимости."""
+        self._check_version()
+        with self._lock:
+            dimension = self._dimensions.get(key)
+            generation = self._generation
+        if dimension is not None:
+            return dimension
+        rows = self._load_rows(key)
+        if rows is None:
+            return None
+        dimension = Dimension(rows)
+        with self._lock:
+            if self._generation != generation:
+                return dimension # Кэш сброшен во время загрузки: строки могли устареть, не запоминаем
+            if key in self._dimensions:
+                return self._dimensions[key] # Другой поток успел загрузить тот же справочник
+            self._dimensions[key] = dimension
+        logger.info(f"Справочник {key} загружен в кэш: {len(dimension.rows)} записей.")
+        return dimension
+
+    def get_id(self, key: str, name: str) -> int | None:
+        dimension = self.get(key)
+        return dimension.get_id(name) if dimension is not None else None
+
+    def get_name(self, key: str, row_id: int) -> str | None:
+        dimension = self.get(key)
+        return dimension.get_name(row_id) if dimension is not None else None
+
+    def search(self, key: str, query: str, limit: int = 20) -> list:
+        """Нечёткий поиск по справочнику (см. db_search.SearchIndex): список SearchMatch."""
+        dimension = self.get(key)
+        return dimension.search_index.search(query, limit) if dimension is not None else []
+
+    def get_rows(self, key: str) -> list | None:
+        """Возвращает копию списка (id, имя) — вызывающий может её изменять."""
+        dimension = self.get(key)
+        return list(dimension.rows) if dimension is not None else None
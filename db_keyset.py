@@ -0,0 +1,94 @@
+import base64
+import json
+import logging
+from decimal import Decimal
+
+from sqlalchemy import and_, or_, asc, desc
+
+logger = logging.getLogger(__name__)
+
+# Ключ сортировки для keyset-пагинации: список (имя, выражение SQLAlchemy, по убыванию?).
+# Последним ключом должен идти уникальный столбец (id), иначе при равных значениях строки
+# на границе страниц могут потеряться или повториться.
+
+
+def _to_json_value(value):
+    """Приводит значение ключа к виду, который переживёт JSON (Decimal из PostgreSQL -> int/float)."""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return value
+
+
+def encode_cursor(scope: list, values: list) -> str:
+    """Кодирует значения ключа последней строки страницы в непрозрачный токен продолжения."""
+    payload = json.dumps({'s': scope, 'k': [_to_json_value(value) for value in values]}, ensure_ascii=False)
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(token: str, scope: list) -> list:
+    """
+    Декодирует токен продолжения и возвращает значения ключа.
+    Бросает ValueError, если токен повреждён или выдан для другого запроса (сезона/серии).
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode('ascii')).decode('utf-8'))
+        token_scope, values = payload['s'], payload['k']
+    except Exception as e:
+        raise ValueError(f"Некорректный токен продолжения: {e}") from None
+    if token_scope != scope:
+        raise ValueError(f"Токен продолжения выдан для другого запроса ({token_scope} != {scope}).")
+    return values
+
+
+def order_by_clauses(order_keys: list) -> list:
+    """ORDER BY по ключу сортировки."""
+    return [desc(column) if descending else asc(column) for _, column, descending in order_keys]
+
+
+def seek_condition(order_keys: list, values: list):
+    """
+    Условие «строго после строки с ключом values» для ORDER BY order_keys.
+    Направления сортировки смешанные, поэтому вместо сравнения кортежей используется
+    раскрытие (a < x) OR (a = x AND b > y) OR ...
+    """
+    alternatives = []
+    for position, (_, column, descending) in enumerate(order_keys):
+        equal_prefix = [key_column == value for (_, key_column, _), value in zip(order_keys[:position], values)]
+        step = column < values[position] if descending else column > values[position]
+        alternatives.append(and_(*equal_prefix, step))
+    return or_(*alternatives)
+
+
+def row_key(row, order_keys: list) -> list:
+    """Значения ключа сортировки из строки результата (по именам ключей)."""
+    return [getattr(row, name) for name, _, _ in order_keys]
+
+
+def seek_rows(rows: list, order_keys: list, values: list | None, page_size: int) -> list:
+    """
+    Та же keyset-пагинация для списка уже отсортированных строк в памяти (снимок):
+    возвращает до page_size + 1 строк строго после ключа values.
+    """
+    start = 0
+    if values is not None:
+        for start, row in enumerate(rows):
+            if _is_after(row_key(row, order_keys), values, order_keys):
+                break
+        else:
+            return []
+    return rows[start:start + page_size + 1]
+
+
+def _is_after(row_values: list, values: list, order_keys: list) -> bool:
+    for row_value, value, (_, _, descending) in zip(row_values, values, order_keys):
+        if row_value != value:
+            return row_value < value if descending else row_value > value
+    return False
+
+
+def split_page(rows: list, order_keys: list, page_size: int, scope: list) -> tuple:
+    """Отрезает лишнюю (page_size + 1)-ю строку и формирует токен следующей страницы (или None)."""
+    if len(rows) <= page_size:
+        return list(rows), None
+    page = list(rows[:page_size])
+    return page, encode_cursor(scope, row_key(page[-1], order_keys))
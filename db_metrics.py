@@ -0,0 +1,199 @@
+import bisect
+import contextvars
+import functools
+import logging
+import threading
+import time
+
+from sqlalchemy import event
+
+from db_query_cache import estimate_size
+
+logger = logging.getLogger(__name__)
+slow_logger = logging.getLogger('nastats.slow_queries') # Отдельный журнал медленных запросов
+
+# Замеры функций чтения db_sync: время вызова (wall), время в БД (сумма execute курсора),
+# число возвращённых строк и оценка объёма результата. Значения копятся в гистограммах
+# в памяти процесса; вызовы и SQL-запросы дольше порога пишутся в журнал медленных запросов.
+
+# Границы корзин гистограмм (мс): ноль и геометрическая прогрессия от 0.05 мс до ~2 мин
+_BUCKETS_MS = [0.0] + [0.05 * 1.25 ** i for i in range(67)]
+
+# Текущий замеряемый вызов (для учёта времени SQL, выполненного внутри него)
+_CURRENT_CALL = contextvars.ContextVar('nastats_current_call', default=None)
+
+
+class Histogram:
+    """Гистограмма с логарифмическими корзинами: количество, сумма, максимум и перцентили."""
+
+    def __init__(self, bounds=_BUCKETS_MS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, p: float) -> float:
+        """Верхняя граница корзины, в которую попадает p-й перцентиль (не больше максимума)."""
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                bound = self.bounds[index] if index < len(self.bounds) else self.max
+                return min(bound, self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+class _CallStats:
+    def __init__(self):
+        self.wall_ms = Histogram()
+        self.db_ms = Histogram()
+        self.rows = Histogram(bounds=[0] + [2 ** i for i in range(24)])
+        self.bytes = Histogram(bounds=[0] + [2 ** i for i in range(10, 34)])
+        self.errors = 0
+
+
+def _count_rows(value) -> int:
+    """Число строк результата: длина списка/словаря (в том числе первого элемента кортежа (список, страница, ...))."""
+    if isinstance(value, tuple) and not hasattr(value, '_fields') and value and isinstance(value[0], (list, dict)):
+        return sum(_count_rows(item) for item in value if isinstance(item, (list, dict)))
+    if isinstance(value, (list, dict)):
+        return len(value)
+    return 0 if value is None else 1
+
+
+class QueryMetrics:
+    """Гистограммы по функциям и по SQL-запросам, журнал медленных запросов."""
+
+    def __init__(self, slow_threshold_ms: float = 500.0, enabled: bool = True):
+        self.slow_threshold_ms = slow_threshold_ms
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._functions = {}
+        self._statements = {}
+
+    def reset(self):
+        with self._lock:
+            self._functions.clear()
+            self._statements.clear()
+
+    def set_slow_log(self, path: str | None):
+        """Пишет журнал медленных запросов в файл path (кроме общего лога)."""
+        if not path:
+            return
+        handler = logging.FileHandler(path, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+        slow_logger.addHandler(handler)
+        slow_logger.setLevel(logging.INFO)
+
+    # --- Функции ---
+
+    def _record_call(self, name: str, wall_ms: float, db_ms: float, result, failed: bool):
+        rows = _count_rows(result)
+        size = estimate_size(result) if result is not None else 0
+        with self._lock:
+            stats = self._functions.get(name)
+            if stats is None:
+                stats = self._functions[name] = _CallStats()
+            stats.wall_ms.add(wall_ms)
+            stats.db_ms.add(db_ms)
+            stats.rows.add(rows)
+            stats.bytes.add(size)
+            if failed:
+                stats.errors += 1
+        if wall_ms >= self.slow_threshold_ms:
+            slow_logger.warning(f"Медленный вызов {name}: {wall_ms:.1f} мс (БД {db_ms:.1f} мс), строк {rows}, ~{size // 1024} КБ")
+
+    def instrument(self, func):
+        """Декоратор: замеряет вызовы функции чтения."""
+        name = func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not self.enabled:
+                return func(*args, **kwargs)
+            call = {'db_ms': 0.0}
+            parent = _CURRENT_CALL.get()
+            token = _CURRENT_CALL.set(call)
+            started = time.perf_counter()
+            result, failed = None, True
+            try:
+                result = func(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                wall_ms = (time.perf_counter() - started) * 1000
+                _CURRENT_CALL.reset(token)
+                if parent is not None:
+                    parent['db_ms'] += call['db_ms']
+                self._record_call(name, wall_ms, call['db_ms'], result, failed)
+        return wrapper
+
+    # --- SQL-запросы ---
+
+    def attach(self, engine):
+        """Подписывается на выполнение запросов движка (время execute на курсоре)."""
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self.enabled and context is not None:
+            context._nastats_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_nastats_started', None)
+        if started is None:
+            return
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        call = _CURRENT_CALL.get()
+        if call is not None:
+            call['db_ms'] += elapsed_ms
+        key = ' '.join(statement.split())[:300]
+        with self._lock:
+            histogram = self._statements.get(key)
+            if histogram is None:
+                histogram = self._statements[key] = Histogram()
+            histogram.add(elapsed_ms)
+        if elapsed_ms >= self.slow_threshold_ms:
+            slow_logger.warning(f"Медленный SQL: {elapsed_ms:.1f} мс, параметры {parameters!r:.200}\n{key}")
+
+    # --- Отчёты ---
+
+    def function_summary(self) -> list[dict]:
+        """Сводка по функциям (по убыванию p95 времени вызова)."""
+        with self._lock:
+            rows = [{
+                'function': name,
+                'calls': stats.wall_ms.count,
+                'errors': stats.errors,
+                'wall_p50_ms': stats.wall_ms.percentile(50),
+                'wall_p95_ms': stats.wall_ms.percentile(95),
+                'wall_max_ms': stats.wall_ms.max,
+                'db_p50_ms': stats.db_ms.percentile(50),
+                'db_p95_ms': stats.db_ms.percentile(95),
+                'rows_avg': stats.rows.mean,
+                'bytes_avg': stats.bytes.mean,
+            } for name, stats in self._functions.items()]
+        return sorted(rows, key=lambda row: row['wall_p95_ms'], reverse=True)
+
+    def statement_summary(self, limit: int = 20) -> list[dict]:
+        """Самые долгие SQL-запросы по p95."""
+        with self._lock:
+            rows = [{
+                'statement': key, 'count': histogram.count,
+                'p50_ms': histogram.percentile(50), 'p95_ms': histogram.percentile(95), 'max_ms': histogram.max,
+            } for key, histogram in self._statements.items()]
+        return sorted(rows, key=lambda row: row['p95_ms'], reverse=True)[:limit]
@@ -0,0 +1,130 @@
+import logging
+import threading
+import time
+
+from sqlalchemy import event, text
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+
+class PoolMetrics:
+    """
+    Метрики пула соединений движка: новые подключения, выдачи, возвраты, инвалидации,
+    сколько соединений сейчас выдано и сколько времени ждали получения соединения.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.connects = 0
+            self.checkouts = 0
+            self.checkins = 0
+            self.invalidations = 0
+            self.checked_out = 0
+            self.max_checked_out = 0
+            self.wait_count = 0
+            self.wait_total = 0.0
+            self.wait_max = 0.0
+
+    def attach(self, engine):
+        """Подписывается на события пула движка."""
+        event.listen(engine, 'connect', self._on_connect)
+        event.listen(engine, 'checkout', self._on_checkout)
+        event.listen(engine, 'checkin', self._on_checkin)
+        event.listen(engine, 'invalidate', self._on_invalidate)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.checkins += 1
+            self.checked_out = max(self.checked_out - 1, 0)
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidations += 1
+        logger.warning(f"Соединение с БД признано недействительным: {exception}")
+
+    def record_wait(self, seconds: float):
+        """Время получения соединения из пула (ожидание свободного или подключение нового)."""
+        with self._lock:
+            self.wait_count += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+
+    def snapshot(self, pool=None) -> dict:
+        """Текущие значения метрик (и состояние пула, если передан)."""
+        with self._lock:
+            data = {
+                'connects': self.connects,
+                'checkouts': self.checkouts,
+                'checkins': self.checkins,
+                'invalidations': self.invalidations,
+                'checked_out': self.checked_out,
+                'max_checked_out': self.max_checked_out,
+                'wait_avg_ms': round(self.wait_total / self.wait_count * 1000, 2) if self.wait_count else 0.0,
+                'wait_max_ms': round(self.wait_max * 1000, 2),
+            }
+        if pool is not None:
+            data['pool_status'] = pool.status()
+        return data
+
+
+def timed_queue_pool(metrics: PoolMetrics):
+    """Класс QueuePool, который записывает в metrics время получения каждого соединения."""
+
+    class TimedQueuePool(QueuePool):
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                return super()._do_get()
+            finally:
+                metrics.record_wait(time.perf_counter() - started)
+
+    return TimedQueuePool
+
+
+def warm_up(engine, connections: int) -> int:
+    """
+    Открывает одновременно до connections соединений и возвращает их в пул,
+    чтобы первые запросы видов не платили за подключение и TLS. Возвращает число открытых.
+    """
+    opened = []
+    try:
+        for _ in range(connections):
+            connection = engine.connect()
+            opened.append(connection)
+            connection.execute(text('SELECT 1'))
+    except Exception as e:
+        logger.warning(f"Прогрев пула остановлен после {len(opened)} соединений: {e}")
+    finally:
+        for connection in opened:
+            connection.close()
+    return len(opened)
+
+
+def start_warm_up(engine, connections: int) -> threading.Thread | None:
+    """Запускает прогрев пула в фоновом потоке."""
+    if connections <= 0:
+        return None
+
+    def _run():
+        started = time.perf_counter()
+        opened = warm_up(engine, connections)
+        logger.info(f"Прогрев пула: открыто {opened} соединений за {time.perf_counter() - started:.2f} с.")
+
+    thread = threading.Thread(target=_run, name='db-pool-warmup', daemon=True)
+    thread.start()
+    return thread
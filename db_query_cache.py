@@ -0,0 +1,213 @@
+import functools
+import inspect
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def _freeze(value):
+    """Приводит аргументы к хешируемому виду (списки id -> кортежи)."""
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = sorted(value, key=repr) if isinstance(value, (set, frozenset)) else value
+        return tuple(_freeze(item) for item in items)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    return value
+
+
+def estimate_size(value, depth: int = 0) -> int:
+    """Грубая оценка занимаемой памяти (байты): контейнеры обходятся на несколько уровней вглубь."""
+    size = sys.getsizeof(value)
+    if depth > 3 or isinstance(value, (str, bytes, int, float, type(None))):
+        return size
+    if isinstance(value, dict):
+        return size + sum(estimate_size(k, depth + 1) + estimate_size(v, depth + 1) for k, v in value.items())
+    if isinstance(value, (list, tuple)) or hasattr(value, '_mapping'):
+        return size + sum(estimate_size(item, depth + 1) for item in value)
+    return size
+
+
+def _copy_result(value, depth: int = 0):
+    """
+    Копия контейнеров результата (на пару уровней): модели таблиц сортируют переданный
+    список на месте, а виды могут дописывать ключи в словари — кэшированный экземпляр
+    не должен меняться. Строки результата (Row, namedtuple) неизменяемы и не копируются.
+    """
+    if depth > 2:
+        return value
+    if isinstance(value, list):
+        return [_copy_result(item, depth + 1) for item in value]
+    if isinstance(value, dict):
+        return type(value)((key, _copy_result(item, depth + 1)) for key, item in value.items())
+    if isinstance(value, tuple) and not hasattr(value, '_fields'):
+        return tuple(_copy_result(item, depth + 1) for item in value)
+    return value
+
+
+def _is_empty(value) -> bool:
+    """Пустые результаты (в т.ч. ([], 1, 1)) не кэшируются: так же выглядят и ошибки запроса."""
+    if isinstance(value, tuple) and not hasattr(value, '_fields') and value:
+        return _is_empty(value[0])
+    return not value
+
+
+class QueryCache:
+    """
+    Кэш результатов функций чтения: ключ — (функция, аргументы), вытеснение LRU
+    по числу записей и оценке памяти, свой TTL у каждой функции. Весь кэш сбрасывается,
+    когда get_version() возвращает новую версию данных (проверяется не чаще, чем
+    раз в check_interval секунд). on_invalidate — функции, вызываемые при сбросе.
+    """
+
+    def __init__(self, get_version, max_entries: int = 512, max_bytes: int = 64 * 1024 * 1024,
+                 check_interval: float = 30.0, enabled: bool = True, on_invalidate=None):
+        self._get_version = get_version
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.check_interval = check_interval
+        self.enabled = enabled
+        self._on_invalidate = list(on_invalidate or [])
+        self._entries = OrderedDict() # ключ -> (срок годности, размер, значение)
+        self._bytes = 0
+        self._version = None
+        self._checked_at = None
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def add_invalidation_listener(self, callback):
+        self._on_invalidate.append(callback)
+
+    def clear(self):
+        """Сбрасывает все записи и вызывает подписчиков on_invalidate."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        for callback in self._on_invalidate:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Ошибка обработчика сброса кэша: {e}", exc_info=True)
+
+    def invalidate_matching(self, predicate) -> int:
+        """
+        Удаляет только записи, для которых predicate(имя функции, {аргумент: значение}) истинно,
+        и запоминает текущую версию данных, чтобы плановая проверка не сбросила кэш целиком.
+        Подписчики on_invalidate не вызываются. Возвращает число удалённых записей.
+        """
+        version = self._get_version()
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key[0], dict(key[1]))]
+            for key in keys:
+                self._bytes -= self._entries.pop(key)[1]
+            if version is not None:
+                self._version = version
+                self._checked_at = time.monotonic()
+        return len(keys)
+
+    def discard(self, function_name: str) -> int:
+        """Удаляет все записи одной функции (версия данных не меняется). Возвращает их число."""
+        with self._lock:
+            keys = [key for key in self._entries if key[0] == function_name]
+            for key in keys:
+                self._bytes -= self._entries.pop(key)[1]
+        return len(keys)
+
+    def lookup(self, function_name: str, arguments: dict):
+        """
+        Явное чтение записи (для кэшей, которым не подходит декоратор cached):
+        (True, копия значения) или (False, None). Версия данных проверяется так же, как в cached.
+        """
+        if not self.enabled:
+            return False, None
+        self._check_version()
+        found, value = self._get((function_name, _freeze(tuple(arguments.items()))))
+        if not found:
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        return True, _copy_result(value)
+
+    def store(self, function_name: str, arguments: dict, value, ttl: float):
+        """Явная запись значения под ключом (function_name, arguments); пустые значения не хранятся."""
+        if self.enabled and not _is_empty(value):
+            self._put((function_name, _freeze(tuple(arguments.items()))), _copy_result(value), ttl)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes,
+                    'hits': self.hits, 'misses': self.misses, 'version': self._version}
+
+    def _check_version(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.check_interval:
+                return
+            self._checked_at = now
+        version = self._get_version()
+        if version is None:
+            return # Версию получить не удалось — оставляем то, что есть
+        with self._lock:
+            changed = version != self._version
+            previous, self._version = self._version, version
+        if changed and previous is not None:
+            logger.info(f"Версия данных изменилась ({previous} -> {version}), сброс кэша запросов.")
+            self.clear()
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            expires_at, size, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self._bytes -= size
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def _put(self, key, value, ttl: float):
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (time.monotonic() + ttl, size, value)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def cached(self, ttl: float):
+        """Декоратор: кэширует непустые результаты функции на ttl секунд."""
+        def decorator(func):
+            signature = inspect.signature(func)
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                self._check_version()
+                # Позиционные и именованные вызовы с одинаковыми значениями дают один ключ
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                key = (func.__name__, _freeze(tuple(bound.arguments.items())))
+                found, value = self._get(key)
+                if found:
+                    self.hits += 1
+                    return _copy_result(value)
+                self.misses += 1
+                value = func(*args, **kwargs)
+                if not _is_empty(value):
+                    self._put(key, _copy_result(value), ttl)
+                return value
+            wrapper.uncached = func
+            return wrapper
+        return decorator
@@ -0,0 +1,266 @@
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+
+import sqlalchemy as sa
+from sqlalchemy import event
+
+from data import create_db, season_rollups, standings_snapshots, migrations
+
+logger = logging.getLogger(__name__)
+
+# Локальная копия БД (SQLite в режиме WAL) со схемой data/create_db.py.
+# Синхронизация сравнивает копию с основной БД:
+#   - справочники и Races (их тысячи строк) — построчно: новые строки вставляются, изменённые на месте
+#     (загрузчик переименовывает гонки, меняет трассу, дополняет данные трасс) обновляются, удалённые удаляются;
+#   - RaceEntries — по отпечатку каждой гонки (число записей и суммы id и ключевых столбцов):
+#     записи гонок с другим отпечатком копируются заново (загрузчик заменяет записи изменённых гонок).
+# Затем пересчитываются агрегаты и снимки положения затронутых пар (сезон, серия).
+
+# Порядок копирования: сначала справочники, затем гонки и записи (таблица, столбец id)
+_SYNC_TABLES = [
+    (create_db.series_table, 'series_id'),
+    (create_db.tracks_table, 'track_id'),
+    (create_db.drivers_table, 'driver_id'),
+    (create_db.teams_table, 'team_id'),
+    (create_db.manufacturers_table, 'manufacturer_id'),
+    (create_db.races_table, 'race_id'),
+    (create_db.race_entries_table, 'entry_id'),
+]
+_ROW_TABLES = _SYNC_TABLES[:-1] # Сравниваются построчно
+_BATCH_SIZE = 5000
+_RACE_CHUNK_SIZE = 500 # Гонок в одном запросе копирования записей
+# Столбцы RaceEntries, суммы которых входят в отпечаток гонки
+_FINGERPRINT_COLUMNS = ['entry_id', 'driver_id', 'team_id', 'manufacturer_id', 'start_position',
+                        'finish_position', 'points', 'laps_completed', 'laps_led', 'won_race']
+
+_state_metadata = sa.MetaData()
+replica_state_table = sa.Table('ReplicaSyncState', _state_metadata,
+    sa.Column('key', sa.String(50), primary_key=True),
+    sa.Column('value', sa.String(255))
+)
+
+
+def enable_wal(engine):
+    """Включает WAL для SQLite-движка: чтение не блокируется фоновой записью синхронизации."""
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute('PRAGMA busy_timeout=30000')
+        cursor.close()
+
+
+def _source_table(table):
+    """Лёгкое описание той же таблицы в основной БД (без привязки к типам SQLite)."""
+    return sa.table(table.name, *[sa.column(column.name) for column in table.columns])
+
+
+def _rows_by_id(connection, table, id_column_name: str) -> dict:
+    """id -> кортеж значений всех столбцов таблицы (в порядке table.columns)."""
+    source = _source_table(table)
+    stmt = sa.select(*[source.c[column.name] for column in table.columns])
+    return {row._mapping[id_column_name]: tuple(row) for row in connection.execute(stmt)}
+
+
+def _sync_rows(source_connection, replica_connection, table, id_column_name: str) -> tuple[dict, dict]:
+    """
+    Вставляет новые и обновляет изменённые строки таблицы копии.
+    Возвращает (изменённые и новые строки {id: (прежняя строка или None, новая строка)}, строки,
+    которых больше нет в основной БД {id: прежняя строка}) — удаляет их вызывающий, после записей гонок.
+    """
+    source_rows = _rows_by_id(source_connection, table, id_column_name)
+    local_rows = _rows_by_id(replica_connection, table, id_column_name)
+    changed = {row_id: (local_rows.get(row_id), row) for row_id, row in source_rows.items() if local_rows.get(row_id) != row}
+    names = [column.name for column in table.columns]
+    inserted = [dict(zip(names, row)) for old, row in changed.values() if old is None]
+    updated = [{f'b_{name}': value for name, value in zip(names, row)}
+               for old, row in changed.values() if old is not None]
+    for start in range(0, len(inserted), _BATCH_SIZE):
+        replica_connection.execute(table.insert(), inserted[start:start + _BATCH_SIZE])
+    if updated:
+        replica_connection.execute(
+            table.update().where(table.c[id_column_name] == sa.bindparam(f'b_{id_column_name}'))
+            .values({name: sa.bindparam(f'b_{name}') for name in names if name != id_column_name}),
+            updated
+        )
+    removed = {row_id: row for row_id, row in local_rows.items() if row_id not in source_rows}
+    return changed, removed
+
+
+def _delete_ids(replica_connection, table, id_column_name: str, ids):
+    ids = sorted(ids)
+    for start in range(0, len(ids), _RACE_CHUNK_SIZE):
+        replica_connection.execute(table.delete().where(table.c[id_column_name].in_(ids[start:start + _RACE_CHUNK_SIZE])))
+
+
+def _entry_fingerprints(connection) -> dict:
+    """race_id -> (число записей, суммы столбцов _FINGERPRINT_COLUMNS) по RaceEntries."""
+    entries = _source_table(create_db.race_entries_table)
+    stmt = sa.select(
+        entries.c.race_id, sa.func.count(),
+        *[sa.func.coalesce(sa.func.sum(entries.c[name]), 0) for name in _FINGERPRINT_COLUMNS]
+    ).group_by(entries.c.race_id)
+    return {row[0]: tuple(int(value) for value in row[1:]) for row in connection.execute(stmt)}
+
+
+def _copy_race_entries(source_connection, replica_connection, race_ids: list) -> int:
+    """Заменяет записи гонок race_ids записями из основной БД; возвращает число скопированных строк."""
+    table = create_db.race_entries_table
+    source = _source_table(table)
+    copied = 0
+    for start in range(0, len(race_ids), _RACE_CHUNK_SIZE):
+        chunk = race_ids[start:start + _RACE_CHUNK_SIZE]
+        replica_connection.execute(table.delete().where(table.c.race_id.in_(chunk)))
+        stmt = sa.select(*source.c).where(source.c.race_id.in_(chunk)).order_by(source.c.entry_id)
+        result = source_connection.execution_options(stream_results=True, yield_per=_BATCH_SIZE).execute(stmt)
+        for partition in result.partitions(_BATCH_SIZE):
+            replica_connection.execute(table.insert(), [dict(row._mapping) for row in partition])
+            copied += len(partition)
+    return copied
+
+
+class Replica:
+    """Локальная копия основной БД: схема, построчная синхронизация и её состояние."""
+
+    def __init__(self, engine, source_url: str, source_engine_kwargs: dict | None = None, source_engine=None, on_change=None):
+        self.engine = engine
+        self.on_change = on_change # on_change(пары (season, series_id), изменились ли справочники) — после синхронизации с изменениями
+        self.source_url = source_url
+        self._source_engine_kwargs = source_engine_kwargs or {}
+        self._source_engine = source_engine # Готовый движок основной БД (например, db_sync.write_engine)
+        self._sync_lock = threading.Lock()
+        self._thread = None
+        self.syncing = False
+        self.last_error = None
+
+    def ensure_schema(self):
+        """Создаёт таблицы create_db.py, агрегатов, снимков положения, состояния и индексы миграций (если их нет)."""
+        create_db.metadata.create_all(self.engine)
+        season_rollups.create_rollup_tables(self.engine)
+        standings_snapshots.create_snapshot_table(self.engine)
+        _state_metadata.create_all(self.engine)
+        # Индексы строятся (и выполняется ANALYZE) только если версия схемы копии отстала
+        with self.engine.begin() as connection:
+            pending = migrations.pending_versions(connection)
+        if pending:
+            logger.info(f"Миграции локальной копии: {pending}")
+            migrations.apply_migrations(self.engine)
+
+    def source_engine(self):
+        if self._source_engine is None:
+            self._source_engine = sa.create_engine(self.source_url, **self._source_engine_kwargs)
+        return self._source_engine
+
+    def _get_state(self, connection, key: str) -> str | None:
+        return connection.execute(
+            sa.select(replica_state_table.c.value).where(replica_state_table.c.key == key)
+        ).scalar_one_or_none()
+
+    def _set_state(self, connection, key: str, value: str):
+        connection.execute(replica_state_table.delete().where(replica_state_table.c.key == key))
+        connection.execute(replica_state_table.insert().values(key=key, value=value))
+
+    def last_synced_at(self) -> datetime | None:
+        """Время последней успешной синхронизации (UTC) или None, если её не было."""
+        try:
+            with self.engine.connect() as connection:
+                value = self._get_state(connection, 'last_synced_at')
+        except Exception:
+            return None
+        return datetime.fromisoformat(value) if value else None
+
+    def status(self) -> dict:
+        """Состояние копии для интерфейса: время синхронизации, её давность, идёт ли синхронизация, ошибка."""
+        synced_at = self.last_synced_at()
+        age = (datetime.now(timezone.utc) - synced_at).total_seconds() if synced_at else None
+        return {'synced_at': synced_at, 'age_seconds': age, 'syncing': self.syncing, 'error': self.last_error}
+
+    def sync(self, wait: bool = False) -> dict | None:
+        """
+        Приводит копию к основной БД (новые, изменённые и удалённые строки) и обновляет агрегаты
+        и снимки положения затронутых пар (сезон, серия). После изменений вызывает on_change.
+        Возвращает сводку {таблица: изменено строк, ..., 'rollup_pairs': пар} или None при ошибке.
+        Если синхронизация уже идёт: без wait — сразу None; с wait — дождаться её и синхронизировать
+        ещё раз (идущая могла прочитать основную БД до загрузки, о которой пришло уведомление).
+        """
+        if not self._sync_lock.acquire(blocking=wait):
+            logger.info("Синхронизация копии уже выполняется.")
+            return None
+        self.syncing = True
+        started = time.perf_counter()
+        try:
+            summary = {}
+            with self.source_engine().connect() as source_connection, self.engine.begin() as replica_connection:
+                races = create_db.races_table
+                empty = replica_connection.execute(sa.select(sa.func.count()).select_from(races)).scalar_one() == 0
+                changed_rows, removed_rows = {}, {}
+                for table, id_column_name in _ROW_TABLES:
+                    changed_rows[table.name], removed_rows[table.name] = _sync_rows(
+                        source_connection, replica_connection, table, id_column_name)
+
+                source_prints = _entry_fingerprints(source_connection)
+                local_prints = _entry_fingerprints(replica_connection)
+                stale_races = sorted(race_id for race_id in source_prints.keys() | local_prints.keys()
+                                     if source_prints.get(race_id) != local_prints.get(race_id))
+                summary['RaceEntries'] = _copy_race_entries(source_connection, replica_connection, stale_races)
+
+                # Удалённые в основной БД строки: записи уже заменены, теперь гонки и справочники
+                for table, id_column_name in reversed(_ROW_TABLES):
+                    _delete_ids(replica_connection, table, id_column_name, removed_rows[table.name])
+                    summary[table.name] = len(changed_rows[table.name]) + len(removed_rows[table.name])
+
+                # Пары и первая затронутая гонка пары: прежнее и новое положение изменённых гонок
+                race_columns = [column.name for column in races.columns]
+                season_at, num_at, series_at = (race_columns.index(name) for name in ('season', 'race_num_in_season', 'series_id'))
+                from_races = {}
+                race_rows = [row for old, new in changed_rows['Races'].values() for row in (old, new) if row is not None]
+                race_rows += list(removed_rows['Races'].values())
+                if stale_races:
+                    race_rows += [tuple(row) for start in range(0, len(stale_races), _RACE_CHUNK_SIZE)
+                                  for row in replica_connection.execute(
+                                      sa.select(*races.c).where(races.c.race_id.in_(stale_races[start:start + _RACE_CHUNK_SIZE])))]
+                for row in race_rows:
+                    pair = (row[season_at], row[series_at])
+                    from_races[pair] = min(from_races.get(pair, row[num_at]), row[num_at])
+                pairs = sorted(from_races)
+                dimensions_changed = any(changed_rows[table.name] or removed_rows[table.name] for table, _ in _ROW_TABLES[:-1])
+
+                if empty:
+                    season_rollups.refresh_season_rollups(replica_connection)
+                    standings_snapshots.refresh_standings_snapshots(replica_connection, rebuild=True)
+                elif pairs:
+                    season_rollups.refresh_season_rollups(replica_connection, pairs)
+                    standings_snapshots.refresh_standings_snapshots(replica_connection, pairs, from_races=from_races)
+                summary['rollup_pairs'] = len(pairs)
+
+                self._set_state(replica_connection, 'last_synced_at', datetime.now(timezone.utc).isoformat())
+            self.last_error = None
+            logger.info(f"Синхронизация копии за {time.perf_counter() - started:.2f} с: {summary}")
+            if (pairs or dimensions_changed) and self.on_change is not None:
+                self.on_change(pairs, dimensions_changed)
+            return summary
+        except Exception as e:
+            self.last_error = str(e)
+            logger.error(f"Ошибка синхронизации локальной копии: {e}", exc_info=True)
+            return None
+        finally:
+            self.syncing = False
+            self._sync_lock.release()
+
+    def start_background_sync(self, interval: float, delay: float = 0.0) -> threading.Thread:
+        """Синхронизирует копию в фоновом потоке через delay секунд и затем каждые interval секунд."""
+        def _run():
+            time.sleep(delay)
+            while True:
+                self.sync()
+                if interval <= 0:
+                    return
+                time.sleep(interval)
+
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=_run, name='db-replica-sync', daemon=True)
+            self._thread.start()
+        return self._thread
@@ -0,0 +1,172 @@
+import logging
+import threading
+import time
+
+from sqlalchemy import event, text
+
+logger = logging.getLogger(__name__)
+
+ROUTES = ('read', 'write')
+
+# Отставание реплики PostgreSQL (hot standby), с: 0, если реплика проиграла всё полученное WAL
+_LAG_SQL = text(
+    "SELECT pg_is_in_recovery() AS in_recovery, "
+    "CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END AS lag_seconds"
+)
+_REPLAYED_SQL = text("SELECT pg_wal_lsn_diff(pg_last_wal_replay_lsn(), CAST(:lsn AS pg_lsn)) >= 0")
+
+
+class EngineRouter:
+    """
+    Выбор движка для маршрута: запись — всегда основная БД, чтение — реплика, пока она исправна.
+    Чтение переходит на основную БД, если:
+      - отставание реплики больше max_lag секунд или реплика недоступна (проверяется фоновым потоком
+        раз в check_interval секунд, запросы пользователя проверку не ждут);
+      - на реплике оборвалось соединение (до следующей успешной проверки);
+      - после записи в основную БД реплика ещё не проиграла её WAL (require_primary_position).
+    Если движок чтения и записи один и тот же или чтение идёт из локальной копии SQLite,
+    переключений нет — маршрутизация сводится к подсчёту обращений.
+    """
+
+    def __init__(self, read_engine, write_engine, max_lag: float = 30.0, check_interval: float = 5.0):
+        self.read_engine = read_engine
+        self.write_engine = write_engine
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.lag_seconds = None
+        self.replica_healthy = True
+        self.last_error = None
+        self.checked_at = None
+        self.requests = {route: 0 for route in ROUTES}
+        self.fallback_reads = 0
+        self._required_lsn = None # Позиция WAL основной БД, которую реплика должна проиграть
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._watched = [] # Движки реплики, обрыв соединения в которых переключает чтение
+        if self.monitored:
+            self.watch_engine(read_engine)
+            self._start_monitor()
+
+    @property
+    def has_replica(self) -> bool:
+        return self.read_engine is not self.write_engine
+
+    @property
+    def monitored(self) -> bool:
+        """Отставание проверяется только у реплики PostgreSQL (не у локальной копии SQLite)."""
+        return self.has_replica and self.read_engine.dialect.name == 'postgresql'
+
+    def engine_for(self, route: str = 'read'):
+        """Движок для маршрута 'read' или 'write'."""
+        with self._lock:
+            self.requests[route] += 1
+            if route == 'write' or not self.has_replica:
+                return self.write_engine
+            if self.replica_healthy and self._required_lsn is None:
+                return self.read_engine
+            self.fallback_reads += 1
+        return self.write_engine
+
+    def _set_health(self, healthy: bool, reason: str):
+        with self._lock:
+            changed, self.replica_healthy = self.replica_healthy != healthy, healthy
+        if changed:
+            if healthy:
+                logger.info(f"Реплика чтения снова используется ({reason}).")
+            else:
+                logger.warning(f"Чтение переключено на основную БД: {reason}")
+
+    def _on_read_error(self, context):
+        if context.is_disconnect:
+            self.last_error = str(context.original_exception)
+            self._set_health(False, f"обрыв соединения с репликой ({self.last_error})")
+            self._wake.set()
+
+    def watch_engine(self, replica_engine):
+        """Обрыв соединения в движке той же реплики (например, асинхронном) тоже переключает чтение."""
+        if self.monitored and replica_engine not in self._watched:
+            event.listen(replica_engine, 'handle_error', self._on_read_error)
+            self._watched.append(replica_engine)
+
+    def require_primary_position(self):
+        """
+        Запоминает текущую позицию WAL основной БД: чтение идёт из основной БД, пока реплика
+        её не проиграет (после загрузки новых данных виды не должны увидеть старые).
+        """
+        if not self.monitored or self.write_engine.dialect.name != 'postgresql':
+            return
+        try:
+            with self.write_engine.connect() as connection:
+                lsn = connection.execute(text("SELECT pg_current_wal_lsn()::text")).scalar()
+        except Exception as e:
+            logger.error(f"Не удалось получить позицию WAL основной БД: {e}", exc_info=True)
+            return
+        with self._lock:
+            self._required_lsn = lsn
+        self._wake.set()
+
+    def check_replica(self):
+        """Одна проверка реплики: отставание и проигрыш требуемой позиции WAL."""
+        try:
+            with self.read_engine.connect() as connection:
+                row = connection.execute(_LAG_SQL).one()
+                lag = float(row.lag_seconds or 0)
+                with self._lock:
+                    required_lsn = self._required_lsn
+                replayed = required_lsn is None or not row.in_recovery or \
+                    bool(connection.execute(_REPLAYED_SQL, {'lsn': required_lsn}).scalar())
+        except Exception as e:
+            self.lag_seconds = None
+            self.last_error = str(e)
+            self._set_health(False, f"реплика недоступна ({e})")
+            return
+        finally:
+            self.checked_at = time.monotonic()
+        self.lag_seconds = lag
+        if replayed:
+            with self._lock:
+                if self._required_lsn == required_lsn:
+                    self._required_lsn = None
+        if lag > self.max_lag:
+            self._set_health(False, f"отставание реплики {lag:.1f} с > {self.max_lag} с")
+        else:
+            self.last_error = None
+            self._set_health(True, f"отставание {lag:.1f} с")
+
+    def _start_monitor(self):
+        def _run():
+            while not self._stop.is_set():
+                self.check_replica()
+                # Пока ждём проигрыша позиции WAL, проверяем чаще
+                interval = self.check_interval if self._required_lsn is None else min(self.check_interval, 0.5)
+                self._wake.wait(interval)
+                self._wake.clear()
+
+        self._thread = threading.Thread(target=_run, name='db-replica-lag', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Останавливает проверку реплики (при пересоздании движков)."""
+        self._stop.set()
+        self._wake.set()
+        for replica_engine in self._watched:
+            if event.contains(replica_engine, 'handle_error', self._on_read_error):
+                event.remove(replica_engine, 'handle_error', self._on_read_error)
+        self._watched.clear()
+
+    def status(self) -> dict:
+        """Состояние маршрутизации для диагностики."""
+        with self._lock:
+            return {
+                'has_replica': self.monitored,
+                'replica_healthy': self.replica_healthy,
+                'lag_seconds': self.lag_seconds,
+                'max_lag': self.max_lag,
+                'waiting_for_lsn': self._required_lsn,
+                'requests': dict(self.requests),
+                'fallback_reads': self.fallback_reads,
+                'error': self.last_error,
+            }
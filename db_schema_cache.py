@@ -0,0 +1,223 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import warnings
+from contextlib import contextmanager
+
+import sqlalchemy as sa
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+
+logger = logging.getLogger(__name__)
+
+# Кэш отражённой схемы БД: описание нужных приложению таблиц сохраняется в JSON-файл
+# вместе с «отпечатком» схемы. При следующем запуске таблицы строятся из файла без запросов
+# к каталогу, а отпечаток (один запрос) сверяется в фоне; при расхождении схема отражается заново.
+
+CACHE_FORMAT_VERSION = 1
+
+# Таблицы, которые использует приложение (Users / UserSubscriptions не нужны GUI)
+APP_TABLES = (
+    'Series', 'Tracks', 'Drivers', 'Teams', 'Manufacturers', 'Races', 'RaceEntries',
+    'DriverSeasonStats', 'TeamSeasonStats', 'ManufacturerSeasonStats', 'StandingsSnapshots', 'DataLoads',
+)
+
+class SchemaLock:
+    """
+    Блокировка «читатели — писатель» для замены отражённой схемы на лету.
+    Запросы держат её на чтение (параллельно друг другу), замена таблиц — на запись,
+    дожидаясь завершения начатых запросов. Читатели не ждут ожидающего писателя:
+    вложенные сессии одного потока не блокируются, а замена схемы — редкое событие.
+    Под блокировкой на запись нельзя брать другие блокировки, которые поток чтения
+    может держать, открывая сессию (например, блокировки кэшей справочников).
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writing = False
+
+    @contextmanager
+    def reading(self):
+        with self._condition:
+            while self._writing:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def writing(self):
+        with self._condition:
+            while self._writing or self._readers:
+                self._condition.wait()
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+
+
+# Обобщённые типы, которые могут встретиться в кэше (имя -> класс)
+_TYPES = {cls.__name__: cls for cls in (
+    sa.Integer, sa.SmallInteger, sa.BigInteger, sa.Float, sa.Numeric, sa.String, sa.Text,
+    sa.Boolean, sa.Date, sa.DateTime, sa.Time, sa.Interval, sa.LargeBinary,
+)}
+
+
+def _url_key(url) -> str:
+    """Строка подключения без пароля — кэш одной БД не используется для другой."""
+    return make_url(url).render_as_string(hide_password=True)
+
+
+def schema_fingerprint(connection, table_names=APP_TABLES) -> str | None:
+    """
+    Отпечаток схемы нужных таблиц одним запросом к каталогу (None — диалект не поддерживается).
+    Меняется при добавлении/удалении таблиц и столбцов и при смене типов.
+    """
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        rows = connection.execute(text(
+            "SELECT table_name, column_name, data_type, character_maximum_length, is_nullable "
+            "FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND table_name = ANY(:names) "
+            "ORDER BY table_name, ordinal_position"
+        ), {'names': list(table_names)}).all()
+    elif dialect == 'sqlite':
+        rows = connection.execute(
+            text("SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name IN :names ORDER BY name")
+            .bindparams(sa.bindparam('names', expanding=True)),
+            {'names': list(table_names)}
+        ).all()
+    else:
+        return None
+    digest = hashlib.sha256()
+    for row in rows:
+        digest.update(repr(tuple(row)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _type_to_dict(type_) -> dict:
+    try:
+        generic = type_.as_generic()
+    except NotImplementedError:
+        generic = sa.String()
+    name = type(generic).__name__ if type(generic).__name__ in _TYPES else 'String'
+    data = {'type': name}
+    for attr in ('length', 'precision', 'scale'):
+        value = getattr(generic, attr, None)
+        if value is not None:
+            data[attr] = value
+    return data
+
+
+def _type_from_dict(data: dict):
+    cls = _TYPES.get(data['type'], sa.String)
+    kwargs = {attr: data[attr] for attr in ('length', 'precision', 'scale') if attr in data}
+    return cls(**kwargs)
+
+
+def metadata_to_dict(metadata: sa.MetaData) -> dict:
+    """Описание таблиц: столбцы (имя, обобщённый тип, nullable, primary_key)."""
+    return {
+        table.name: [
+            {'name': column.name, 'nullable': column.nullable, 'primary_key': column.primary_key,
+             **_type_to_dict(column.type)}
+            for column in table.columns
+        ]
+        for table in metadata.tables.values()
+    }
+
+
+def metadata_from_dict(tables: dict) -> sa.MetaData:
+    metadata = sa.MetaData()
+    for table_name, columns in tables.items():
+        sa.Table(table_name, metadata, *[
+            sa.Column(column['name'], _type_from_dict(column),
+                      nullable=column['nullable'], primary_key=column['primary_key'])
+            for column in columns
+        ])
+    return metadata
+
+
+# Функциональные индексы lower(имя) (data/migrations.py, миграция 4) SQLAlchemy не отражает и предупреждает
+# об этом при каждом отражении. Запросам приложения они не нужны в метаданных — планировщик находит их сам.
+# Фильтр общий для процесса (catch_warnings не потокобезопасен, а отражение идёт и в фоновом потоке)
+warnings.filterwarnings('ignore', message='Skipped unsupported reflection of expression-based index',
+                        category=sa.exc.SAWarning)
+
+
+def reflect_app_tables(connection) -> sa.MetaData:
+    """Отражает только таблицы приложения (те из APP_TABLES, что есть в БД)."""
+    metadata = sa.MetaData()
+    metadata.reflect(bind=connection, only=lambda name, _: name in APP_TABLES)
+    return metadata
+
+
+def load_cache(path: str, url) -> tuple[sa.MetaData, str] | None:
+    """Таблицы и отпечаток из файла кэша или None (нет файла, другая БД или формат)."""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('format') != CACHE_FORMAT_VERSION or data.get('url') != _url_key(url):
+            return None
+        return metadata_from_dict(data['tables']), data['fingerprint']
+    except Exception as e:
+        logger.warning(f"Кэш схемы {path} не прочитан: {e}")
+        return None
+
+
+def save_cache(path: str, url, metadata: sa.MetaData, fingerprint: str):
+    if not path or fingerprint is None:
+        return
+    data = {'format': CACHE_FORMAT_VERSION, 'url': _url_key(url), 'fingerprint': fingerprint,
+            'tables': metadata_to_dict(metadata)}
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Не удалось сохранить кэш схемы в {path}: {e}")
+
+
+def reflect_and_cache(engine, path: str) -> sa.MetaData:
+    """Отражает таблицы приложения и сохраняет их в кэш вместе с отпечатком."""
+    with engine.connect() as connection:
+        metadata = reflect_app_tables(connection)
+        fingerprint = schema_fingerprint(connection)
+    save_cache(path, engine.url, metadata, fingerprint)
+    return metadata
+
+
+def start_validation(engine, path: str, cached_fingerprint: str, on_changed) -> threading.Thread:
+    """
+    Сверяет в фоне отпечаток схемы с кэшированным. Если схема изменилась — отражает её
+    заново, обновляет кэш и вызывает on_changed(новые метаданные).
+    """
+    def _run():
+        try:
+            with engine.connect() as connection:
+                fingerprint = schema_fingerprint(connection)
+            if fingerprint == cached_fingerprint:
+                logger.info("Кэш схемы БД актуален.")
+                return
+            logger.warning("Схема БД изменилась — таблицы отражаются заново.")
+            on_changed(reflect_and_cache(engine, path))
+        except Exception as e:
+            logger.error(f"Ошибка проверки кэша схемы БД: {e}", exc_info=True)
+
+    thread = threading.Thread(target=_run, name='db-schema-check', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,138 @@
+import bisect
+import heapq
+import unicodedata
+from collections import Counter, namedtuple
+from itertools import chain
+
+# Результат поиска: score — сходство по триграммам (0..1), tier — вид совпадения (см. SearchIndex.search)
+SearchMatch = namedtuple('SearchMatch', ['id', 'name', 'score', 'tier'])
+
+# Порог сходства по умолчанию — как pg_trgm.similarity_threshold
+DEFAULT_THRESHOLD = 0.3
+
+TIER_EXACT, TIER_PREFIX, TIER_WORD_PREFIX, TIER_SUBSTRING, TIER_SIMILAR = 4, 3, 2, 1, 0
+
+
+def normalize(text: str) -> str:
+    """Нижний регистр без диакритики, все знаки кроме букв и цифр — пробелы (Jiménez -> jimenez)."""
+    if not text:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', text)
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+    return ' '.join(''.join(char if char.isalnum() else ' ' for char in stripped).split())
+
+
+def trigrams(key: str) -> set:
+    """Триграммы нормализованной строки по правилам pg_trgm: каждое слово дополняется '  ' слева и ' ' справа."""
+    result = set()
+    for word in key.split():
+        padded = f'  {word} '
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+class SearchIndex:
+    """
+    Индекс нечёткого поиска по списку (id, имя) в памяти.
+      - префиксы: отсортированный список слов имён, поиск bisect-ом;
+      - опечатки и подстроки: инвертированный индекс триграмм (как pg_trgm), сходство —
+        доля общих триграмм (общие / (триграммы запроса + триграммы имени - общие)).
+    Строится один раз на версию справочника; запрос не перебирает все имена.
+    """
+
+    def __init__(self, rows):
+        self.rows = [(row_id, name) for row_id, name in rows if name]
+        self._keys = [normalize(name) for _, name in self.rows]
+        self._key_words = [key.split() for key in self._keys]
+        self._trigram_counts = []
+        self._postings = {}
+        words = []
+        for position, key in enumerate(self._keys):
+            grams = trigrams(key)
+            self._trigram_counts.append(len(grams))
+            for gram in grams:
+                self._postings.setdefault(gram, []).append(position)
+            words.extend((word, position) for word in set(key.split()))
+        words.sort()
+        self._words = [word for word, _ in words]
+        self._word_positions = [position for _, position in words]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _word_prefix_positions(self, prefix: str) -> set:
+        """Позиции имён, в которых есть слово, начинающееся с prefix."""
+        start = bisect.bisect_left(self._words, prefix)
+        end = bisect.bisect_left(self._words, prefix + '\uffff')
+        return set(self._word_positions[start:end])
+
+    def _tier(self, position: int, query: str, tokens: list) -> int:
+        key, words = self._keys[position], self._key_words[position]
+        if key == query:
+            return TIER_EXACT
+        if key.startswith(query):
+            return TIER_PREFIX
+        if all(any(word.startswith(token) for word in words) for token in tokens):
+            return TIER_WORD_PREFIX
+        if query in key:
+            return TIER_SUBSTRING
+        return TIER_SIMILAR
+
+    def _scored(self, query: str, threshold: float) -> dict:
+        """{позиция: (tier, score)} для всех подходящих имён."""
+        key_query = normalize(query)
+        if not key_query:
+            return {}
+        tokens = key_query.split()
+
+        # Кандидаты по префиксу: каждое слово запроса — начало какого-то слова имени
+        candidates = None
+        for token in tokens:
+            positions = self._word_prefix_positions(token)
+            candidates = positions if candidates is None else candidates & positions
+
+        # Кандидаты по триграммам (опечатки, подстроки); запрос из 1-2 символов — только префиксы
+        query_grams = trigrams(key_query)
+        if len(key_query) >= 3:
+            shared = Counter(chain.from_iterable(self._postings.get(gram, ()) for gram in query_grams))
+        else:
+            shared = {}
+
+        # Имя, содержащее запрос как подстроку, может не иметь только краевых триграмм слов запроса
+        substring_floor = len(query_grams) - 3 * len(tokens)
+        results = {}
+        for position in candidates or ():
+            common = shared.get(position, 0)
+            score = common / (len(query_grams) + self._trigram_counts[position] - common)
+            results[position] = (self._tier(position, key_query, tokens), score)
+        if len(key_query) < 3:
+            # У 1-2 символов нет своих триграмм: подстроки внутри слов («us» в «Busch») ищутся перебором,
+            # как в прежнем фильтре списков; короткий запрос дешёв, а имён в списке немного
+            for position, key in enumerate(self._keys):
+                if position not in results and key_query in key:
+                    results[position] = (TIER_SUBSTRING, 0.0)
+            return results
+        # Точные совпадения и префиксы уже среди кандидатов выше; здесь остаются подстроки и похожие имена
+        for position, common in shared.items():
+            if position in results:
+                continue
+            score = common / (len(query_grams) + self._trigram_counts[position] - common)
+            if common >= substring_floor and key_query in self._keys[position]:
+                results[position] = (TIER_SUBSTRING, score)
+            elif score >= threshold:
+                results[position] = (TIER_SIMILAR, score)
+        return results
+
+    def search(self, query: str, limit: int = 20, threshold: float = DEFAULT_THRESHOLD) -> list:
+        """
+        Лучшие совпадения: сначала точное имя, затем начало имени, начала слов, подстрока,
+        затем похожие по триграммам (не ниже threshold); внутри вида — по сходству и имени.
+        """
+        scored = self._scored(query, threshold)
+        order = heapq.nsmallest(limit, scored, key=lambda position: (-scored[position][0], -scored[position][1], self._keys[position]))
+        return [SearchMatch(self.rows[position][0], self.rows[position][1], round(scored[position][1], 3), scored[position][0])
+                for position in order]
+
+    def matching_ids(self, query: str, threshold: float = DEFAULT_THRESHOLD) -> set:
+        """id всех подходящих имён — для фильтрации списков с сохранением их порядка."""
+        return {self.rows[position][0] for position in self._scored(query, threshold)}
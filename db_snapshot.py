@@ -0,0 +1,401 @@
+import logging
+import math
+import time
+from collections import namedtuple
+
+import numpy as np
+from sqlalchemy import select, asc
+
+logger = logging.getLogger(__name__)
+
+# --- Формы строк, совпадающие с тем, что возвращают запросы db_sync ---
+RaceResultRow = namedtuple('RaceResultRow', ['race_num_in_season', 'start_position', 'finish_position', 'points'])
+TeamRaceResultRow = namedtuple('TeamRaceResultRow', ['race_num_in_season', 'avg_start', 'avg_finish'])
+ProgressionRow = namedtuple('ProgressionRow', ['race_num_in_season', 'cumulative_points'])
+DriverStandingRow = namedtuple('DriverStandingRow', ['driver_id', 'driver_name', 'total_points', 'total_wins', 'races_entered'])
+TeamStandingRow = namedtuple('TeamStandingRow', ['team_id', 'team_name', 'total_wins', 'total_points', 'total_top5', 'total_entries'])
+SeasonWinsRow = namedtuple('SeasonWinsRow', ['season', 'wins'])
+
+
+class Record(dict):
+    """Словарь с доступом к ключам как к атрибутам (аналог RowMapping из .mappings())."""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+
+# Множитель для составного ключа (season, series_id) -> одно целое число
+_SERIES_KEY_BASE = 1024
+
+
+def _nullable_column(values) -> np.ndarray:
+    """Преобразует столбец с NULL (None) в float64, где NULL -> NaN."""
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+
+def _id_column(values) -> np.ndarray:
+    """Преобразует столбец ID в int64, где NULL -> -1."""
+    return np.array([-1 if v is None else v for v in values], dtype=np.int64)
+
+
+def _rounded_mean(total: float, count: int):
+    """Среднее, округлённое до 0.1, с той же логикой, что и в db_sync (0/NULL -> None)."""
+    if not count:
+        return None
+    mean = total / count
+    return round(float(mean), 1) if mean else None
+
+
+class RaceEntriesSnapshot:
+    """
+    Колоночный снимок RaceEntries, объединённых с Races, в массивах NumPy.
+
+    Строки отсортированы по (season, series_id, race_num_in_season, race_id),
+    поэтому каждая пара (сезон, серия) — непрерывный срез, а каждая гонка внутри
+    него — непрерывный подотрезок (это используется для np.add.reduceat).
+    Методы повторяют контракты соответствующих функций db_sync.
+    """
+
+    def __init__(self, columns: dict, series_ids: dict, driver_names: dict, team_names: dict, manufacturer_names: dict):
+        self.race_id = columns['race_id']
+        self.season = columns['season']
+        self.series_id = columns['series_id']
+        self.race_num = columns['race_num_in_season']
+        self.driver_id = columns['driver_id']
+        self.team_id = columns['team_id']
+        self.manufacturer_id = columns['manufacturer_id']
+        self.start = columns['start_position']
+        self.finish = columns['finish_position']
+        self.points = columns['points']
+        self.laps_completed = columns['laps_completed']
+        self.laps_led = columns['laps_led']
+        self.won = columns['won_race']
+
+        self.series_ids = series_ids
+        self.driver_names = driver_names
+        self.team_names = team_names
+        self.manufacturer_names = manufacturer_names
+
+        # Ключ для бинарного поиска среза (сезон, серия)
+        self._season_key = self.season * _SERIES_KEY_BASE + self.series_id
+        self.loaded_at = time.time()
+
+    @classmethod
+    def load(cls, session, races_table, race_entries_table, series_table,
+             drivers_table, teams_table, manufacturers_table) -> 'RaceEntriesSnapshot':
+        """Загружает снимок одним запросом RaceEntries JOIN Races и справочники."""
+        started = time.perf_counter()
+        re = race_entries_table.c
+        stmt = select(
+            re.race_id, races_table.c.season, races_table.c.series_id, races_table.c.race_num_in_season,
+            re.driver_id, re.team_id, re.manufacturer_id,
+            re.start_position, re.finish_position, re.points,
+            re.laps_completed, re.laps_led, re.won_race
+        ).select_from(race_entries_table
+        ).join(races_table, re.race_id == races_table.c.race_id
+        ).order_by(
+            asc(races_table.c.season), asc(races_table.c.series_id),
+            asc(races_table.c.race_num_in_season), asc(re.race_id)
+        )
+        rows = session.execute(stmt).fetchall()
+        names = ['race_id', 'season', 'series_id', 'race_num_in_season', 'driver_id', 'team_id',
+                 'manufacturer_id', 'start_position', 'finish_position', 'points',
+                 'laps_completed', 'laps_led', 'won_race']
+        raw = list(zip(*rows)) if rows else [() for _ in names]
+        nullable = {'start_position', 'finish_position', 'points', 'laps_completed', 'laps_led'}
+        columns = {
+            name: _nullable_column(values) if name in nullable else _id_column(values)
+            for name, values in zip(names, raw)
+        }
+
+        series_ids = {name: sid for sid, name in session.execute(
+            select(series_table.c.series_id, series_table.c.series_name)).all()}
+        driver_names = dict(session.execute(
+            select(drivers_table.c.driver_id, drivers_table.c.driver_name)).all())
+        team_names = dict(session.execute(
+            select(teams_table.c.team_id, teams_table.c.team_name)).all())
+        manufacturer_names = dict(session.execute(
+            select(manufacturers_table.c.manufacturer_id, manufacturers_table.c.manufacturer_name)).all())
+
+        snapshot = cls(columns, series_ids, driver_names, team_names, manufacturer_names)
+        logger.info(f"Снимок RaceEntries загружен: {len(rows)} строк за {time.perf_counter() - started:.2f} с.")
+        return snapshot
+
+    def __len__(self):
+        return len(self.race_id)
+
+    # --- Вспомогательные методы ---
+
+    def _series_id(self, series_name: str) -> int | None:
+        series_id = self.series_ids.get(series_name)
+        if not series_id:
+            logger.warning(f"Серия '{series_name}' не найдена в снимке.")
+        return series_id
+
+    def _season_slice(self, season: int, series_id: int) -> slice:
+        """Срез строк для пары (сезон, серия) — O(log n) через бинарный поиск."""
+        key = season * _SERIES_KEY_BASE + series_id
+        lo = np.searchsorted(self._season_key, key, side='left')
+        hi = np.searchsorted(self._season_key, key, side='right')
+        return slice(int(lo), int(hi))
+
+    def _entity_stats(self, idx, count_key: str, with_laps_completed: bool = True, with_averages: bool = True) -> dict:
+        """Агрегирует статистику по массиву индексов строк (аналог SELECT count/sum/avg в db_sync)."""
+        finish = self.finish[idx]
+        stats = {
+            count_key: int(idx.size),
+            'wins': int(self.won[idx].sum()),
+            'top5': int(np.count_nonzero(finish <= 5)),
+            'top10': int(np.count_nonzero(finish <= 10)),
+            'laps_led': int(np.nansum(self.laps_led[idx])),
+        }
+        if with_laps_completed:
+            stats['laps_completed'] = int(np.nansum(self.laps_completed[idx]))
+        if with_averages:
+            start = self.start[idx]
+            start_known = ~np.isnan(start)
+            finish_known = ~np.isnan(finish)
+            stats['avg_start'] = _rounded_mean(start[start_known].sum(), int(start_known.sum()))
+            stats['avg_finish'] = _rounded_mean(finish[finish_known].sum(), int(finish_known.sum()))
+            stats['points'] = int(np.nansum(self.points[idx]))
+        return stats
+
+    # --- Сезонная статистика ---
+
+    def driver_season_details(self, driver_id: int, season: int, series_name: str = 'Cup'):
+        series_id = self._series_id(series_name)
+        if not series_id:
+            return None
+        driver_name = self.driver_names.get(driver_id)
+        if not driver_name:
+            logger.warning(f"Гонщик с driver_id={driver_id} не найден в снимке.")
+            return None
+
+        part = self._season_slice(season, series_id)
+        mask = (self.driver_id[part] == driver_id) & ~np.isnan(self.finish[part])
+        idx = np.flatnonzero(mask) + part.start
+
+        details = {'driver_name': driver_name, 'season': season, 'series_name': series_name}
+        if idx.size:
+            details.update(self._entity_stats(idx, 'races'))
+        else:
+            details.update({
+                'races': 0, 'wins': 0, 'top5': 0, 'top10': 0, 'laps_led': 0,
+                'laps_completed': 0, 'avg_start': None, 'avg_finish': None, 'points': 0
+            })
+        return details
+
+    def team_season_details(self, team_id: int, season: int, series_name: str = 'Cup'):
+        series_id = self._series_id(series_name)
+        if not series_id:
+            return None
+        team_name = self.team_names.get(team_id)
+        if not team_name:
+            logger.warning(f"Команда с team_id={team_id} не найдена в снимке.")
+            return None
+
+        part = self._season_slice(season, series_id)
+        mask = ((self.team_id[part] == team_id) & ~np.isnan(self.finish[part]) & (self.driver_id[part] >= 0))
+        idx = np.flatnonzero(mask) + part.start
+
+        details = {'team_name': team_name, 'season': season, 'series_name': series_name}
+        if idx.size:
+            details.update(self._entity_stats(idx, 'entries'))
+        else:
+            details.update({
+                'entries': 0, 'wins': 0, 'top5': 0, 'top10': 0, 'laps_led': 0,
+                'laps_completed': 0, 'avg_start': None, 'avg_finish': None, 'points': 0
+            })
+        return details
+
+    def manufacturer_season_stats(self, season: int, series_name: str = 'Cup') -> list:
+        series_id = self._series_id(series_name)
+        if not series_id:
+            return []
+        part = self._season_slice(season, series_id)
+        manu = self.manufacturer_id[part]
+        valid = (manu >= 0) & (self.driver_id[part] >= 0)
+        manu = manu[valid]
+        if not manu.size:
+            return []
+
+        finish = self.finish[part][valid]
+        size = int(manu.max()) + 1
+        entries = np.bincount(manu, minlength=size)
+        wins = np.bincount(manu, weights=self.won[part][valid], minlength=size)
+        top5 = np.bincount(manu, weights=(finish <= 5), minlength=size)
+        top10 = np.bincount(manu, weights=(finish <= 10), minlength=size)
+        laps_led = np.bincount(manu, weights=np.nan_to_num(self.laps_led[part][valid]), minlength=size)
+
+        results = [
+            Record(
+                manufacturer_id=int(m), manufacturer_name=self.manufacturer_names[int(m)],
+                wins=int(wins[m]), top5=int(top5[m]), top10=int(top10[m]),
+                laps_led=int(laps_led[m]), entries=int(entries[m])
+            )
+            for m in np.flatnonzero(entries) if int(m) in self.manufacturer_names
+        ]
+        results.sort(key=lambda r: (-r['wins'], -r['top5'], r['manufacturer_name']))
+        return results
+
+    # --- Рейтинги ---
+
+    def driver_standings(self, season: int, series_name: str = 'Cup', page: int = 1, page_size: int = 10):
+        series_id = self._series_id(series_name)
+        if not series_id:
+            return [], 1, 1
+        part = self._season_slice(season, series_id)
+        points = self.points[part]
+        drivers = self.driver_id[part]
+        valid = ~np.isnan(points) & (drivers >= 0)
+        drivers = drivers[valid]
+        if not drivers.size:
+            return [], 1, 1
+
+        size = int(drivers.max()) + 1
+        races = np.bincount(drivers, minlength=size)
+        total_points = np.bincount(drivers, weights=points[valid], minlength=size)
+        total_wins = np.bincount(drivers, weights=self.won[part][valid], minlength=size)
+
+        rows = [
+            DriverStandingRow(int(d), self.driver_names[int(d)], int(total_points[d]), int(total_wins[d]), int(races[d]))
+            for d in np.flatnonzero(races) if int(d) in self.driver_names
+        ]
+        rows.sort(key=lambda r: (-r.total_points, -r.total_wins, r.driver_name))
+        return self._paginate(rows, page, page_size)
+
+    def team_standings(self, season: int, series_name: str = 'Cup', page: int = 1, page_size: int = 10):
+        series_id = self._series_id(series_name)
+        if not series_id:
+            return [], 1, 1
+        part = self._season_slice(season, series_id)
+        teams = self.team_id[part]
+        valid = (teams >= 0) & (self.driver_id[part] >= 0)
+        teams = teams[valid]
+        if not teams.size:
+            return [], 1, 1
+
+        size = int(teams.max()) + 1
+        entries = np.bincount(teams, minlength=size)
+        wins = np.bincount(teams, weights=self.won[part][valid], minlength=size)
+        points = np.bincount(teams, weights=np.nan_to_num(self.points[part][valid]), minlength=size)
+        top5 = np.bincount(teams, weights=(self.finish[part][valid] <= 5), minlength=size)
+
+        rows = [
+            TeamStandingRow(int(t), self.team_names[int(t)], int(wins[t]), int(points[t]), int(top5[t]), int(entries[t]))
+            for t in np.flatnonzero(entries) if int(t) in self.team_names
+        ]
+        rows.sort(key=lambda r: (-r.total_wins, -r.total_points, -r.total_top5, r.team_name))
+        return self._paginate(rows, page, page_size)
+
+    @staticmethod
+    def _paginate(rows: list, page: int, page_size: int):
+        total_pages = math.ceil(len(rows) / page_size)
+        page = max(1, min(page, total_pages))
+        offset = (page - 1) * page_size
+        return rows[offset:offset + page_size], page, total_pages
+
+    # --- Результаты по гонкам сезона ---
+
+    def driver_race_results_for_season(self, driver_id: int, season: int, series_id: int) -> list:
+        part = self._season_slice(season, series_id)
+        idx = np.flatnonzero(self.driver_id[part] == driver_id) + part.start
+        return [
+            RaceResultRow(int(self.race_num[i]), _optional_int(self.start[i]),
+                          _optional_int(self.finish[i]), _optional_int(self.points[i]))
+            for i in idx
+        ]
+
+    def driver_standings_progression(self, driver_id: int, season: int, series_id: int) -> list:
+        part = self._season_slice(season, series_id)
+        idx = np.flatnonzero(self.driver_id[part] == driver_id) + part.start
+        if not idx.size:
+            return []
+        race_nums = self.race_num[idx]
+        cumulative = np.cumsum(np.nan_to_num(self.points[idx]))
+        # Оконная SUM() OVER (ORDER BY race_num) даёт одинаковое значение для равных race_num
+        last_of_peer = np.searchsorted(race_nums, race_nums, side='right') - 1
+        return [ProgressionRow(int(n), int(cumulative[j])) for n, j in zip(race_nums, last_of_peer)]
+
+    def team_race_results_for_season(self, team_id: int, season: int, series_id: int) -> list:
+        part = self._season_slice(season, series_id)
+        start = self.start[part]
+        finish = self.finish[part]
+        mask = (self.team_id[part] == team_id) & ~np.isnan(start) & ~np.isnan(finish)
+        idx = np.flatnonzero(mask)
+        if not idx.size:
+            return []
+
+        # Строки отсортированы по гонкам: границы групп — места смены race_id
+        race_ids = self.race_id[part][idx]
+        boundaries = np.flatnonzero(np.r_[True, race_ids[1:] != race_ids[:-1]])
+        counts = np.diff(np.r_[boundaries, idx.size])
+        start_sums = np.add.reduceat(start[idx], boundaries)
+        finish_sums = np.add.reduceat(finish[idx], boundaries)
+        race_nums = self.race_num[part][idx][boundaries]
+        return [
+            TeamRaceResultRow(int(n), float(s / c), float(f / c))
+            for n, s, f, c in zip(race_nums, start_sums, finish_sums, counts)
+        ]
+
+    # --- Статистика за всё время ---
+
+    def overall_driver_stats(self, driver_id: int):
+        driver_name = self.driver_names.get(driver_id)
+        if not driver_name:
+            logger.warning(f"Гонщик с driver_id={driver_id} не найден в снимке.")
+            return None
+        idx = np.flatnonzero((self.driver_id == driver_id) & ~np.isnan(self.finish))
+        details = {'driver_name': driver_name, 'type': 'driver'}
+        if idx.size:
+            details.update(self._entity_stats(idx, 'races'))
+        else:
+            details.update({
+                'races': 0, 'wins': 0, 'top5': 0, 'top10': 0, 'laps_led': 0,
+                'laps_completed': 0, 'avg_start': None, 'avg_finish': None, 'points': 0
+            })
+        return details
+
+    def overall_team_stats(self, team_id: int):
+        team_name = self.team_names.get(team_id)
+        if not team_name:
+            logger.warning(f"Команда с team_id={team_id} не найдена в снимке.")
+            return None
+        idx = np.flatnonzero((self.team_id == team_id) & ~np.isnan(self.finish) & (self.driver_id >= 0))
+        details = {'team_name': team_name, 'type': 'team'}
+        if idx.size:
+            details.update(self._entity_stats(idx, 'entries'))
+        else:
+            details.update({
+                'entries': 0, 'wins': 0, 'top5': 0, 'top10': 0, 'laps_led': 0,
+                'laps_completed': 0, 'avg_start': None, 'avg_finish': None, 'points': 0
+            })
+        return details
+
+    def overall_manufacturer_stats(self, manufacturer_id: int):
+        manufacturer_name = self.manufacturer_names.get(manufacturer_id)
+        if not manufacturer_name:
+            logger.warning(f"Производитель с manufacturer_id={manufacturer_id} не найден в снимке.")
+            return None
+        idx = np.flatnonzero((self.manufacturer_id == manufacturer_id) & (self.driver_id >= 0))
+        details = {'manufacturer_name': manufacturer_name, 'type': 'manufacturer'}
+        if idx.size:
+            details.update(self._entity_stats(idx, 'entries', with_laps_completed=False, with_averages=False))
+        else:
+            details.update({'entries': 0, 'wins': 0, 'top5': 0, 'top10': 0, 'laps_led': 0})
+        return details
+
+    def manufacturer_wins_by_season(self, manufacturer_id: int) -> list:
+        seasons = self.season[(self.manufacturer_id == manufacturer_id) & (self.won == 1)]
+        if not seasons.size:
+            return []
+        unique, counts = np.unique(seasons, return_counts=True)
+        return [SeasonWinsRow(int(s), int(c)) for s, c in zip(unique, counts)]
+
+
+def _optional_int(value):
+    """NaN -> None, иначе int (обратное преобразование nullable-столбца)."""
+    return None if np.isnan(value) else int(value)
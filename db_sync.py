@@ -1,9 +1,24 @@
+import contextvars
 import logging
 import os
+import sys
 import math
-from sqlalchemy import create_engine, select, func, MetaData, desc, asc, text, case, cast, Integer, Float, over
+from collections import namedtuple
+from sqlalchemy import create_engine, select, func, MetaData, desc, asc, text, case, cast, literal, Integer, Float, over, bindparam
 from sqlalchemy.orm import sessionmaker, Session # Импортируем обычную Session
 from contextlib import contextmanager
+from db_snapshot import RaceEntriesSnapshot, RaceResultRow, TeamRaceResultRow
+from db_dimensions import DimensionCache
+import db_search
+import db_keyset
+from db_query_cache import QueryCache
+import db_config
+import db_pool
+import db_replica
+import db_routing
+import db_schema_cache
+import db_metrics
+from data import change_events, standings_snapshots
 
 DB_USER_VPS = "nascar_db_owner"        # Пользователь из docker-compose.yml
 DB_PASSWORD_VPS = "qwerty123"          # !!! ВАШ РЕАЛЬНЫЙ ПАРОЛЬ из docker-compose.yml !!!
@@ -19,59 +34,405 @@ DB_URL = f"postgresql+psycopg2://{DB_USER_VPS}:{DB_PASSWORD_VPS}@{DB_HOST_VPS}:{
 logger = logging.getLogger(__name__) # Логгер для этого модуля
 metadata = MetaData()
 
-# Используем синхронный движок
-engine = create_engine(DB_URL, echo=False) # echo=True для отладки SQL запросов
+# --- Движок и пул соединений ---
+# Строка подключения и параметры пула берутся из nastats.ini / переменных окружения (см. db_config.py),
+# по умолчанию — DB_URL выше. По умолчанию запросы читают локальную копию (db_replica.py),
+# которая синхронизируется с этой БД; отключается NASTATS_USE_REPLICA=0.
+# Без локальной копии чтение можно направить на реплику PostgreSQL (read_url / NASTATS_READ_URL):
+# запись, LISTEN и синхронизация всегда идут в основную БД, а при отставании или недоступности
+# реплики чтение переключается на основную БД (db_routing.py).
+ENGINE_SETTINGS = db_config.load_engine_settings()
+POOL_METRICS = db_pool.PoolMetrics() # Пул движка чтения
+ROUTE_POOL_METRICS = {'read': POOL_METRICS, 'write': db_pool.PoolMetrics()}
+# Замеры функций чтения и SQL (db_metrics.py): NASTATS_METRICS=0 — отключить,
+# NASTATS_SLOW_QUERY_MS — порог журнала медленных запросов, NASTATS_SLOW_QUERY_LOG — файл журнала
+QUERY_METRICS = db_metrics.QueryMetrics(
+    slow_threshold_ms=float(os.getenv('NASTATS_SLOW_QUERY_MS', '500')),
+    enabled=os.getenv('NASTATS_METRICS') != '0'
+)
+QUERY_METRICS.set_slow_log(os.getenv('NASTATS_SLOW_QUERY_LOG'))
+engine = None       # Движок чтения (локальная копия, реплика или основная БД)
+write_engine = None # Движок основной БД (тот же объект, что engine, если чтение идёт из неё же)
+sync_session_factory = None
+ROUTER = None # db_routing.EngineRouter: выбор движка для маршрута 'read' / 'write'
+REPLICA = None # Локальная копия (db_replica.Replica), если чтение идёт из неё
+
+def _create_routed_engine(url: str, pool_metrics: db_pool.PoolMetrics):
+    kwargs = db_config.engine_kwargs(ENGINE_SETTINGS, url)
+    if 'pool_size' in kwargs:
+        # QueuePool с замером времени получения соединения
+        kwargs['poolclass'] = db_pool.timed_queue_pool(pool_metrics)
+    # echo=True для отладки SQL запросов
+    new_engine = create_engine(url, echo=False, **kwargs)
+    pool_metrics.reset()
+    pool_metrics.attach(new_engine)
+    QUERY_METRICS.attach(new_engine)
+    return new_engine
+
+def configure_engine(url: str | None = None, settings: db_config.EngineSettings | None = None):
+    """
+    Создаёт (или пересоздаёт) движки чтения и записи и фабрику сессий.
+    Явно переданный url используется напрямую для чтения и записи. Иначе, если в настройках включена
+    локальная копия (use_replica), чтение идёт из неё, а основная БД (settings.url или DB_URL) служит
+    источником синхронизации; без копии чтение идёт из read_url (если задан) или из основной БД.
+    Возвращает движок чтения. После смены БД нужно вызвать reflect_db_schema().
+    """
+    global engine, write_engine, sync_session_factory, ENGINE_SETTINGS, REPLICA, ROUTER
+    if settings is not None:
+        ENGINE_SETTINGS = settings
+    source_url = ENGINE_SETTINGS.url or DB_URL
+    use_replica = url is None and ENGINE_SETTINGS.use_replica
+    write_url = url or source_url
+    if url is None:
+        url = f"sqlite:///{ENGINE_SETTINGS.replica_path}" if use_replica else (ENGINE_SETTINGS.read_url or source_url)
+    if ROUTER is not None:
+        ROUTER.stop()
+    for old_engine in {engine, write_engine} - {None}:
+        old_engine.dispose()
+    engine = _create_routed_engine(url, ROUTE_POOL_METRICS['read'])
+    write_engine = engine if write_url == url else _create_routed_engine(write_url, ROUTE_POOL_METRICS['write'])
+    # Свежесть локальной копии (SQLite) отслеживает db_replica: маршрутизатор проверяет только реплику PostgreSQL
+    ROUTER = db_routing.EngineRouter(
+        engine, write_engine, max_lag=ENGINE_SETTINGS.max_replica_lag, check_interval=ENGINE_SETTINGS.lag_check_interval
+    )
+    REPLICA = None
+    if use_replica:
+        db_replica.enable_wal(engine)
+        REPLICA = db_replica.Replica(engine, source_url, source_engine=write_engine, on_change=_on_replica_changed)
+    # Используем синхронную сессию (для маршрута 'write' и при переключении чтения — с другим bind)
+    sync_session_factory = sessionmaker(engine, class_=Session, expire_on_commit=False)
+    logger.info(f"Движок БД: {engine.url.render_as_string(hide_password=True)}")
+    if write_engine is not engine:
+        logger.info(f"Движок записи: {write_engine.url.render_as_string(hide_password=True)}")
+    return engine
+
+def _on_replica_changed(pairs, dimensions_changed: bool):
+    """
+    Синхронизация принесла в копию изменения основной БД: сбрасываем кэши затронутых пар,
+    а при изменении справочников (имена есть в любом результате) — весь кэш запросов.
+    """
+    if series_table is None:
+        return # Первая синхронизация до отражения схемы: кэшей ещё нет
+    if dimensions_changed:
+        QUERY_CACHE.clear()
+    invalidate_season_pairs(pairs)
+
+def prepare_replica():
+    """
+    Готовит локальную копию к работе (вызывается до reflect_db_schema):
+    создаёт схему; если копия ещё ни разу не синхронизировалась — синхронизирует её сразу,
+    иначе работа начинается с имеющимися данными, а синхронизация идёт в фоне.
+    """
+    if REPLICA is None:
+        return
+    REPLICA.ensure_schema()
+    interval = ENGINE_SETTINGS.replica_sync_interval
+    if REPLICA.last_synced_at() is None:
+        logger.info("Локальная копия пуста — первая синхронизация с основной БД...")
+        REPLICA.sync()
+        if interval > 0:
+            REPLICA.start_background_sync(interval, delay=interval)
+    else:
+        REPLICA.start_background_sync(interval)
+
+def get_replica_status() -> dict | None:
+    """Состояние локальной копии (см. db_replica.Replica.status) или None, если чтение идёт из основной БД."""
+    return REPLICA.status() if REPLICA is not None else None
 
-# Используем синхронную сессию
-sync_session_factory = sessionmaker(engine, class_=Session, expire_on_commit=False)
+def get_routing_status() -> dict:
+    """Состояние маршрутизации чтения/записи (см. db_routing.EngineRouter.status)."""
+    return ROUTER.status()
+
+def start_pool_warm_up(connections: int | None = None):
+    """Фоновый прогрев пула (по умолчанию — warmup_connections из настроек)."""
+    if connections is None:
+        connections = ENGINE_SETTINGS.warmup_connections
+    return db_pool.start_warm_up(engine, connections)
+
+def get_pool_metrics(route: str = 'read') -> dict:
+    """Метрики пула маршрута: выдано соединений, подключения, время ожидания соединения и т.д."""
+    if route == 'write' and write_engine is engine:
+        route = 'read' # Один движок на оба маршрута
+    return ROUTE_POOL_METRICS[route].snapshot((engine if route == 'read' else write_engine).pool)
+
+def get_route_metrics() -> dict:
+    """Метрики пулов обоих маршрутов: {'read': {...}, 'write': {...}}."""
+    return {route: get_pool_metrics(route) for route in db_routing.ROUTES}
+
+def get_query_metrics() -> dict:
+    """Перцентили времени по функциям чтения и самые долгие SQL-запросы (для панели диагностики)."""
+    return {'functions': QUERY_METRICS.function_summary(), 'statements': QUERY_METRICS.statement_summary()}
+
+configure_engine()
 
 # --- Переменные для отраженных таблиц (как и раньше) ---
 series_table, tracks_table, drivers_table, teams_table, manufacturers_table, races_table, race_entries_table = [None] * 7
 
+# --- Необязательные таблицы посезонных агрегатов (см. data/season_rollups.py) ---
+# Если они есть в БД, рейтинги и статистика сезона читаются из них вместо GROUP BY по RaceEntries.
+# Отключаются переменной окружения NASTATS_USE_ROLLUPS=0.
+driver_season_stats_table, team_season_stats_table, manufacturer_season_stats_table = [None] * 3
+
+# --- Необязательная таблица положения после каждой гонки (см. data/standings_snapshots.py) ---
+# Без неё get_standings_after_race / get_driver_rank_trajectory считают положение по RaceEntries.
+standings_snapshots_table = None
+StandingsSnapshotRow = namedtuple('StandingsSnapshotRow', ['rank', 'driver_id', 'driver_name', 'total_points', 'total_wins', 'races_entered'])
+RankTrajectoryRow = namedtuple('RankTrajectoryRow', ['race_num_in_season', 'rank', 'cumulative_points'])
+
+# --- Необязательный журнал загрузок (DataLoads, пишут data/load_data.py и data/bulk_load.py) ---
+data_loads_table = None
+
 # --- Кэш последнего сезона (как и раньше) ---
 LATEST_SEASON = None
 
+# --- Колоночный снимок RaceEntries для локальной агрегации (опционально) ---
+# Включается переменной окружения NASTATS_SNAPSHOT=1 или вызовом load_snapshot()
+SNAPSHOT = None
+
+# --- Справочники в памяти: имя таблицы -> (столбец id, столбец имени) ---
+_DIMENSION_COLUMNS = {
+    'Series': ('series_id', 'series_name'),
+    'Drivers': ('driver_id', 'driver_name'),
+    'Teams': ('team_id', 'team_name'),
+    'Manufacturers': ('manufacturer_id', 'manufacturer_name'),
+}
+
+# --- Внешняя сессия для get_db_session (db_async выполняет функции этого модуля через run_sync) ---
+_SESSION_OVERRIDE = contextvars.ContextVar('nastats_session_override', default=None)
+
 @contextmanager
-def get_db_session() -> Session:
-    """Предоставляет сессию БД в менеджере контекста."""
-    session = sync_session_factory()
+def use_session(session: Session):
+    """Все вызовы get_db_session внутри блока получают переданную сессию."""
+    token = _SESSION_OVERRIDE.set(session)
     try:
         yield session
-        session.commit() # Коммитим, если все прошло успешно
-    except Exception:
-        session.rollback() # Откатываем изменения в случае ошибки
-        raise
     finally:
-        session.close() # Всегда закрываем сессию
+        _SESSION_OVERRIDE.reset(token)
+
+@contextmanager
+def get_db_session(route: str = 'read') -> Session:
+    """
+    Предоставляет сессию БД в менеджере контекста. route='write' — сессия основной БД;
+    чтение идёт из реплики, пока она не отстала и доступна (см. db_routing.EngineRouter).
+    """
+    override = _SESSION_OVERRIDE.get()
+    if override is not None:
+        # Сессией управляет внешний код (use_session): не коммитим и не закрываем
+        with _SCHEMA_LOCK.reading():
+            yield override
+        return
+    with _SCHEMA_LOCK.reading(): # Таблицы не заменяются, пока сессия открыта
+        session = sync_session_factory(bind=ROUTER.engine_for(route))
+        try:
+            yield session
+            session.commit() # Коммитим, если все прошло успешно
+        except Exception:
+            session.rollback() # Откатываем изменения в случае ошибки
+            raise
+        finally:
+            session.close() # Всегда закрываем сессию
+
+def get_data_version() -> tuple | None:
+    """
+    Дешёвая версия данных: максимальные id и количества строк в Races, RaceEntries и справочниках
+    и последняя запись журнала загрузок. Меняется после любой загрузки новых гонок или сущностей
+    и после исправления записей уже загруженной гонки. None — если получить не удалось.
+    """
+    tables = [races_table, race_entries_table, series_table, drivers_table, teams_table, manufacturers_table]
+    if any(table is None for table in tables):
+        return None
+    id_columns = ['race_id', 'entry_id'] + [columns[0] for columns in _DIMENSION_COLUMNS.values()]
+    parts = []
+    for table, id_column_name in zip(tables, id_columns):
+        id_column = getattr(table.c, id_column_name)
+        parts.append(select(func.max(id_column)).scalar_subquery())
+        parts.append(select(func.count(id_column)).scalar_subquery())
+    if data_loads_table is not None:
+        # SQLite может выдать исправленным записям последней гонки те же entry_id — журнал это различает
+        parts.append(select(func.max(data_loads_table.c.load_id)).scalar_subquery())
+    try:
+        with get_db_session() as session:
+            return tuple(session.execute(select(*parts)).one())
+    except Exception as e:
+        logger.error(f"Ошибка получения версии данных: {e}", exc_info=True)
+        return None
+
+def _load_dimension_rows(table_name: str) -> list | None:
+    """Загружает справочник целиком как список (id, имя), отсортированный по имени."""
+    table = metadata.tables.get(table_name)
+    if table is None or table_name not in _DIMENSION_COLUMNS:
+        logger.error(f"Таблица справочника {table_name} не отражена.")
+        return None
+    id_column_name, name_column_name = _DIMENSION_COLUMNS[table_name]
+    name_column = getattr(table.c, name_column_name)
+    stmt = select(getattr(table.c, id_column_name), name_column).order_by(asc(name_column))
+    try:
+        with get_db_session() as session:
+            return [tuple(row) for row in session.execute(stmt).fetchall()]
+    except Exception as e:
+        logger.error(f"Ошибка загрузки справочника {table_name}: {e}", exc_info=True)
+        return None
+
+# Версия данных проверяется не чаще раза в NASTATS_DIMENSION_TTL секунд (по умолчанию 60)
+DIMENSIONS = DimensionCache(
+    _load_dimension_rows, get_data_version,
+    check_interval=float(os.getenv('NASTATS_DIMENSION_TTL', '60'))
+)
+
+# --- Нечёткий поиск по именам (см. db_search.py) ---
+# Drivers/Teams/Manufacturers ищутся по DIMENSIONS; трассы и гонки — по своему кэшу строк с той же версией данных.
+# NASTATS_SEARCH=pg_trgm — искать в PostgreSQL через pg_trgm (GIN-индексы из миграции 6) вместо индекса в памяти.
+# Если миграция 6 пропущена (нет расширения или прав на него), этот режим ищет подстроку через LIKE.
+SEARCH_BACKEND = os.getenv('NASTATS_SEARCH', 'memory')
+_SEARCH_TABLES = {'drivers': 'Drivers', 'teams': 'Teams', 'manufacturers': 'Manufacturers', 'tracks': 'Tracks', 'races': 'Races'}
+
+def _race_search_label(race_name: str, season: int, series_id: int) -> str:
+    """Подпись гонки в поиске: одно название встречается во многих сезонах."""
+    return f"{race_name} ({season}, {DIMENSIONS.get_name(series_table.name, series_id) or series_id})"
+
+def _load_search_rows(table_name: str) -> list | None:
+    """Строки (id, подпись) трасс и гонок для поиска; гонки — от новых сезонов к старым."""
+    try:
+        with get_db_session() as session:
+            if table_name == 'Tracks' and tracks_table is not None:
+                stmt = select(tracks_table.c.track_id, tracks_table.c.track_name).order_by(asc(tracks_table.c.track_name))
+                return [tuple(row) for row in session.execute(stmt).fetchall()]
+            if table_name == 'Races' and races_table is not None and series_table is not None:
+                r = races_table.c
+                stmt = select(r.race_id, r.race_name, r.season, r.series_id).order_by(desc(r.season), asc(r.series_id), asc(r.race_num_in_season))
+                return [(row.race_id, _race_search_label(row.race_name, row.season, row.series_id))
+                        for row in session.execute(stmt).fetchall()]
+    except Exception as e:
+        logger.error(f"Ошибка загрузки строк поиска {table_name}: {e}", exc_info=True)
+        return None
+    logger.error(f"Таблица {table_name} не отражена для поиска.")
+    return None
+
+SEARCH_ROWS = DimensionCache(
+    _load_search_rows, get_data_version,
+    check_interval=float(os.getenv('NASTATS_DIMENSION_TTL', '60'))
+)
+
+# --- Кэш результатов функций чтения (см. db_query_cache.py) ---
+# Отключается NASTATS_QUERY_CACHE=0; лимиты — NASTATS_QUERY_CACHE_ENTRIES / NASTATS_QUERY_CACHE_MB.
+QUERY_CACHE = QueryCache(
+    get_data_version,
+    max_entries=int(os.getenv('NASTATS_QUERY_CACHE_ENTRIES', '512')),
+    max_bytes=int(os.getenv('NASTATS_QUERY_CACHE_MB', '64')) * 1024 * 1024,
+    check_interval=float(os.getenv('NASTATS_DIMENSION_TTL', '60')),
+    enabled=os.getenv('NASTATS_QUERY_CACHE') != '0',
+    on_invalidate=[DIMENSIONS.invalidate, SEARCH_ROWS.invalidate]
+)
+# TTL (секунды) по видам данных: прошлые гонки не меняются, рейтинги — после загрузки новых
+_TTL_RACES = 3600
+_TTL_STANDINGS = 300
+_TTL_DETAILS = 600
+
+# Строк в порции потоковой выдачи рейтингов (iter_driver_standings / iter_team_standings)
+STREAM_CHUNK_SIZE = 500
+
+# Кэш отражённой схемы (см. db_schema_cache.py): путь в NASTATS_SCHEMA_CACHE, '0' — отключить
+SCHEMA_CACHE_PATH = os.getenv('NASTATS_SCHEMA_CACHE', 'nastats_schema.json')
+if SCHEMA_CACHE_PATH == '0':
+    SCHEMA_CACHE_PATH = None
+
+# --- Готовые параметризованные запросы горячих функций ---
+# Конструкция select() строится один раз, значения передаются через bindparam при выполнении.
+# SQLAlchemy запоминает ключ кэша в самом объекте запроса, поэтому повторный вызов не пересобирает
+# JOIN/CASE/подзапросы и сразу берёт скомпилированный SQL из кэша движка.
+# Запросы зависят от отражённых таблиц и сбрасываются в _apply_metadata.
+_STATEMENTS = {}
+
+# Фоновая проверка кэша схемы может заменить таблицы во время работы (_on_schema_changed):
+# сессии get_db_session и сборка готовых запросов держат блокировку на чтение, замена — на запись
+_SCHEMA_LOCK = db_schema_cache.SchemaLock()
+
+def _statement(key: str, build):
+    """Готовый запрос по ключу (build() вызывается при первом обращении)."""
+    with _SCHEMA_LOCK.reading():
+        stmt = _STATEMENTS.get(key)
+        if stmt is None:
+            stmt = _STATEMENTS[key] = build()
+        return stmt
+
+_REQUIRED_TABLES = ['Series', 'Tracks', 'Drivers', 'Teams', 'Manufacturers', 'Races', 'RaceEntries']
+
+def _apply_metadata(new_metadata: MetaData):
+    """
+    Заполняет переменные таблиц из метаданных (ValueError, если нет обязательных таблиц).
+    Замена ждёт завершения начатых запросов, новые запросы ждут её окончания.
+    """
+    with _SCHEMA_LOCK.writing():
+        _replace_tables(new_metadata)
+    # Кэши сбрасываются после снятия блокировки: подписчики сброса (справочники) берут свои
+    # блокировки, которые поток чтения может держать, ожидая _SCHEMA_LOCK.reading()
+    QUERY_CACHE.clear() # Сбрасывает и кэш карьерной статистики, и справочники
+
+def _replace_tables(new_metadata: MetaData):
+    global metadata, series_table, tracks_table, drivers_table, teams_table, manufacturers_table, races_table, race_entries_table
+    global driver_season_stats_table, team_season_stats_table, manufacturer_season_stats_table, standings_snapshots_table, data_loads_table
+    missing_tables = [name for name in _REQUIRED_TABLES if name not in new_metadata.tables]
+    if missing_tables:
+        logger.error(f"Не найдены следующие таблицы: {', '.join(missing_tables)}")
+        raise ValueError("Не удалось отразить одну или несколько таблиц БД.")
+
+    metadata = new_metadata
+    series_table = metadata.tables.get('Series')
+    tracks_table = metadata.tables.get('Tracks')
+    drivers_table = metadata.tables.get('Drivers')
+    teams_table = metadata.tables.get('Teams')
+    manufacturers_table = metadata.tables.get('Manufacturers')
+    races_table = metadata.tables.get('Races')
+    race_entries_table = metadata.tables.get('RaceEntries')
+    logger.info("Все необходимые таблицы найдены.")
+    data_loads_table = metadata.tables.get('DataLoads')
+
+    # Таблицы агрегатов необязательны: без них запросы идут по RaceEntries
+    driver_season_stats_table = team_season_stats_table = manufacturer_season_stats_table = standings_snapshots_table = None
+    if os.getenv('NASTATS_USE_ROLLUPS') != '0':
+        driver_season_stats_table = metadata.tables.get('DriverSeasonStats')
+        team_season_stats_table = metadata.tables.get('TeamSeasonStats')
+        manufacturer_season_stats_table = metadata.tables.get('ManufacturerSeasonStats')
+        standings_snapshots_table = metadata.tables.get('StandingsSnapshots')
+    rollups_found = [table.name for table in (driver_season_stats_table, team_season_stats_table, manufacturer_season_stats_table,
+                                              standings_snapshots_table) if table is not None]
+    if rollups_found:
+        logger.info(f"Найдены таблицы агрегатов: {', '.join(rollups_found)}")
+
+    _STATEMENTS.clear()
+
+def _on_schema_changed(new_metadata: MetaData):
+    """Вызывается фоновой проверкой кэша схемы, если схема в БД изменилась."""
+    try:
+        _apply_metadata(new_metadata)
+        get_latest_season(force_refresh=True)
+    except Exception as e:
+        logger.error(f"Не удалось применить обновлённую схему БД: {e}", exc_info=True)
 
 def reflect_db_schema():
-    """Отражает схему БД синхронно и заполняет переменные таблиц."""
-    global series_table, tracks_table, drivers_table, teams_table, manufacturers_table, races_table, race_entries_table, LATEST_SEASON
+    """
+    Отражает схему БД синхронно и заполняет переменные таблиц.
+    Если есть кэш схемы для этой БД, таблицы берутся из него без запросов к каталогу,
+    а актуальность кэша проверяется в фоне.
+    """
+    global LATEST_SEASON
     logger.info("Начало отражения схемы БД (синхронно)...")
     try:
-        # Отражение происходит через движок
-        metadata.reflect(bind=engine)
-        logger.info("Структура БД успешно отражена.")
-
-        # Заполняем глобальные переменные таблиц
-        series_table = metadata.tables.get('Series')
-        tracks_table = metadata.tables.get('Tracks')
-        drivers_table = metadata.tables.get('Drivers')
-        teams_table = metadata.tables.get('Teams')
-        manufacturers_table = metadata.tables.get('Manufacturers')
-        races_table = metadata.tables.get('Races')
-        race_entries_table = metadata.tables.get('RaceEntries')
-
-        missing_tables = [
-            name for name, table in zip(
-                ['Series', 'Tracks', 'Drivers', 'Teams', 'Manufacturers', 'Races', 'RaceEntries'],
-                [series_table, tracks_table, drivers_table, teams_table, manufacturers_table, races_table, race_entries_table]
-            ) if table is None
-        ]
-        if missing_tables:
-            logger.error(f"Не найдены следующие таблицы: {', '.join(missing_tables)}")
-            raise ValueError("Не удалось отразить одну или несколько таблиц БД.")
-        logger.info("Все необходимые таблицы найдены.")
+        cached = db_schema_cache.load_cache(SCHEMA_CACHE_PATH, engine.url)
+        applied = False
+        if cached is not None:
+            cached_metadata, fingerprint = cached
+            try:
+                _apply_metadata(cached_metadata)
+                applied = True
+                logger.info("Структура БД загружена из кэша схемы.")
+                db_schema_cache.start_validation(engine, SCHEMA_CACHE_PATH, fingerprint, _on_schema_changed)
+            except ValueError:
+                logger.warning("Кэш схемы неполон — схема отражается из БД.")
+        if not applied:
+            # Отражаются только таблицы приложения
+            _apply_metadata(db_schema_cache.reflect_and_cache(engine, SCHEMA_CACHE_PATH))
+            logger.info("Структура БД успешно отражена.")
 
         # Определяем последний сезон после отражения
         LATEST_SEASON = get_latest_season(force_refresh=True) # Вызываем синхронную версию
@@ -80,6 +441,9 @@ def reflect_db_schema():
             # Можно установить значение по умолчанию или выбросить ошибку,
             # пока просто оставим None и предупреждение.
 
+        if os.getenv('NASTATS_SNAPSHOT') == '1':
+            load_snapshot()
+
     except Exception as e:
         logger.critical(f"Критическая ошибка при отражении схемы БД: {e}")
         raise # Перевыбрасываем ошибку, т.к. без схемы работать нельзя
@@ -97,7 +461,7 @@ def get_latest_season(force_refresh: bool = False) -> int | None:
 
     try:
         with get_db_session() as session: # Используем менеджер контекста
-            stmt = select(func.max(races_table.c.season))
+            stmt = _statement('latest_season', lambda: select(func.max(races_table.c.season)))
             # Выполняем синхронно
             max_season = session.execute(stmt).scalar_one_or_none()
             if max_season:
@@ -111,17 +475,41 @@ def get_latest_season(force_refresh: bool = False) -> int | None:
         LATEST_SEASON = None # Возвращаем None в случае ошибки
     return LATEST_SEASON
 
+def load_snapshot() -> RaceEntriesSnapshot | None:
+    """
+    Загружает колоночный снимок RaceEntries + Races в память (db_snapshot).
+    После загрузки статистические функции считаются локально, без запросов к БД.
+    """
+    global SNAPSHOT
+    required_tables = [races_table, race_entries_table, series_table, drivers_table, teams_table, manufacturers_table]
+    if any(table is None for table in required_tables):
+        logger.error("Таблицы не отражены. Невозможно загрузить снимок RaceEntries.")
+        return None
+    try:
+        with get_db_session() as session:
+            SNAPSHOT = RaceEntriesSnapshot.load(
+                session, races_table, race_entries_table, series_table,
+                drivers_table, teams_table, manufacturers_table
+            )
+    except Exception as e:
+        logger.error(f"Ошибка загрузки снимка RaceEntries: {e}", exc_info=True)
+        SNAPSHOT = None
+    return SNAPSHOT
+
+def drop_snapshot():
+    """Отключает снимок: функции снова обращаются к БД."""
+    global SNAPSHOT
+    SNAPSHOT = None
+
 # --- Далее будем адаптировать остальные функции ---
 # Пример адаптации get_series_id_by_name:
 
 def get_series_id_by_name(session: Session, series_name: str) -> int | None:
-    """Получает ID серии по её имени (синхронно)."""
+    """Получает ID серии по её имени (из кэша справочников; session оставлена для совместимости)."""
     if series_table is None:
         logger.error("Таблица Series не отражена.")
         return None
-    series_stmt = select(series_table.c.series_id).where(series_table.c.series_name == series_name)
-    # Используем переданную сессию
-    series_id = session.execute(series_stmt).scalar_one_or_none()
+    series_id = DIMENSIONS.get_id(series_table.name, series_name)
     if not series_id:
         logger.warning(f"Серия '{series_name}' не найдена в БД.")
     return series_id
@@ -139,11 +527,14 @@ def get_id_by_name(session: Session, table, name_column_name: str, id_column_nam
         logger.error(f"В таблице {table.name} нет столбца {id_column_name}")
         return None
 
-    name_column = getattr(table.c, name_column_name)
-    id_column = getattr(table.c, id_column_name)
-
-    stmt = select(id_column).where(func.lower(name_column) == func.lower(entity_name))
-    result = session.execute(stmt).scalar_one_or_none() # Выполняем синхронно
+    if _DIMENSION_COLUMNS.get(table.name) == (id_column_name, name_column_name):
+        # Справочник целиком в памяти — поиск по словарю без обращения к БД
+        result = DIMENSIONS.get_id(table.name, entity_name)
+    else:
+        name_column = getattr(table.c, name_column_name)
+        id_column = getattr(table.c, id_column_name)
+        stmt = select(id_column).where(func.lower(name_column) == func.lower(entity_name))
+        result = session.execute(stmt).scalar_one_or_none() # Выполняем синхронно
     if not result:
         logger.warning(f"Сущность с именем '{entity_name}' не найдена в таблице {table.name}.")
     return result
@@ -160,6 +551,7 @@ def get_manufacturer_id_by_name(session: Session, manufacturer_name: str) -> int
     """Получает ID производителя по имени (без учета регистра, синхронно)."""
     return get_id_by_name(session, manufacturers_table, "manufacturer_name", "manufacturer_id", manufacturer_name)
 
+@QUERY_CACHE.cached(ttl=_TTL_RACES)
 def get_races_for_season(season: int, series_name: str = 'Cup', page: int = 1, page_size: int = 7):
     """Получает список гонок (включая ID) для сезона/серии с пагинацией (синхронно)."""
     logger.info(f"Запрос гонок: season={season}, series='{series_name}', page={page}")
@@ -173,11 +565,12 @@ def get_races_for_season(season: int, series_name: str = 'Cup', page: int = 1, p
             series_id = get_series_id_by_name(session, series_name)
             if not series_id: return [], 1, 1 # Если серия не найдена
 
-            count_stmt = select(func.count(races_table.c.race_id)).where(
-                (races_table.c.season == season) & (races_table.c.series_id == series_id)
-            )
+            params = {'season': season, 'series_id': series_id}
+            count_stmt = _statement('races_count', lambda: select(func.count(races_table.c.race_id)).where(
+                (races_table.c.season == bindparam('season')) & (races_table.c.series_id == bindparam('series_id'))
+            ))
             # Выполняем синхронно
-            total_races = session.execute(count_stmt).scalar_one()
+            total_races = session.execute(count_stmt, params).scalar_one()
             logger.info(f"Найдено всего гонок: {total_races}")
             if total_races == 0: return [], 1, 1
 
@@ -186,6 +579,37 @@ def get_races_for_season(season: int, series_name: str = 'Cup', page: int = 1, p
             offset = (page - 1) * page_size
             logger.info(f"Пагинация: total_pages={total_pages}, current_page={page}, offset={offset}")
 
+            races_stmt = _statement('races_page', _build_races_page_statement)
+
+            # Выполняем синхронно
+            races_list = session.execute(races_stmt, {**params, 'limit': page_size, 'offset': offset}).fetchall()
+            logger.info(f"Возвращено {len(races_list)} гонок для страницы.")
+            return races_list, page, total_pages
+        except Exception as e:
+            logger.error(f"Ошибка получения гонок (season={season}, page={page}): {e}", exc_info=True)
+            return [], 1, 1 # Возвращаем пустой список при ошибке
+
+@QUERY_CACHE.cached(ttl=_TTL_RACES)
+def get_races_for_season_after(season: int, series_name: str = 'Cup', cursor: str | None = None, page_size: int = 50):
+    """
+    Keyset-пагинация гонок сезона: возвращает (гонки, токен следующей страницы или None).
+    Без COUNT и OFFSET — страница ищется по ключу (race_num_in_season, race_id) последней строки.
+    """
+    logger.info(f"Запрос гонок (keyset): season={season}, series='{series_name}', cursor={'да' if cursor else 'нет'}")
+    if races_table is None or tracks_table is None or series_table is None:
+        logger.error("Таблицы Races, Tracks или Series не отражены.")
+        return [], None
+    scope = ['races', season, series_name]
+    order_keys = [
+        ('race_num_in_season', races_table.c.race_num_in_season, False),
+        ('race_id', races_table.c.race_id, False),
+    ]
+    with get_db_session() as session:
+        try:
+            after = db_keyset.decode_cursor(cursor, scope) if cursor else None
+            series_id = get_series_id_by_name(session, series_name)
+            if not series_id: return [], None
+
             races_stmt = select(
                 races_table.c.race_id, races_table.c.race_num_in_season,
                 races_table.c.race_name, tracks_table.c.track_name,
@@ -193,18 +617,18 @@ def get_races_for_season(season: int, series_name: str = 'Cup', page: int = 1, p
             ).join(tracks_table, races_table.c.track_id == tracks_table.c.track_id
             ).where(
                 (races_table.c.season == season) & (races_table.c.series_id == series_id)
-            ).order_by(
-                asc(races_table.c.race_num_in_season)
-            ).limit(page_size).offset(offset)
+            ).order_by(*db_keyset.order_by_clauses(order_keys)).limit(page_size + 1)
+            if after is not None:
+                races_stmt = races_stmt.where(db_keyset.seek_condition(order_keys, after))
 
-            # Выполняем синхронно
-            races_list = session.execute(races_stmt).fetchall()
-            logger.info(f"Возвращено {len(races_list)} гонок для страницы.")
-            return races_list, page, total_pages
+            races_list, next_cursor = db_keyset.split_page(session.execute(races_stmt).fetchall(), order_keys, page_size, scope)
+            logger.info(f"Возвращено {len(races_list)} гонок, есть продолжение: {next_cursor is not None}")
+            return races_list, next_cursor
         except Exception as e:
-            logger.error(f"Ошибка получения гонок (season={season}, page={page}): {e}", exc_info=True)
-            return [], 1, 1 # Возвращаем пустой список при ошибке
+            logger.error(f"Ошибка получения гонок (keyset, season={season}): {e}", exc_info=True)
+            return [], None
 
+@QUERY_CACHE.cached(ttl=_TTL_RACES)
 def get_race_details_and_results(race_id: int):
     """Получает детали гонки и ВСЕ результаты (синхронно)."""
     logger.info(f"Запрос деталей и результатов для race_id={race_id}")
@@ -218,45 +642,311 @@ def get_race_details_and_results(race_id: int):
     # Используем сессию внутри
     with get_db_session() as session:
         try:
-            details_stmt = select(
-                races_table.c.race_name, races_table.c.season,
-                tracks_table.c.track_name, tracks_table.c.track_length, tracks_table.c.track_surface,
-                series_table.c.series_name
-            ).select_from(races_table
-            ).join(tracks_table, races_table.c.track_id == tracks_table.c.track_id
-            ).join(series_table, races_table.c.series_id == series_table.c.series_id
-            ).where(races_table.c.race_id == race_id)
+            details_stmt = _statement('race_details', _build_race_details_statement)
             # Выполняем синхронно
-            race_details = session.execute(details_stmt).fetchone()
+            race_details = session.execute(details_stmt, {'race_id': race_id}).fetchone()
 
             if not race_details:
                 logger.warning(f"Детали гонки для race_id={race_id} не найдены.")
                 return None, None
             logger.info(f"Детали гонки найдены: {race_details.race_name}")
 
-            results_stmt = select(
-                race_entries_table.c.finish_position, race_entries_table.c.start_position,
-                race_entries_table.c.car_number, race_entries_table.c.laps_completed,
-                race_entries_table.c.laps_led, race_entries_table.c.status,
-                drivers_table.c.driver_name, teams_table.c.team_name,
-                manufacturers_table.c.manufacturer_name
-            ).select_from(race_entries_table
-            ).join(drivers_table, race_entries_table.c.driver_id == drivers_table.c.driver_id, isouter=True # isouter=True на случай отсутствия гонщика в справочнике
-            ).join(teams_table, race_entries_table.c.team_id == teams_table.c.team_id, isouter=True
-            ).join(manufacturers_table, race_entries_table.c.manufacturer_id == manufacturers_table.c.manufacturer_id, isouter=True
-            ).where(race_entries_table.c.race_id == race_id
-            ).order_by(
-                asc(race_entries_table.c.finish_position) # Сортируем по финишной позиции
-            )
+            results_stmt = _statement('race_results', _build_race_results_statement)
 
             # Выполняем синхронно
-            results = session.execute(results_stmt).fetchall()
+            results = session.execute(results_stmt, {'race_id': race_id}).fetchall()
             logger.info(f"Найдено результатов гонки: {len(results) if results else 0}")
             return race_details, results
         except Exception as e:
             logger.error(f"Ошибка получения деталей/результатов (race_id={race_id}): {e}", exc_info=True)
             return None, None # Возвращаем None при ошибке
 
+def _season_filter(season, series_id):
+    """
+    Условие «гонка сезона season серии series_id» для запросов RaceEntries JOIN Races.
+    В секционированной схеме (data/partitioning.py) season/series_id есть и в RaceEntries:
+    условие на них позволяет PostgreSQL читать только секцию нужной серии (partition pruning).
+    """
+    condition = (races_table.c.season == season) & (races_table.c.series_id == series_id)
+    if 'series_id' in race_entries_table.c and 'season' in race_entries_table.c:
+        condition &= (race_entries_table.c.season == season) & (race_entries_table.c.series_id == series_id)
+    return condition
+
+def _build_races_page_statement():
+    return select(
+        races_table.c.race_id, races_table.c.race_num_in_season,
+        races_table.c.race_name, tracks_table.c.track_name,
+        tracks_table.c.track_length, tracks_table.c.track_surface
+    ).join(tracks_table, races_table.c.track_id == tracks_table.c.track_id
+    ).where(
+        (races_table.c.season == bindparam('season')) & (races_table.c.series_id == bindparam('series_id'))
+    ).order_by(
+        asc(races_table.c.race_num_in_season)
+    ).limit(bindparam('limit')).offset(bindparam('offset'))
+
+def _build_race_details_statement():
+    return select(
+        races_table.c.race_name, races_table.c.season,
+        tracks_table.c.track_name, tracks_table.c.track_length, tracks_table.c.track_surface,
+        series_table.c.series_name
+    ).select_from(races_table
+    ).join(tracks_table, races_table.c.track_id == tracks_table.c.track_id
+    ).join(series_table, races_table.c.series_id == series_table.c.series_id
+    ).where(races_table.c.race_id == bindparam('race_id'))
+
+def _build_race_results_statement():
+    return select(
+        race_entries_table.c.finish_position, race_entries_table.c.start_position,
+        race_entries_table.c.car_number, race_entries_table.c.laps_completed,
+        race_entries_table.c.laps_led, race_entries_table.c.status,
+        drivers_table.c.driver_name, teams_table.c.team_name,
+        manufacturers_table.c.manufacturer_name
+    ).select_from(race_entries_table
+    ).join(drivers_table, race_entries_table.c.driver_id == drivers_table.c.driver_id, isouter=True # isouter=True на случай отсутствия гонщика в справочнике
+    ).join(teams_table, race_entries_table.c.team_id == teams_table.c.team_id, isouter=True
+    ).join(manufacturers_table, race_entries_table.c.manufacturer_id == manufacturers_table.c.manufacturer_id, isouter=True
+    ).where(race_entries_table.c.race_id == bindparam('race_id')
+    ).order_by(
+        asc(race_entries_table.c.finish_position) # Сортируем по финишной позиции
+    )
+
+def _build_driver_standings_statements():
+    """(запрос количества, запрос страницы) рейтинга гонщиков с параметрами season, series_id, limit, offset."""
+    subq = _driver_standings_subquery(bindparam('season'), bindparam('series_id'))
+    count_stmt = select(func.count()).select_from(subq)
+    standings_stmt = select(
+        subq.c.driver_id, drivers_table.c.driver_name,
+        subq.c.total_points, subq.c.total_wins, subq.c.races_entered
+    ).select_from(subq # Выбираем из подзапроса
+    ).join(drivers_table, subq.c.driver_id == drivers_table.c.driver_id # Присоединяем имена гонщиков
+    ).order_by(
+        desc(subq.c.total_points), # Сортируем по очкам (убыв.)
+        desc(subq.c.total_wins),   # Затем по победам (убыв.)
+        asc(drivers_table.c.driver_name) # Затем по имени (возр.)
+    ).limit(bindparam('limit')).offset(bindparam('offset'))
+    return count_stmt, standings_stmt
+
+def _build_team_standings_statements():
+    """(запрос количества, запрос страницы) рейтинга команд с параметрами season, series_id, limit, offset."""
+    subq = _team_standings_subquery(bindparam('season'), bindparam('series_id'))
+    count_stmt = select(func.count()).select_from(subq)
+    standings_stmt = select(
+        subq.c.team_id,
+        teams_table.c.team_name,
+        subq.c.total_wins,
+        subq.c.total_points,
+        subq.c.total_top5,
+        subq.c.total_entries
+    ).select_from(subq
+    ).join(teams_table, subq.c.team_id == teams_table.c.team_id
+    ).order_by(
+        # Сортировка может быть разной, например, по победам, потом по очкам
+        desc(subq.c.total_wins),
+        desc(subq.c.total_points),
+        desc(subq.c.total_top5),
+        asc(teams_table.c.team_name) # По имени для стабильности
+    ).limit(bindparam('limit')).offset(bindparam('offset'))
+    return count_stmt, standings_stmt
+
+def _build_driver_race_results_statement():
+    return select(
+        races_table.c.race_num_in_season,
+        race_entries_table.c.start_position,
+        race_entries_table.c.finish_position,
+        race_entries_table.c.points # <--- Добавляем столбец очков
+    ).select_from(race_entries_table
+    ).join(races_table, race_entries_table.c.race_id == races_table.c.race_id
+    ).where(
+        (race_entries_table.c.driver_id == bindparam('driver_id')) &
+        _season_filter(bindparam('season'), bindparam('series_id'))
+        # Убираем фильтр по finish_position != None, т.к. очки могут быть и за DNF
+    ).order_by(asc(races_table.c.race_num_in_season)) # Сортируем по номеру гонки
+
+def _build_team_race_results_statement():
+    # Группируем по гонке и считаем средние значения
+    return select(
+        races_table.c.race_num_in_season,
+        func.avg(cast(race_entries_table.c.start_position, Float)).label('avg_start'),
+        func.avg(cast(race_entries_table.c.finish_position, Float)).label('avg_finish')
+    ).select_from(race_entries_table
+    ).join(races_table, race_entries_table.c.race_id == races_table.c.race_id
+    ).where(
+        (race_entries_table.c.team_id == bindparam('team_id')) &
+        _season_filter(bindparam('season'), bindparam('series_id')) &
+        (race_entries_table.c.finish_position != None) & # Учитываем только финишировавших
+        (race_entries_table.c.start_position != None) # И тех, у кого есть стартовая позиция
+    ).group_by(
+        races_table.c.race_id, # Группируем по ID гонки
+        races_table.c.race_num_in_season # И по номеру гонки в сезоне
+    ).order_by(asc(races_table.c.race_num_in_season)) # Сортируем по номеру гонки
+
+def _driver_standings_subquery(season: int, series_id: int):
+    """Подзапрос (driver_id, total_points, total_wins, races_entered) для рейтинга гонщиков сезона."""
+    if driver_season_stats_table is not None:
+        # Готовые посезонные агрегаты
+        return select(
+            driver_season_stats_table.c.driver_id,
+            driver_season_stats_table.c.standings_points.label('total_points'),
+            driver_season_stats_table.c.standings_wins.label('total_wins'),
+            driver_season_stats_table.c.standings_races.label('races_entered')
+        ).where(
+            (driver_season_stats_table.c.season == season) &
+            (driver_season_stats_table.c.series_id == series_id) &
+            (driver_season_stats_table.c.standings_races > 0)
+        ).subquery()
+
+    return select(
+        race_entries_table.c.driver_id,
+        func.sum(race_entries_table.c.points).label('total_points'),
+        func.sum(race_entries_table.c.won_race).label('total_wins'),
+        func.count(race_entries_table.c.race_id).label('races_entered') # Считаем количество гонок
+    ).join(races_table, race_entries_table.c.race_id == races_table.c.race_id
+    ).where(
+        _season_filter(season, series_id) &
+        (race_entries_table.c.points != None) & # Исключаем записи без очков? (можно убрать, если очки могут быть 0)
+        (race_entries_table.c.driver_id != None) # Исключаем записи без гонщика
+    ).group_by(race_entries_table.c.driver_id
+    ).subquery() # Делаем это подзапросом
+
+def _team_standings_subquery(season: int, series_id: int):
+    """Подзапрос (team_id, total_wins, total_points, total_top5, total_entries) для рейтинга команд сезона."""
+    if team_season_stats_table is not None:
+        return select(
+            team_season_stats_table.c.team_id,
+            team_season_stats_table.c.standings_wins.label('total_wins'),
+            team_season_stats_table.c.standings_points.label('total_points'),
+            team_season_stats_table.c.standings_top5.label('total_top5'),
+            team_season_stats_table.c.standings_entries.label('total_entries')
+        ).where(
+            (team_season_stats_table.c.season == season) &
+            (team_season_stats_table.c.series_id == series_id)
+        ).subquery()
+
+    return select(
+        race_entries_table.c.team_id,
+        func.sum(race_entries_table.c.won_race).label('total_wins'),
+        # Суммируем очки всех гонщиков команды
+        func.sum(func.coalesce(race_entries_table.c.points, 0)).label('total_points'),
+        func.sum(case((race_entries_table.c.finish_position <= 5, 1), else_=0)).label('total_top5'),
+        func.count(race_entries_table.c.driver_id).label('total_entries') # Считаем участия машин
+    ).join(races_table, race_entries_table.c.race_id == races_table.c.race_id
+    ).where(
+        _season_filter(season, series_id) &
+        (race_entries_table.c.team_id != None) & # У команды должен быть ID
+        (race_entries_table.c.driver_id != None) # У участия должен быть гонщик
+    ).group_by(race_entries_table.c.team_id
+    ).subquery()
+
+def _season_stats_from_rollup(rollup_table, id_column_name: str, entity_ids: list, season: int, series_id: int, count_label: str):
+    """
+    Запрос детальной статистики сезона из таблицы агрегатов с теми же метками,
+    что и у запроса по RaceEntries (средние восстанавливаются из суммы и количества).
+    Первый столбец — id сущности, по строке на каждый id из entity_ids.
+    """
+    c = rollup_table.c
+    return select(
+        getattr(c, id_column_name),
+        getattr(c, count_label).label(count_label),
+        c.wins, c.top5, c.top10, c.laps_led, c.laps_completed,
+        (cast(c.start_sum, Float) / func.nullif(c.start_count, 0)).label('avg_start'),
+        (cast(c.finish_sum, Float) / func.nullif(getattr(c, count_label), 0)).label('avg_finish'),
+        c.points
+    ).where(
+        getattr(c, id_column_name).in_(entity_ids) &
+        (c.season == season) &
+        (c.series_id == series_id)
+    )
+
+def _stats_to_details(stats_result, count_label: str, with_details: bool = True) -> dict:
+    """Преобразует строку агрегированной статистики в словарь (нули/None, если записей нет)."""
+    if stats_result is None or not getattr(stats_result, count_label):
+        details = {count_label: 0, 'wins': 0, 'top5': 0, 'top10': 0, 'laps_led': 0}
+        if with_details:
+            details.update({'laps_completed': 0, 'avg_start': None, 'avg_finish': None, 'points': 0})
+        return details
+    details = {
+        count_label: getattr(stats_result, count_label) or 0, 'wins': stats_result.wins or 0,
+        'top5': stats_result.top5 or 0, 'top10': stats_result.top10 or 0,
+        'laps_led': stats_result.laps_led or 0
+    }
+    if with_details:
+        details.update({
+            'laps_completed': stats_result.laps_completed or 0,
+            'avg_start': round(stats_result.avg_start, 1) if stats_result.avg_start else None,
+            'avg_finish': round(stats_result.avg_finish, 1) if stats_result.avg_finish else None,
+            'points': stats_result.points if stats_result.points is not None else 0
+        })
+    return details
+
+def _ordered_driver_standings(season: int, series_id: int):
+    """Ключи сортировки и запрос полного рейтинга гонщиков в порядке keyset-пагинации."""
+    subq = _driver_standings_subquery(season, series_id)
+    order_keys = [
+        ('total_points', subq.c.total_points, True),
+        ('total_wins', subq.c.total_wins, True),
+        ('driver_name', drivers_table.c.driver_name, False),
+        ('driver_id', subq.c.driver_id, False), # Уникальный ключ для равных имён
+    ]
+    standings_stmt = select(
+        subq.c.driver_id, drivers_table.c.driver_name,
+        subq.c.total_points, subq.c.total_wins, subq.c.races_entered
+    ).select_from(subq
+    ).join(drivers_table, subq.c.driver_id == drivers_table.c.driver_id
+    ).order_by(*db_keyset.order_by_clauses(order_keys))
+    return order_keys, standings_stmt
+
+def _ordered_team_standings(season: int, series_id: int):
+    """Ключи сортировки и запрос полного рейтинга команд в порядке keyset-пагинации."""
+    subq = _team_standings_subquery(season, series_id)
+    order_keys = [
+        ('total_wins', subq.c.total_wins, True),
+        ('total_points', subq.c.total_points, True),
+        ('total_top5', subq.c.total_top5, True),
+        ('team_name', teams_table.c.team_name, False),
+        ('team_id', subq.c.team_id, False), # Уникальный ключ для равных имён
+    ]
+    standings_stmt = select(
+        subq.c.team_id,
+        teams_table.c.team_name,
+        subq.c.total_wins,
+        subq.c.total_points,
+        subq.c.total_top5,
+        subq.c.total_entries
+    ).select_from(subq
+    ).join(teams_table, subq.c.team_id == teams_table.c.team_id
+    ).order_by(*db_keyset.order_by_clauses(order_keys))
+    return order_keys, standings_stmt
+
+def _stream_standings(kind: str, season: int, series_name: str, fetch_page, chunk_size: int):
+    """
+    Общая часть iter_*_standings: порции строк рейтинга списками по chunk_size.
+    Каждая порция — keyset-страница fetch_page(season, series_name, cursor, chunk_size) в своей короткой
+    сессии: между порциями (пока UI обрабатывает события) не держатся ни соединение, ни транзакция,
+    ни блокировка схемы. В памяти одновременно только одна порция.
+    """
+    logger.info(f"Потоковый запрос рейтинга ({kind}): season={season}, series='{series_name}', порция {chunk_size}")
+    cursor, streamed = None, 0
+    while True:
+        rows, cursor = fetch_page(season, series_name, cursor, chunk_size)
+        if rows:
+            streamed += len(rows)
+            yield rows
+        if cursor is None:
+            break
+    logger.info(f"Потоковый рейтинг ({kind}): выдано {streamed} строк.")
+
+def iter_driver_standings(season: int, series_name: str = 'Cup', chunk_size: int = STREAM_CHUNK_SIZE):
+    """
+    Весь рейтинг гонщиков сезона порциями (списки строк как у get_driver_standings_after, в том же порядке).
+    Для длинных списков в UI: первая порция доступна сразу, без материализации всего результата.
+    """
+    return _stream_standings('гонщики', season, series_name, get_driver_standings_after, chunk_size)
+
+def iter_team_standings(season: int, series_name: str = 'Cup', chunk_size: int = STREAM_CHUNK_SIZE):
+    """Весь рейтинг команд сезона порциями (строки как у get_team_standings_after, в том же порядке)."""
+    return _stream_standings('команды', season, series_name, get_team_standings_after, chunk_size)
+
+@QUERY_CACHE.cached(ttl=_TTL_STANDINGS)
 def get_driver_standings(season: int, series_name: str = 'Cup', page: int = 1, page_size: int = 10):
     """Получает рейтинг гонщиков за сезон с пагинацией (синхронно)."""
     logger.info(f"Запрос рейтинга гонщиков: season={season}, series='{series_name}', page={page}")
@@ -266,29 +956,20 @@ def get_driver_standings(season: int, series_name: str = 'Cup', page: int = 1, p
         logger.error(f"Одна или несколько таблиц не отражены для get_driver_standings: {', '.join(missing)}")
         return [], 1, 1
 
+    if SNAPSHOT is not None: # Локальная агрегация по снимку вместо запроса к БД
+        return SNAPSHOT.driver_standings(season, series_name, page, page_size)
+
     with get_db_session() as session:
         try:
             series_id = get_series_id_by_name(session, series_name)
             if not series_id: return [], 1, 1
 
-            # Подзапрос для агрегации статистики по гонщикам
-            subq = select(
-                race_entries_table.c.driver_id,
-                func.sum(race_entries_table.c.points).label('total_points'),
-                func.sum(race_entries_table.c.won_race).label('total_wins'),
-                func.count(race_entries_table.c.race_id).label('races_entered') # Считаем количество гонок
-            ).join(races_table, race_entries_table.c.race_id == races_table.c.race_id
-            ).where(
-                (races_table.c.season == season) &
-                (races_table.c.series_id == series_id) &
-                (race_entries_table.c.points != None) & # Исключаем записи без очков? (можно убрать, если очки могут быть 0)
-                (race_entries_table.c.driver_id != None) # Исключаем записи без гонщика
-            ).group_by(race_entries_table.c.driver_id
-            ).subquery() # Делаем это подзапросом
-
-            # Запрос для подсчета общего количества гонщиков в рейтинге
-            count_stmt = select(func.count()).select_from(subq)
-            total_drivers = session.execute(count_stmt).scalar_one()
+            # Подзапрос для агрегации статистики по гонщикам (из агрегатов или по RaceEntries)
+            # и запросы количества и страницы поверх него
+            count_stmt, standings_stmt = _statement('driver_standings', _build_driver_standings_statements)
+            params = {'season': season, 'series_id': series_id}
+
+            total_drivers = session.execute(count_stmt, params).scalar_one()
             logger.info(f"Найдено всего гонщиков в рейтинге: {total_drivers}")
             if total_drivers == 0: return [], 1, 1
 
@@ -298,24 +979,57 @@ def get_driver_standings(season: int, series_name: str = 'Cup', page: int = 1, p
             logger.info(f"Пагинация: total_pages={total_pages}, current_page={page}, offset={offset}")
 
             # Основной запрос для получения страницы рейтинга
-            standings_stmt = select(
-                subq.c.driver_id, drivers_table.c.driver_name,
-                subq.c.total_points, subq.c.total_wins, subq.c.races_entered
-            ).select_from(subq # Выбираем из подзапроса
-            ).join(drivers_table, subq.c.driver_id == drivers_table.c.driver_id # Присоединяем имена гонщиков
-            ).order_by(
-                desc(subq.c.total_points), # Сортируем по очкам (убыв.)
-                desc(subq.c.total_wins),   # Затем по победам (убыв.)
-                asc(drivers_table.c.driver_name) # Затем по имени (возр.)
-            ).limit(page_size).offset(offset)
-
-            standings_list = session.execute(standings_stmt).fetchall()
+            standings_list = session.execute(standings_stmt, {**params, 'limit': page_size, 'offset': offset}).fetchall()
             logger.info(f"Возвращено {len(standings_list)} гонщиков для страницы.")
             return standings_list, page, total_pages
         except Exception as e:
             logger.error(f"Ошибка получения рейтинга гонщиков (season={season}, page={page}): {e}", exc_info=True)
             return [], 1, 1 # Возвращаем пустоту при ошибке
 
+@QUERY_CACHE.cached(ttl=_TTL_STANDINGS)
+def get_driver_standings_after(season: int, series_name: str = 'Cup', cursor: str | None = None, page_size: int = 100):
+    """
+    Keyset-пагинация рейтинга гонщиков: возвращает (страница, токен следующей страницы или None).
+    Страница ищется по ключу (total_points, total_wins, driver_name, driver_id) последней строки,
+    поэтому дальние страницы стоят столько же, сколько первая.
+    """
+    logger.info(f"Запрос рейтинга гонщиков (keyset): season={season}, series='{series_name}', cursor={'да' if cursor else 'нет'}")
+    required_tables = [race_entries_table, races_table, drivers_table, series_table]
+    if any(table is None for table in required_tables):
+        logger.error("Одна или несколько таблиц не отражены для get_driver_standings_after.")
+        return [], None
+    scope = ['driver_standings', season, series_name]
+
+    if SNAPSHOT is not None: # Локальная агрегация по снимку вместо запроса к БД
+        try:
+            after = db_keyset.decode_cursor(cursor, scope) if cursor else None
+        except ValueError as e:
+            logger.error(str(e))
+            return [], None
+        order_keys = [('total_points', None, True), ('total_wins', None, True), ('driver_name', None, False), ('driver_id', None, False)]
+        rows, _, _ = SNAPSHOT.driver_standings(season, series_name, 1, sys.maxsize)
+        rows.sort(key=lambda r: (-r.total_points, -r.total_wins, r.driver_name, r.driver_id))
+        return db_keyset.split_page(db_keyset.seek_rows(rows, order_keys, after, page_size), order_keys, page_size, scope)
+
+    with get_db_session() as session:
+        try:
+            after = db_keyset.decode_cursor(cursor, scope) if cursor else None
+            series_id = get_series_id_by_name(session, series_name)
+            if not series_id: return [], None
+
+            order_keys, standings_stmt = _ordered_driver_standings(season, series_id)
+            standings_stmt = standings_stmt.limit(page_size + 1)
+            if after is not None:
+                standings_stmt = standings_stmt.where(db_keyset.seek_condition(order_keys, after))
+
+            standings_list, next_cursor = db_keyset.split_page(session.execute(standings_stmt).fetchall(), order_keys, page_size, scope)
+            logger.info(f"Возвращено {len(standings_list)} гонщиков, есть продолжение: {next_cursor is not None}")
+            return standings_list, next_cursor
+        except Exception as e:
+            logger.error(f"Ошибка получения рейтинга гонщиков (keyset, season={season}): {e}", exc_info=True)
+            return [], None
+
+@QUERY_CACHE.cached(ttl=_TTL_DETAILS)
 def get_driver_season_details(driver_id: int, season: int, series_name: str = 'Cup'):
     """Получает детальную статистику гонщика за сезон (синхронно)."""
     logger.info(f"Запрос деталей гонщика: driver_id={driver_id}, season={season}, series='{series_name}'")
@@ -325,6 +1039,9 @@ def get_driver_season_details(driver_id: int, season: int, series_name: str = 'C
         logger.error(f"Одна или несколько таблиц не отражены для get_driver_season_details: {', '.join(missing)}")
         return None
 
+    if SNAPSHOT is not None: # Локальная агрегация по снимку вместо запроса к БД
+        return SNAPSHOT.driver_season_details(driver_id, season, series_name)
+
     with get_db_session() as session:
         try:
             series_id = get_series_id_by_name(session, series_name)
@@ -339,47 +1056,37 @@ def get_driver_season_details(driver_id: int, season: int, series_name: str = 'C
             logger.info(f"Найден гонщик: {driver_name}")
 
             # Затем получаем агрегированную статистику
-            stats_stmt = select(
-                func.count(race_entries_table.c.race_id).label('races'),
-                func.sum(race_entries_table.c.won_race).label('wins'),
-                func.sum(case((race_entries_table.c.finish_position <= 5, 1), else_=0)).label('top5'),
-                func.sum(case((race_entries_table.c.finish_position <= 10, 1), else_=0)).label('top10'),
-                func.sum(func.coalesce(race_entries_table.c.laps_led, 0)).label('laps_led'), # Используем coalesce для суммы NULLs как 0
-                func.sum(func.coalesce(race_entries_table.c.laps_completed, 0)).label('laps_completed'),
-                func.avg(cast(race_entries_table.c.start_position, Float)).label('avg_start'),
-                func.avg(cast(race_entries_table.c.finish_position, Float)).label('avg_finish'),
-                func.sum(func.coalesce(race_entries_table.c.points, 0)).label('points')
-            ).select_from(race_entries_table
-            ).join(races_table, race_entries_table.c.race_id == races_table.c.race_id
-            ).where(
-                (race_entries_table.c.driver_id == driver_id) &
-                (races_table.c.season == season) &
-                (races_table.c.series_id == series_id) &
-                (race_entries_table.c.finish_position != None) # Учитываем только финишировавших для средних
-                # Добавляем условие для старта, если start_position может быть NULL
-                # (race_entries_table.c.start_position != None)
-            )
+            if driver_season_stats_table is not None:
+                # Одна строка готового агрегата вместо GROUP BY по RaceEntries
+                stats_stmt = _season_stats_from_rollup(driver_season_stats_table, 'driver_id', [driver_id], season, series_id, 'races')
+            else:
+                stats_stmt = select(
+                    func.count(race_entries_table.c.race_id).label('races'),
+                    func.sum(race_entries_table.c.won_race).label('wins'),
+                    func.sum(case((race_entries_table.c.finish_position <= 5, 1), else_=0)).label('top5'),
+                    func.sum(case((race_entries_table.c.finish_position <= 10, 1), else_=0)).label('top10'),
+                    func.sum(func.coalesce(race_entries_table.c.laps_led, 0)).label('laps_led'), # Используем coalesce для суммы NULLs как 0
+                    func.sum(func.coalesce(race_entries_table.c.laps_completed, 0)).label('laps_completed'),
+                    func.avg(cast(race_entries_table.c.start_position, Float)).label('avg_start'),
+                    func.avg(cast(race_entries_table.c.finish_position, Float)).label('avg_finish'),
+                    func.sum(func.coalesce(race_entries_table.c.points, 0)).label('points')
+                ).select_from(race_entries_table
+                ).join(races_table, race_entries_table.c.race_id == races_table.c.race_id
+                ).where(
+                    (race_entries_table.c.driver_id == driver_id) &
+                    _season_filter(season, series_id) &
+                    (race_entries_table.c.finish_position != None) # Учитываем только финишировавших для средних
+                    # Добавляем условие для старта, если start_position может быть NULL
+                    # (race_entries_table.c.start_position != None)
+                )
 
             stats_result = session.execute(stats_stmt).fetchone() # Выполняем синхронно
             logger.info(f"Результат запроса статистики гонщика: {stats_result}")
 
             # Формируем результат, даже если гонок не было
             details = {'driver_name': driver_name, 'season': season, 'series_name': series_name}
-            if stats_result and stats_result.races is not None and stats_result.races > 0:
-                 details.update({
-                    'races': stats_result.races or 0, 'wins': stats_result.wins or 0,
-                    'top5': stats_result.top5 or 0, 'top10': stats_result.top10 or 0,
-                    'laps_led': stats_result.laps_led or 0, 'laps_completed': stats_result.laps_completed or 0,
-                    'avg_start': round(stats_result.avg_start, 1) if stats_result.avg_start else None,
-                    'avg_finish': round(stats_result.avg_finish, 1) if stats_result.avg_finish else None,
-                    'points': stats_result.points if stats_result.points is not None else 0
-                })
-            else:
-                # Если гонок нет, заполняем нулями/None
-                details.update({
-                    'races': 0, 'wins': 0, 'top5': 0, 'top10': 0, 'laps_led': 0,
-                    'laps_completed': 0, 'avg_start': None, 'avg_finish': None, 'points': 0
-                })
+            details.update(_stats_to_details(stats_result, 'races'))
+            if not details['races']:
                 logger.info(f"Гонки для driver_id={driver_id}, season={season}, series={series_name} не найдены.")
 
             logger.info(f"Сформирован словарь деталей гонщика: {details}")
@@ -388,6 +1095,7 @@ def get_driver_season_details(driver_id: int, season: int, series_name: str = 'C
             logger.error(f"Ошибка получения деталей гонщика (driver_id={driver_id}, season={season}): {e}", exc_info=True)
             return None
 
+@QUERY_CACHE.cached(ttl=_TTL_DETAILS)
 def get_driver_race_results_for_season(driver_id: int, season: int, series_id: int):
     """
     Получает результаты (номер гонки, старт, финиш, ОЧКИ) для гонщика за сезон/серию.
@@ -401,23 +1109,13 @@ def get_driver_race_results_for_season(driver_id: int, season: int, series_id: i
         logger.error(f"Таблицы не отражены для get_driver_race_results_for_season: {', '.join(missing)}")
         return []
 
+    if SNAPSHOT is not None: # Локальная агрегация по снимку вместо запроса к БД
+        return SNAPSHOT.driver_race_results_for_season(driver_id, season, series_id)
+
     with get_db_session() as session:
         try:
-            stmt = select(
-                races_table.c.race_num_in_season,
-                race_entries_table.c.start_position,
-                race_entries_table.c.finish_position,
-                race_entries_table.c.points # <--- Добавляем столбец очков
-            ).select_from(race_entries_table
-            ).join(races_table, race_entries_table.c.race_id == races_table.c.race_id
-            ).where(
-                (race_entries_table.c.driver_id == driver_id) &
-                (races_table.c.season == season) &
-                (races_table.c.series_id == series_id)
-                # Убираем фильтр по finish_position != None, т.к. очки могут быть и за DNF
-            ).order_by(asc(races_table.c.race_num_in_season)) # Сортируем по номеру гонки
-
-            results = session.execute(stmt).fetchall()
+            stmt = _statement('driver_race_results', _build_driver_race_results_statement)
+            results = session.execute(stmt, {'driver_id': driver_id, 'season': season, 'series_id': series_id}).fetchall()
             logger.info(f"Найдено {len(results)} результатов гонок (с очками) для графика.")
             # Кортеж теперь содержит 4 элемента
             return results
@@ -425,6 +1123,7 @@ def get_driver_race_results_for_season(driver_id: int, season: int, series_id: i
             logger.error(f"Ошибка получения результатов гонок (с очками) для графика: {e}", exc_info=True)
             return []
 
+@QUERY_CACHE.cached(ttl=_TTL_STANDINGS)
 def get_team_standings(season: int, series_name: str = 'Cup', page: int = 1, page_size: int = 10):
     """Получает рейтинг команд за сезон с пагинацией (синхронно)."""
     logger.info(f"Запрос рейтинга команд: season={season}, series='{series_name}', page={page}")
@@ -434,31 +1133,20 @@ def get_team_standings(season: int, series_name: str = 'Cup', page: int = 1, pag
         logger.error(f"Одна или несколько таблиц не отражены для get_team_standings: {', '.join(missing)}")
         return [], 1, 1
 
+    if SNAPSHOT is not None: # Локальная агрегация по снимку вместо запроса к БД
+        return SNAPSHOT.team_standings(season, series_name, page, page_size)
+
     with get_db_session() as session:
         try:
             series_id = get_series_id_by_name(session, series_name)
             if not series_id: return [], 1, 1
 
-            # Подзапрос для агрегации статистики по командам
-            subq = select(
-                race_entries_table.c.team_id,
-                func.sum(race_entries_table.c.won_race).label('total_wins'),
-                # Суммируем очки всех гонщиков команды
-                func.sum(func.coalesce(race_entries_table.c.points, 0)).label('total_points'),
-                func.sum(case((race_entries_table.c.finish_position <= 5, 1), else_=0)).label('total_top5'),
-                func.count(race_entries_table.c.driver_id).label('total_entries') # Считаем участия машин
-            ).join(races_table, race_entries_table.c.race_id == races_table.c.race_id
-            ).where(
-                (races_table.c.season == season) &
-                (races_table.c.series_id == series_id) &
-                (race_entries_table.c.team_id != None) & # У команды должен быть ID
-                (race_entries_table.c.driver_id != None) # У участия должен быть гонщик
-            ).group_by(race_entries_table.c.team_id
-            ).subquery()
-
-            # Запрос для подсчета общего количества команд
-            count_stmt = select(func.count()).select_from(subq)
-            total_teams = session.execute(count_stmt).scalar_one()
+            # Подзапрос для агрегации статистики по командам (из агрегатов или по RaceEntries)
+            # и запросы количества и страницы поверх него
+            count_stmt, standings_stmt = _statement('team_standings', _build_team_standings_statements)
+            params = {'season': season, 'series_id': series_id}
+
+            total_teams = session.execute(count_stmt, params).scalar_one()
             logger.info(f"Найдено всего команд в рейтинге: {total_teams}")
             if total_teams == 0: return [], 1, 1
 
@@ -468,30 +1156,57 @@ def get_team_standings(season: int, series_name: str = 'Cup', page: int = 1, pag
             logger.info(f"Пагинация команд: total_pages={total_pages}, current_page={page}, offset={offset}")
 
             # Основной запрос для получения страницы рейтинга команд
-            standings_stmt = select(
-                subq.c.team_id,
-                teams_table.c.team_name,
-                subq.c.total_wins,
-                subq.c.total_points,
-                subq.c.total_top5,
-                subq.c.total_entries
-            ).select_from(subq
-            ).join(teams_table, subq.c.team_id == teams_table.c.team_id
-            ).order_by(
-                # Сортировка может быть разной, например, по победам, потом по очкам
-                desc(subq.c.total_wins),
-                desc(subq.c.total_points),
-                desc(subq.c.total_top5),
-                asc(teams_table.c.team_name) # По имени для стабильности
-            ).limit(page_size).offset(offset)
-
-            standings_list = session.execute(standings_stmt).fetchall()
+            standings_list = session.execute(standings_stmt, {**params, 'limit': page_size, 'offset': offset}).fetchall()
             logger.info(f"Возвращено {len(standings_list)} команд для страницы.")
             return standings_list, page, total_pages
         except Exception as e:
             logger.error(f"Ошибка получения рейтинга команд (season={season}, page={page}): {e}", exc_info=True)
             return [], 1, 1
 
+@QUERY_CACHE.cached(ttl=_TTL_STANDINGS)
+def get_team_standings_after(season: int, series_name: str = 'Cup', cursor: str | None = None, page_size: int = 100):
+    """
+    Keyset-пагинация рейтинга команд: возвращает (страница, токен следующей страницы или None).
+    Ключ: (total_wins, total_points, total_top5, team_name, team_id).
+    """
+    logger.info(f"Запрос рейтинга команд (keyset): season={season}, series='{series_name}', cursor={'да' if cursor else 'нет'}")
+    required_tables = [race_entries_table, races_table, teams_table, series_table]
+    if any(table is None for table in required_tables):
+        logger.error("Одна или несколько таблиц не отражены для get_team_standings_after.")
+        return [], None
+    scope = ['team_standings', season, series_name]
+
+    if SNAPSHOT is not None: # Локальная агрегация по снимку вместо запроса к БД
+        try:
+            after = db_keyset.decode_cursor(cursor, scope) if cursor else None
+        except ValueError as e:
+            logger.error(str(e))
+            return [], None
+        order_keys = [('total_wins', None, True), ('total_points', None, True), ('total_top5', None, True),
+                      ('team_name', None, False), ('team_id', None, False)]
+        rows, _, _ = SNAPSHOT.team_standings(season, series_name, 1, sys.maxsize)
+        rows.sort(key=lambda r: (-r.total_wins, -r.total_points, -r.total_top5, r.team_name, r.team_id))
+        return db_keyset.split_page(db_keyset.seek_rows(rows, order_keys, after, page_size), order_keys, page_size, scope)
+
+    with get_db_session() as session:
+        try:
+            after = db_keyset.decode_cursor(cursor, scope) if cursor else None
+            series_id = get_series_id_by_name(session, series_name)
+            if not series_id: return [], None
+
+            order_keys, standings_stmt = _ordered_team_standings(season, series_id)
+            standings_stmt = standings_stmt.limit(page_size + 1)
+            if after is not None:
+                standings_stmt = standings_stmt.where(db_keyset.seek_condition(order_keys, after))
+
+            standings_list, next_cursor = db_keyset.split_page(session.execute(standings_stmt).fetchall(), order_keys, page_size, scope)
+            logger.info(f"Возвращено {len(standings_list)} команд, есть продолжение: {next_cursor is not None}")
+            return standings_list, next_cursor
+        except Exception as e:
+            logger.error(f"Ошибка получения рейтинга команд (keyset, season={season}): {e}", exc_info=True)
+            return [], None
+
+@QUERY_CACHE.cached(ttl=_TTL_DETAILS)
 def get_team_season_details(team_id: int, season: int, series_name: str = 'Cup'):
     """Получает детальную статистику команды за сезон (синхронно)."""
     logger.info(f"Запрос деталей команды: team_id={team_id}, season={season}, series='{series_name}'")
@@ -501,6 +1216,9 @@ def get_team_season_details(team_id: int, season: int, series_name: str = 'Cup')
         logger.error(f"Одна или несколько таблиц не отражены для get_team_season_details: {', '.join(missing)}")
         return None
 
+    if SNAPSHOT is not None: # Локальная агрегация по снимку вместо запроса к БД
+        return SNAPSHOT.team_season_details(team_id, season, series_name)
+
     with get_db_session() as session:
         try:
             series_id = get_series_id_by_name(session, series_name)
@@ -514,46 +1232,37 @@ def get_team_season_details(team_id: int, season: int, series_name: str = 'Cup')
             logger.info(f"Найдена команда: {team_name}")
 
             # Запрос агрегированной статистики для команды
-            stats_stmt = select(
-                func.count(race_entries_table.c.driver_id).label('entries'), # Считаем участия машин
-                func.sum(race_entries_table.c.won_race).label('wins'),
-                func.sum(case((race_entries_table.c.finish_position <= 5, 1), else_=0)).label('top5'),
-                func.sum(case((race_entries_table.c.finish_position <= 10, 1), else_=0)).label('top10'),
-                func.sum(func.coalesce(race_entries_table.c.laps_led, 0)).label('laps_led'),
-                func.sum(func.coalesce(race_entries_table.c.laps_completed, 0)).label('laps_completed'),
-                # Средние значения по всем машинам команды
-                func.avg(cast(race_entries_table.c.start_position, Float)).label('avg_start'),
-                func.avg(cast(race_entries_table.c.finish_position, Float)).label('avg_finish'),
-                func.sum(func.coalesce(race_entries_table.c.points, 0)).label('points')
-            ).select_from(race_entries_table
-            ).join(races_table, race_entries_table.c.race_id == races_table.c.race_id
-            ).where(
-                (race_entries_table.c.team_id == team_id) &
-                (races_table.c.season == season) &
-                (races_table.c.series_id == series_id) &
-                (race_entries_table.c.finish_position != None) & # Для корректного среднего финиша
-                (race_entries_table.c.driver_id != None) # Убедимся что есть гонщик
-                # Возможно, стоит добавить условие и для start_position != None
-            )
+            if team_season_stats_table is not None:
+                # Одна строка готового агрегата вместо GROUP BY по RaceEntries
+                stats_stmt = _season_stats_from_rollup(team_season_stats_table, 'team_id', [team_id], season, series_id, 'entries')
+            else:
+                stats_stmt = select(
+                    func.count(race_entries_table.c.driver_id).label('entries'), # Считаем участия машин
+                    func.sum(race_entries_table.c.won_race).label('wins'),
+                    func.sum(case((race_entries_table.c.finish_position <= 5, 1), else_=0)).label('top5'),
+                    func.sum(case((race_entries_table.c.finish_position <= 10, 1), else_=0)).label('top10'),
+                    func.sum(func.coalesce(race_entries_table.c.laps_led, 0)).label('laps_led'),
+                    func.sum(func.coalesce(race_entries_table.c.laps_completed, 0)).label('laps_completed'),
+                    # Средние значения по всем машинам команды
+                    func.avg(cast(race_entries_table.c.start_position, Float)).label('avg_start'),
+                    func.avg(cast(race_entries_table.c.finish_position, Float)).label('avg_finish'),
+                    func.sum(func.coalesce(race_entries_table.c.points, 0)).label('points')
+                ).select_from(race_entries_table
+                ).join(races_table, race_entries_table.c.race_id == races_table.c.race_id
+                ).where(
+                    (race_entries_table.c.team_id == team_id) &
+                    _season_filter(season, series_id) &
+                    (race_entries_table.c.finish_position != None) & # Для корректного среднего финиша
+                    (race_entries_table.c.driver_id != None) # Убедимся что есть гонщик
+                    # Возможно, стоит добавить условие и для start_position != None
+                )
 
             stats_result = session.execute(stats_stmt).fetchone()
             logger.info(f"Результат запроса статистики команды: {stats_result}")
 
             details = {'team_name': team_name, 'season': season, 'series_name': series_name}
-            if stats_result and stats_result.entries is not None and stats_result.entries > 0:
-                 details.update({
-                    'entries': stats_result.entries or 0, 'wins': stats_result.wins or 0,
-                    'top5': stats_result.top5 or 0, 'top10': stats_result.top10 or 0,
-                    'laps_led': stats_result.laps_led or 0, 'laps_completed': stats_result.laps_completed or 0,
-                    'avg_start': round(stats_result.avg_start, 1) if stats_result.avg_start else None,
-                    'avg_finish': round(stats_result.avg_finish, 1) if stats_result.avg_finish else None,
-                    'points': stats_result.points if stats_result.points is not None else 0
-                })
-            else:
-                details.update({
-                    'entries': 0, 'wins': 0, 'top5': 0, 'top10': 0, 'laps_led': 0,
-                    'laps_completed': 0, 'avg_start': None, 'avg_finish': None, 'points': 0
-                })
+            details.update(_stats_to_details(stats_result, 'entries'))
+            if not details['entries']:
                 logger.info(f"Участия для team_id={team_id}, season={season}, series={series_name} не найдены.")
 
             logger.info(f"Сформирован словарь деталей команды: {details}")
@@ -562,6 +1271,7 @@ def get_team_season_details(team_id: int, season: int, series_name: str = 'Cup')
             logger.error(f"Ошибка получения деталей команды (team_id={team_id}, season={season}): {e}", exc_info=True)
             return None
 
+@QUERY_CACHE.cached(ttl=_TTL_STANDINGS)
 def get_manufacturer_season_stats(season: int, series_name: str = 'Cup'):
     """Получает агрегированную статистику по производителям за сезон (синхронно)."""
     logger.info(f"Запрос статистики производителей: season={season}, series='{series_name}'")
@@ -571,6 +1281,9 @@ def get_manufacturer_season_stats(season: int, series_name: str = 'Cup'):
         logger.error(f"Одна или несколько таблиц не отражены для get_manufacturer_season_stats: {', '.join(missing)}")
         return []
 
+    if SNAPSHOT is not None: # Локальная агрегация по снимку вместо запроса к БД
+        return SNAPSHOT.manufacturer_season_stats(season, series_name)
+
     with get_db_session() as session:
         try:
             series_id = get_series_id_by_name(session, series_name)
@@ -578,33 +1291,55 @@ def get_manufacturer_season_stats(season: int, series_name: str = 'Cup'):
                 return []
 
             # Запрос агрегированной статистики
-            stats_stmt = select(
-                manufacturers_table.c.manufacturer_id,  # ✅ Добавлено
-                manufacturers_table.c.manufacturer_name,
-                func.sum(race_entries_table.c.won_race).label('wins'),
-                func.sum(case((race_entries_table.c.finish_position <= 5, 1), else_=0)).label('top5'),
-                func.sum(case((race_entries_table.c.finish_position <= 10, 1), else_=0)).label('top10'),
-                func.sum(func.coalesce(race_entries_table.c.laps_led, 0)).label('laps_led'),
-                func.count(race_entries_table.c.driver_id).label('entries')
-            ).select_from(
-                race_entries_table
-            ).join(
-                races_table, race_entries_table.c.race_id == races_table.c.race_id
-            ).join(
-                manufacturers_table, race_entries_table.c.manufacturer_id == manufacturers_table.c.manufacturer_id
-            ).where(
-                (races_table.c.season == season) &
-                (races_table.c.series_id == series_id) &
-                (race_entries_table.c.manufacturer_id != None) &
-                (race_entries_table.c.driver_id != None)
-            ).group_by(
-                manufacturers_table.c.manufacturer_id,
-                manufacturers_table.c.manufacturer_name
-            ).order_by(
-                desc('wins'),
-                desc('top5'),
-                asc(manufacturers_table.c.manufacturer_name)
-            )
+            if manufacturer_season_stats_table is not None:
+                # Готовые посезонные агрегаты: по строке на производителя
+                stats_stmt = select(
+                    manufacturers_table.c.manufacturer_id,
+                    manufacturers_table.c.manufacturer_name,
+                    manufacturer_season_stats_table.c.wins,
+                    manufacturer_season_stats_table.c.top5,
+                    manufacturer_season_stats_table.c.top10,
+                    manufacturer_season_stats_table.c.laps_led,
+                    manufacturer_season_stats_table.c.entries
+                ).select_from(
+                    manufacturer_season_stats_table
+                ).join(
+                    manufacturers_table, manufacturer_season_stats_table.c.manufacturer_id == manufacturers_table.c.manufacturer_id
+                ).where(
+                    (manufacturer_season_stats_table.c.season == season) &
+                    (manufacturer_season_stats_table.c.series_id == series_id)
+                ).order_by(
+                    desc(manufacturer_season_stats_table.c.wins),
+                    desc(manufacturer_season_stats_table.c.top5),
+                    asc(manufacturers_table.c.manufacturer_name)
+                )
+            else:
+                stats_stmt = select(
+                    manufacturers_table.c.manufacturer_id,  # ✅ Добавлено
+                    manufacturers_table.c.manufacturer_name,
+                    func.sum(race_entries_table.c.won_race).label('wins'),
+                    func.sum(case((race_entries_table.c.finish_position <= 5, 1), else_=0)).label('top5'),
+                    func.sum(case((race_entries_table.c.finish_position <= 10, 1), else_=0)).label('top10'),
+                    func.sum(func.coalesce(race_entries_table.c.laps_led, 0)).label('laps_led'),
+                    func.count(race_entries_table.c.driver_id).label('entries')
+                ).select_from(
+                    race_entries_table
+                ).join(
+                    races_table, race_entries_table.c.race_id == races_table.c.race_id
+                ).join(
+                    manufacturers_table, race_entries_table.c.manufacturer_id == manufacturers_table.c.manufacturer_id
+                ).where(
+                    _season_filter(season, series_id) &
+                    (race_entries_table.c.manufacturer_id != None) &
+                    (race_entries_table.c.driver_id != None)
+                ).group_by(
+                    manufacturers_table.c.manufacturer_id,
+                    manufacturers_table.c.manufacturer_name
+                ).order_by(
+                    desc('wins'),
+                    desc('top5'),
+                    asc(manufacturers_table.c.manufacturer_name)
+                )
 
             results = session.execute(stats_stmt).mappings().all()
             logger.info(f"Найдена статистика для {len(results)} производителей.")
@@ -614,6 +1349,114 @@ def get_manufacturer_season_stats(season: int, series_name: str = 'Cup'):
             logger.error(f"Ошибка при получении статистики производителей (season={season}): {e}", exc_info=True)
             return []
 
+def _career_stats_from_rollup(rollup_table, id_column_name: str, entity_ids: list, count_label: str, with_details: bool = True):
+    """
+    Запрос статистики за всё время как сумма посезонных агрегатов.
+    Средние считаются из суммарных sum/count, поэтому совпадают с AVG по всем записям.
+    Первый столбец — id сущности, по строке на каждый найденный id из entity_ids.
+    """
+    c = rollup_table.c
+    id_column = getattr(c, id_column_name)
+    columns = [
+        id_column,
+        func.sum(getattr(c, count_label)).label(count_label),
+        func.sum(c.wins).label('wins'),
+        func.sum(c.top5).label('top5'),
+        func.sum(c.top10).label('top10'),
+        func.sum(c.laps_led).label('laps_led'),
+    ]
+    if with_details:
+        columns += [
+            func.sum(c.laps_completed).label('laps_completed'),
+            (cast(func.sum(c.start_sum), Float) / func.nullif(func.sum(c.start_count), 0)).label('avg_start'),
+            (cast(func.sum(c.finish_sum), Float) / func.nullif(func.sum(getattr(c, count_label)), 0)).label('avg_finish'),
+            func.sum(c.points).label('points'),
+        ]
+    return select(*columns).where(id_column.in_(entity_ids)).group_by(id_column)
+
+# Статистика за всё время хранится в QUERY_CACHE под ключом ('career_stats', тип сущности, id):
+# версия данных, TTL, лимиты и NASTATS_QUERY_CACHE=0 действуют на неё так же, как на остальные запросы.
+# Записи без сезона, поэтому invalidate_season_pairs сбрасывает их при любой загрузке.
+_CAREER_STATS_KEY = 'career_stats'
+
+def _get_cached_career_stats(entity_type: str, entity_id: int) -> dict | None:
+    """Возвращает копию закэшированной статистики за всё время (или None)."""
+    found, cached = QUERY_CACHE.lookup(_CAREER_STATS_KEY, {'entity_type': entity_type, 'entity_id': entity_id})
+    return cached if found else None
+
+def _store_career_stats(entity_type: str, entity_id: int, details: dict) -> dict:
+    QUERY_CACHE.store(_CAREER_STATS_KEY, {'entity_type': entity_type, 'entity_id': entity_id}, details, _TTL_DETAILS)
+    return details
+
+def clear_career_stats_cache():
+    """Сбрасывает кэш статистики за всё время (после загрузки новых данных)."""
+    QUERY_CACHE.discard(_CAREER_STATS_KEY)
+
+# --- Уведомления о загрузке данных (LISTEN/NOTIFY, см. data/change_events.py) ---
+# Отключаются NASTATS_LISTEN=0; без PostgreSQL изменения по-прежнему замечает проверка версии данных.
+CHANGE_LISTENER = None
+
+def invalidate_season_pairs(pairs) -> list:
+    """
+    Сбрасывает кэшированные результаты только для пар (season, series_id): функции сезона других пар
+    остаются в кэше, функции без сезона (карьера, детали гонки) сбрасываются всегда.
+    Обновляет LATEST_SEASON, справочники и снимок RaceEntries. Возвращает пары как (season, series_name).
+    """
+    pairs = {(int(season), int(series_id)) for season, series_id in pairs}
+    DIMENSIONS.invalidate() # Загрузка могла добавить гонщиков, команды, трассы
+    SEARCH_ROWS.invalidate()
+    named = sorted({(season, DIMENSIONS.get_name(series_table.name, series_id)) for season, series_id in pairs})
+    seasons = {season for season, _ in pairs}
+
+    def affected(function_name: str, arguments: dict) -> bool:
+        season = arguments.get('season')
+        if season is None:
+            return True
+        if 'series_id' in arguments:
+            return (season, arguments['series_id']) in pairs
+        if 'series_name' in arguments:
+            return (season, arguments['series_name']) in named
+        return season in seasons
+
+    removed = QUERY_CACHE.invalidate_matching(affected) # В т.ч. статистика за всё время (без сезона)
+    if SNAPSHOT is not None:
+        load_snapshot()
+    get_latest_season(force_refresh=True)
+    logger.info(f"Данные изменены для {named}: сброшено записей кэша {removed}, последний сезон {LATEST_SEASON}.")
+    return named
+
+def start_change_listener(on_change=None):
+    """
+    Запускает фоновый LISTEN основной БД (PostgreSQL). По уведомлению загрузчика: синхронизирует
+    локальную копию (её агрегаты пересчитываются по затронутым парам), направляет чтение в основную БД
+    до проигрыша загрузки репликой чтения, сбрасывает кэши этих пар
+    и вызывает on_change([(season, series_name), ...]) — из потока слушателя.
+    """
+    global CHANGE_LISTENER
+    if os.getenv('NASTATS_LISTEN') == '0':
+        return None
+    # LISTEN — только в основной БД: реплика (hot standby) уведомлений не получает
+    source = write_engine
+    if source is None or source.dialect.name != 'postgresql':
+        logger.info("Уведомления о загрузке данных доступны только для PostgreSQL — слушатель не запущен.")
+        return None
+
+    def _handle(pairs):
+        if REPLICA is not None:
+            # Ждём идущую фоновую синхронизацию: иначе кэши сбросятся до появления строк в копии
+            REPLICA.sync(wait=True)
+        # Пока реплика PostgreSQL не проиграла загрузку, чтение идёт из основной БД
+        ROUTER.require_primary_position()
+        named = invalidate_season_pairs(pairs)
+        if on_change is not None:
+            on_change(named)
+
+    if CHANGE_LISTENER is not None:
+        CHANGE_LISTENER.stop(timeout=1.0)
+    CHANGE_LISTENER = change_events.ChangeListener(source, _handle)
+    CHANGE_LISTENER.start()
+    return CHANGE_LISTENER
+
 # --- Функции для общей статистики (Адаптированные) ---
 def get_overall_driver_stats(driver_id: int):
     """Получает общую статистику гонщика за все время (синхронно)."""
@@ -624,6 +1467,14 @@ def get_overall_driver_stats(driver_id: int):
         logger.error(f"Одна или несколько таблиц не отражены для get_overall_driver_stats: {', '.join(missing)}")
         return None
 
+    cached = _get_cached_career_stats('driver', driver_id)
+    if cached is not None:
+        return cached
+
+    if SNAPSHOT is not None: # Локальная агрегация по снимку вместо запроса к БД
+        details = SNAPSHOT.overall_driver_stats(driver_id)
+        return _store_career_stats('driver', driver_id, details) if details else details
+
     with get_db_session() as session:
         try:
             driver_name_stmt = select(drivers_table.c.driver_name).where(drivers_table.c.driver_id == driver_id)
@@ -632,39 +1483,30 @@ def get_overall_driver_stats(driver_id: int):
                  logger.warning(f"Гонщик с driver_id={driver_id} не найден для общей статистики.")
                  return None
 
-            stats_stmt = select(
-                func.count(race_entries_table.c.race_id).label('races'),
-                func.sum(race_entries_table.c.won_race).label('wins'),
-                func.sum(case((race_entries_table.c.finish_position <= 5, 1), else_=0)).label('top5'),
-                func.sum(case((race_entries_table.c.finish_position <= 10, 1), else_=0)).label('top10'),
-                func.sum(func.coalesce(race_entries_table.c.laps_led, 0)).label('laps_led'),
-                func.sum(func.coalesce(race_entries_table.c.laps_completed, 0)).label('laps_completed'),
-                func.avg(cast(race_entries_table.c.start_position, Float)).label('avg_start'),
-                func.avg(cast(race_entries_table.c.finish_position, Float)).label('avg_finish'),
-                func.sum(func.coalesce(race_entries_table.c.points, 0)).label('points')
-            ).select_from(race_entries_table
-            ).where(
-                (race_entries_table.c.driver_id == driver_id) &
-                (race_entries_table.c.finish_position != None) # Учитываем только финишировавших
-            )
+            if driver_season_stats_table is not None:
+                # Сумма посезонных агрегатов: O(сезонов) вместо O(записей)
+                stats_stmt = _career_stats_from_rollup(driver_season_stats_table, 'driver_id', [driver_id], 'races')
+            else:
+                stats_stmt = select(
+                    func.count(race_entries_table.c.race_id).label('races'),
+                    func.sum(race_entries_table.c.won_race).label('wins'),
+                    func.sum(case((race_entries_table.c.finish_position <= 5, 1), else_=0)).label('top5'),
+                    func.sum(case((race_entries_table.c.finish_position <= 10, 1), else_=0)).label('top10'),
+                    func.sum(func.coalesce(race_entries_table.c.laps_led, 0)).label('laps_led'),
+                    func.sum(func.coalesce(race_entries_table.c.laps_completed, 0)).label('laps_completed'),
+                    func.avg(cast(race_entries_table.c.start_position, Float)).label('avg_start'),
+                    func.avg(cast(race_entries_table.c.finish_position, Float)).label('avg_finish'),
+                    func.sum(func.coalesce(race_entries_table.c.points, 0)).label('points')
+                ).select_from(race_entries_table
+                ).where(
+                    (race_entries_table.c.driver_id == driver_id) &
+                    (race_entries_table.c.finish_position != None) # Учитываем только финишировавших
+                )
             stats_result = session.execute(stats_stmt).fetchone()
 
             details = {'driver_name': driver_name, 'type': 'driver'} # Добавляем тип для возможного использования в GUI
-            if stats_result and stats_result.races is not None and stats_result.races > 0:
-                details.update({
-                    'races': stats_result.races or 0, 'wins': stats_result.wins or 0,
-                    'top5': stats_result.top5 or 0, 'top10': stats_result.top10 or 0,
-                    'laps_led': stats_result.laps_led or 0, 'laps_completed': stats_result.laps_completed or 0,
-                    'avg_start': round(stats_result.avg_start, 1) if stats_result.avg_start else None,
-                    'avg_finish': round(stats_result.avg_finish, 1) if stats_result.avg_finish else None,
-                    'points': stats_result.points if stats_result.points is not None else 0
-                })
-            else:
-                 details.update({
-                    'races': 0, 'wins': 0, 'top5': 0, 'top10': 0, 'laps_led': 0,
-                    'laps_completed': 0, 'avg_start': None, 'avg_finish': None, 'points': 0
-                 })
-            return details
+            details.update(_stats_to_details(stats_result, 'races'))
+            return _store_career_stats('driver', driver_id, details)
         except Exception as e:
             logger.error(f"Ошибка получения общей статистики гонщика (driver_id={driver_id}): {e}", exc_info=True)
             return None
@@ -678,6 +1520,14 @@ def get_overall_team_stats(team_id: int):
         logger.error(f"Одна или несколько таблиц не отражены для get_overall_team_stats: {', '.join(missing)}")
         return None
 
+    cached = _get_cached_career_stats('team', team_id)
+    if cached is not None:
+        return cached
+
+    if SNAPSHOT is not None: # Локальная агрегация по снимку вместо запроса к БД
+        details = SNAPSHOT.overall_team_stats(team_id)
+        return _store_career_stats('team', team_id, details) if details else details
+
     with get_db_session() as session:
         try:
             team_name_stmt = select(teams_table.c.team_name).where(teams_table.c.team_id == team_id)
@@ -686,40 +1536,31 @@ def get_overall_team_stats(team_id: int):
                 logger.warning(f"Команда с team_id={team_id} не найдена для общей статистики.")
                 return None
 
-            stats_stmt = select(
-                func.count(race_entries_table.c.driver_id).label('entries'),
-                func.sum(race_entries_table.c.won_race).label('wins'),
-                func.sum(case((race_entries_table.c.finish_position <= 5, 1), else_=0)).label('top5'),
-                func.sum(case((race_entries_table.c.finish_position <= 10, 1), else_=0)).label('top10'),
-                func.sum(func.coalesce(race_entries_table.c.laps_led, 0)).label('laps_led'),
-                func.sum(func.coalesce(race_entries_table.c.laps_completed, 0)).label('laps_completed'),
-                func.avg(cast(race_entries_table.c.start_position, Float)).label('avg_start'),
-                func.avg(cast(race_entries_table.c.finish_position, Float)).label('avg_finish'),
-                func.sum(func.coalesce(race_entries_table.c.points, 0)).label('points')
-            ).select_from(race_entries_table
-            ).where(
-                (race_entries_table.c.team_id == team_id) &
-                (race_entries_table.c.finish_position != None) &
-                (race_entries_table.c.driver_id != None)
-            )
+            if team_season_stats_table is not None:
+                # Сумма посезонных агрегатов: O(сезонов) вместо O(записей)
+                stats_stmt = _career_stats_from_rollup(team_season_stats_table, 'team_id', [team_id], 'entries')
+            else:
+                stats_stmt = select(
+                    func.count(race_entries_table.c.driver_id).label('entries'),
+                    func.sum(race_entries_table.c.won_race).label('wins'),
+                    func.sum(case((race_entries_table.c.finish_position <= 5, 1), else_=0)).label('top5'),
+                    func.sum(case((race_entries_table.c.finish_position <= 10, 1), else_=0)).label('top10'),
+                    func.sum(func.coalesce(race_entries_table.c.laps_led, 0)).label('laps_led'),
+                    func.sum(func.coalesce(race_entries_table.c.laps_completed, 0)).label('laps_completed'),
+                    func.avg(cast(race_entries_table.c.start_position, Float)).label('avg_start'),
+                    func.avg(cast(race_entries_table.c.finish_position, Float)).label('avg_finish'),
+                    func.sum(func.coalesce(race_entries_table.c.points, 0)).label('points')
+                ).select_from(race_entries_table
+                ).where(
+                    (race_entries_table.c.team_id == team_id) &
+                    (race_entries_table.c.finish_position != None) &
+                    (race_entries_table.c.driver_id != None)
+                )
             stats_result = session.execute(stats_stmt).fetchone()
 
             details = {'team_name': team_name, 'type': 'team'}
-            if stats_result and stats_result.entries is not None and stats_result.entries > 0:
-                details.update({
-                    'entries': stats_result.entries or 0, 'wins': stats_result.wins or 0,
-                    'top5': stats_result.top5 or 0, 'top10': stats_result.top10 or 0,
-                    'laps_led': stats_result.laps_led or 0, 'laps_completed': stats_result.laps_completed or 0,
-                    'avg_start': round(stats_result.avg_start, 1) if stats_result.avg_start else None,
-                    'avg_finish': round(stats_result.avg_finish, 1) if stats_result.avg_finish else None,
-                    'points': stats_result.points if stats_result.points is not None else 0
-                })
-            else:
-                 details.update({
-                    'entries': 0, 'wins': 0, 'top5': 0, 'top10': 0, 'laps_led': 0,
-                    'laps_completed': 0, 'avg_start': None, 'avg_finish': None, 'points': 0
-                 })
-            return details
+            details.update(_stats_to_details(stats_result, 'entries'))
+            return _store_career_stats('team', team_id, details)
         except Exception as e:
             logger.error(f"Ошибка получения общей статистики команды (team_id={team_id}): {e}", exc_info=True)
             return None
@@ -733,6 +1574,14 @@ def get_overall_manufacturer_stats(manufacturer_id: int):
         logger.error(f"Одна или несколько таблиц не отражены для get_overall_manufacturer_stats: {', '.join(missing)}")
         return None
 
+    cached = _get_cached_career_stats('manufacturer', manufacturer_id)
+    if cached is not None:
+        return cached
+
+    if SNAPSHOT is not None: # Локальная агрегация по снимку вместо запроса к БД
+        details = SNAPSHOT.overall_manufacturer_stats(manufacturer_id)
+        return _store_career_stats('manufacturer', manufacturer_id, details) if details else details
+
     with get_db_session() as session:
         try:
             manufacturer_name_stmt = select(manufacturers_table.c.manufacturer_name).where(manufacturers_table.c.manufacturer_id == manufacturer_id)
@@ -741,33 +1590,31 @@ def get_overall_manufacturer_stats(manufacturer_id: int):
                 logger.warning(f"Производитель с manufacturer_id={manufacturer_id} не найден для общей статистики.")
                 return None
 
-            stats_stmt = select(
-                func.count(race_entries_table.c.driver_id).label('entries'),
-                func.sum(race_entries_table.c.won_race).label('wins'),
-                func.sum(case((race_entries_table.c.finish_position <= 5, 1), else_=0)).label('top5'),
-                func.sum(case((race_entries_table.c.finish_position <= 10, 1), else_=0)).label('top10'),
-                func.sum(func.coalesce(race_entries_table.c.laps_led, 0)).label('laps_led')
-            ).select_from(race_entries_table
-            ).where(
-                (race_entries_table.c.manufacturer_id == manufacturer_id) &
-                (race_entries_table.c.driver_id != None)
-            )
+            if manufacturer_season_stats_table is not None:
+                # Сумма посезонных агрегатов: O(сезонов) вместо O(записей)
+                stats_stmt = _career_stats_from_rollup(manufacturer_season_stats_table, 'manufacturer_id', [manufacturer_id], 'entries', with_details=False)
+            else:
+                stats_stmt = select(
+                    func.count(race_entries_table.c.driver_id).label('entries'),
+                    func.sum(race_entries_table.c.won_race).label('wins'),
+                    func.sum(case((race_entries_table.c.finish_position <= 5, 1), else_=0)).label('top5'),
+                    func.sum(case((race_entries_table.c.finish_position <= 10, 1), else_=0)).label('top10'),
+                    func.sum(func.coalesce(race_entries_table.c.laps_led, 0)).label('laps_led')
+                ).select_from(race_entries_table
+                ).where(
+                    (race_entries_table.c.manufacturer_id == manufacturer_id) &
+                    (race_entries_table.c.driver_id != None)
+                )
             stats_result = session.execute(stats_stmt).fetchone()
 
             details = {'manufacturer_name': manufacturer_name, 'type': 'manufacturer'}
-            if stats_result and stats_result.entries is not None and stats_result.entries > 0:
-                 details.update({
-                    'entries': stats_result.entries or 0, 'wins': stats_result.wins or 0,
-                    'top5': stats_result.top5 or 0, 'top10': stats_result.top10 or 0,
-                    'laps_led': stats_result.laps_led or 0
-                })
-            else:
-                 details.update({'entries': 0, 'wins': 0, 'top5': 0, 'top10': 0, 'laps_led': 0})
-            return details
+            details.update(_stats_to_details(stats_result, 'entries', with_details=False))
+            return _store_career_stats('manufacturer', manufacturer_id, details)
         except Exception as e:
             logger.error(f"Ошибка получения общей статистики производителя (manufacturer_id={manufacturer_id}): {e}", exc_info=True)
             return None
 
+@QUERY_CACHE.cached(ttl=_TTL_DETAILS)
 def get_driver_standings_progression(driver_id: int, season: int, series_id: int):
     """
     Получает прогресс набора очков гонщиком за сезон/серию.
@@ -780,6 +1627,9 @@ def get_driver_standings_progression(driver_id: int, season: int, series_id: int
         logger.error(f"Таблицы не отражены для get_driver_standings_progression: {', '.join(missing)}")
         return []
 
+    if SNAPSHOT is not None: # Локальная агрегация по снимку вместо запроса к БД
+        return SNAPSHOT.driver_standings_progression(driver_id, season, series_id)
+
     with get_db_session() as session:
         try:
             # Определяем оконную функцию для кумулятивной суммы очков
@@ -795,8 +1645,7 @@ def get_driver_standings_progression(driver_id: int, season: int, series_id: int
             ).join(races_table, race_entries_table.c.race_id == races_table.c.race_id
             ).where(
                 (race_entries_table.c.driver_id == driver_id) &
-                (races_table.c.season == season) &
-                (races_table.c.series_id == series_id)
+                _season_filter(season, series_id)
                 # Не фильтруем по finish_position != None, т.к. даже за DNF могут дать очки
             ).order_by(asc(races_table.c.race_num_in_season)) # Сортируем для правильной кумуляции
 
@@ -808,6 +1657,79 @@ def get_driver_standings_progression(driver_id: int, season: int, series_id: int
             logger.error(f"Ошибка получения прогресса очков для графика: {e}", exc_info=True)
             return []
 
+def _computed_pair_snapshots(session, season: int, series_id: int) -> list:
+    """Снимки положения сезона, посчитанные по RaceEntries (нет таблицы StandingsSnapshots)."""
+    return standings_snapshots.compute_pair_snapshots(session.connection(), season, series_id)
+
+@QUERY_CACHE.cached(ttl=_TTL_STANDINGS)
+def get_standings_after_race(season: int, series_name: str, race_num: int) -> list:
+    """
+    Таблица чемпионата гонщиков после гонки race_num сезона (по месту).
+    Возвращает список StandingsSnapshotRow (rank, driver_id, driver_name, total_points, total_wins, races_entered).
+    Из StandingsSnapshots — поиск по первичному ключу; без неё — расчёт по RaceEntries.
+    """
+    logger.info(f"Запрос положения после гонки: season={season}, series='{series_name}', race_num={race_num}")
+    if races_table is None or race_entries_table is None or drivers_table is None:
+        logger.error("Таблицы не отражены для get_standings_after_race.")
+        return []
+
+    with get_db_session() as session:
+        try:
+            series_id = get_series_id_by_name(session, series_name)
+            if not series_id: return []
+
+            if standings_snapshots_table is not None:
+                s = standings_snapshots_table.c
+                stmt = _statement('standings_after_race', lambda: select(
+                    s.rank, s.driver_id, drivers_table.c.driver_name,
+                    s.cumulative_points, s.cumulative_wins, s.races_entered
+                ).join(drivers_table, s.driver_id == drivers_table.c.driver_id
+                ).where(
+                    (s.season == bindparam('season')) & (s.series_id == bindparam('series_id')) &
+                    (s.race_num_in_season == bindparam('race_num'))
+                ).order_by(asc(s.rank)))
+                rows = session.execute(stmt, {'season': season, 'series_id': series_id, 'race_num': race_num}).fetchall()
+                return [StandingsSnapshotRow(*row) for row in rows]
+
+            snapshots = [row for row in _computed_pair_snapshots(session, season, series_id) if row['race_num_in_season'] == race_num]
+            names = dict(DIMENSIONS.get_rows(drivers_table.name) or [])
+            return [StandingsSnapshotRow(row['rank'], row['driver_id'], names.get(row['driver_id']), row['cumulative_points'],
+                                         row['cumulative_wins'], row['races_entered']) for row in snapshots]
+        except Exception as e:
+            logger.error(f"Ошибка получения положения после гонки {race_num} (season={season}): {e}", exc_info=True)
+            return []
+
+@QUERY_CACHE.cached(ttl=_TTL_DETAILS)
+def get_driver_rank_trajectory(driver_id: int, season: int, series_id: int) -> list:
+    """
+    Место гонщика в чемпионате после каждой гонки сезона/серии.
+    Возвращает список RankTrajectoryRow (race_num_in_season, rank, cumulative_points) по возрастанию номера гонки.
+    """
+    logger.info(f"Запрос траектории места для driver_id={driver_id}, season={season}, series_id={series_id}")
+    if races_table is None or race_entries_table is None:
+        logger.error("Таблицы не отражены для get_driver_rank_trajectory.")
+        return []
+
+    with get_db_session() as session:
+        try:
+            if standings_snapshots_table is not None:
+                s = standings_snapshots_table.c
+                stmt = _statement('driver_rank_trajectory', lambda: select(
+                    s.race_num_in_season, s.rank, s.cumulative_points
+                ).where(
+                    (s.driver_id == bindparam('driver_id')) & (s.season == bindparam('season')) &
+                    (s.series_id == bindparam('series_id'))
+                ).order_by(asc(s.race_num_in_season)))
+                rows = session.execute(stmt, {'driver_id': driver_id, 'season': season, 'series_id': series_id}).fetchall()
+                return [RankTrajectoryRow(*row) for row in rows]
+
+            return [RankTrajectoryRow(row['race_num_in_season'], row['rank'], row['cumulative_points'])
+                    for row in _computed_pair_snapshots(session, season, series_id) if row['driver_id'] == driver_id]
+        except Exception as e:
+            logger.error(f"Ошибка получения траектории места гонщика: {e}", exc_info=True)
+            return []
+
+@QUERY_CACHE.cached(ttl=_TTL_DETAILS)
 def get_team_race_results_for_season(team_id: int, season: int, series_id: int):
     """
     Получает средние результаты (старт/финиш) для команды за сезон/серию по гонкам.
@@ -820,27 +1742,13 @@ def get_team_race_results_for_season(team_id: int, season: int, series_id: int):
         logger.error(f"Таблицы не отражены для get_team_race_results_for_season: {', '.join(missing)}")
         return []
 
+    if SNAPSHOT is not None: # Локальная агрегация по снимку вместо запроса к БД
+        return SNAPSHOT.team_race_results_for_season(team_id, season, series_id)
+
     with get_db_session() as session:
         try:
-            # Группируем по гонке и считаем средние значения
-            stmt = select(
-                races_table.c.race_num_in_season,
-                func.avg(cast(race_entries_table.c.start_position, Float)).label('avg_start'),
-                func.avg(cast(race_entries_table.c.finish_position, Float)).label('avg_finish')
-            ).select_from(race_entries_table
-            ).join(races_table, race_entries_table.c.race_id == races_table.c.race_id
-            ).where(
-                (race_entries_table.c.team_id == team_id) &
-                (races_table.c.season == season) &
-                (races_table.c.series_id == series_id) &
-                (race_entries_table.c.finish_position != None) & # Учитываем только финишировавших
-                (race_entries_table.c.start_position != None) # И тех, у кого есть стартовая позиция
-            ).group_by(
-                races_table.c.race_id, # Группируем по ID гонки
-                races_table.c.race_num_in_season # И по номеру гонки в сезоне
-            ).order_by(asc(races_table.c.race_num_in_season)) # Сортируем по номеру гонки
-
-            results = session.execute(stmt).fetchall()
+            stmt = _statement('team_race_results', _build_team_race_results_statement)
+            results = session.execute(stmt, {'team_id': team_id, 'season': season, 'series_id': series_id}).fetchall()
             logger.info(f"Найдено {len(results)} средних результатов по гонкам для команды.")
             # Результат: [(1, 15.5, 12.0), (2, 10.0, 8.5), ...]
             return results
@@ -848,12 +1756,16 @@ def get_team_race_results_for_season(team_id: int, season: int, series_id: int):
             logger.error(f"Ошибка получения средних результатов гонок команды для графика: {e}", exc_info=True)
             return []
         
+@QUERY_CACHE.cached(ttl=_TTL_DETAILS)
 def get_manufacturer_wins_by_season(manufacturer_id: int):
     """Возвращает количество побед производителя по каждому сезону."""
     if race_entries_table is None or races_table is None:
         logger.error("Таблицы race_entries или races не отражены.")
         return []
 
+    if SNAPSHOT is not None: # Локальная агрегация по снимку вместо запроса к БД
+        return SNAPSHOT.manufacturer_wins_by_season(manufacturer_id)
+
     with get_db_session() as session:
         try:
             stmt = select(
@@ -884,19 +1796,12 @@ def get_all_drivers_list():
     if drivers_table is None:
         logger.error("Таблица Drivers не отражена.")
         return []
-    with get_db_session() as session:
-        try:
-            stmt = select(
-                drivers_table.c.driver_id,
-                drivers_table.c.driver_name
-            ).order_by(asc(drivers_table.c.driver_name))
-            results = session.execute(stmt).fetchall()
-            logger.info(f"Найдено {len(results)} гонщиков.")
-            # Возвращаем список кортежей (id, name)
-            return results
-        except Exception as e:
-            logger.error(f"Ошибка получения списка всех гонщиков: {e}", exc_info=True)
-            return []
+    results = DIMENSIONS.get_rows(drivers_table.name)
+    if results is None:
+        return []
+    logger.info(f"Найдено {len(results)} гонщиков.")
+    # Возвращаем список кортежей (id, name)
+    return results
 
 def get_all_teams_list():
     """Получает список всех команд (ID, Имя) для использования в UI."""
@@ -904,19 +1809,12 @@ def get_all_teams_list():
     if teams_table is None:
         logger.error("Таблица Teams не отражена.")
         return []
-    with get_db_session() as session:
-        try:
-            stmt = select(
-                teams_table.c.team_id,
-                teams_table.c.team_name
-            ).order_by(asc(teams_table.c.team_name))
-            results = session.execute(stmt).fetchall()
-            logger.info(f"Найдено {len(results)} команд.")
-            # Возвращаем список кортежей (id, name)
-            return results
-        except Exception as e:
-            logger.error(f"Ошибка получения списка всех команд: {e}", exc_info=True)
-            return []
+    results = DIMENSIONS.get_rows(teams_table.name)
+    if results is None:
+        return []
+    logger.info(f"Найдено {len(results)} команд.")
+    # Возвращаем список кортежей (id, name)
+    return results
 
 def get_all_manufacturers_list():
     """Получает список всех производителей (ID, Имя) для использования в UI."""
@@ -924,19 +1822,357 @@ def get_all_manufacturers_list():
     if manufacturers_table is None:
         logger.error("Таблица Manufacturers не отражена.")
         return []
+    results = DIMENSIONS.get_rows(manufacturers_table.name)
+    if results is None:
+        return []
+    logger.info(f"Найдено {len(results)} производителей.")
+    # Возвращаем список кортежей (id, name)
+    return results
+
+_PG_TRGM_INSTALLED = {} # Строка подключения -> есть ли в БД расширение pg_trgm (миграция 6 могла быть пропущена)
+
+def _pg_trgm_installed(session) -> bool:
+    url = session.get_bind().url.render_as_string(hide_password=True)
+    if url not in _PG_TRGM_INSTALLED:
+        _PG_TRGM_INSTALLED[url] = bool(session.execute(
+            text("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')")).scalar())
+        if not _PG_TRGM_INSTALLED[url]:
+            logger.warning("Расширение pg_trgm не установлено (миграция 6 пропущена) — поиск по именам через LIKE.")
+    return _PG_TRGM_INSTALLED[url]
+
+def _search_pg_trgm(session, table_name: str, query: str, limit: int) -> list:
+    """
+    Поиск через pg_trgm: оператор % и префикс LIKE по lower(имя) используют GIN-индексы миграции 6.
+    Без расширения — поиск подстроки через LIKE (без опечаток), в том же порядке: точное имя, начало, остальное.
+    """
+    table = metadata.tables[table_name]
+    if table_name == 'Races':
+        id_column, name_column = table.c.race_id, table.c.race_name
+    elif table_name == 'Tracks':
+        id_column, name_column = table.c.track_id, table.c.track_name
+    else:
+        id_column_name, name_column_name = _DIMENSION_COLUMNS[table_name]
+        id_column, name_column = getattr(table.c, id_column_name), getattr(table.c, name_column_name)
+    lowered, needle = func.lower(name_column), query.strip().lower()
+    is_exact, is_prefix = lowered == needle, lowered.startswith(needle, autoescape=True)
+    if _pg_trgm_installed(session):
+        score, matched, other_tier = func.similarity(lowered, needle), lowered.op('%')(needle) | is_prefix, db_search.TIER_SIMILAR
+    else:
+        score, matched, other_tier = literal(0.0), lowered.contains(needle, autoescape=True), db_search.TIER_SUBSTRING
+    extra = [table.c.season, table.c.series_id] if table_name == 'Races' else []
+    stmt = select(id_column, name_column, score.label('score'), is_exact.label('is_exact'), is_prefix.label('is_prefix'), *extra).where(
+        matched
+    ).order_by(desc(is_exact), desc(is_prefix), desc(score), asc(name_column)).limit(limit)
+    matches = []
+    for row in session.execute(stmt):
+        name = _race_search_label(row[1], row.season, row.series_id) if table_name == 'Races' else row[1]
+        tier = db_search.TIER_EXACT if row.is_exact else db_search.TIER_PREFIX if row.is_prefix else other_tier
+        matches.append(db_search.SearchMatch(row[0], name, round(float(row.score), 3), tier))
+    return matches
+
+def search_entities(kind: str, query: str, limit: int = 20) -> list:
+    """
+    Нечёткий поиск по именам: kind — 'drivers', 'teams', 'manufacturers', 'tracks' или 'races'.
+    Возвращает до limit SearchMatch (id, name, score, tier): точные совпадения и начала имён/слов
+    выше похожих по триграммам, так что опечатки («kyle bush») тоже находятся.
+    """
+    table_name = _SEARCH_TABLES.get(kind)
+    if table_name is None or metadata.tables.get(table_name) is None:
+        logger.error(f"Неизвестный или не отражённый вид сущностей для поиска: {kind}")
+        return []
+    if not query or not query.strip():
+        return []
+    if SEARCH_BACKEND == 'pg_trgm' and engine.dialect.name == 'postgresql':
+        with get_db_session() as session:
+            try:
+                return _search_pg_trgm(session, table_name, query, limit)
+            except Exception as e:
+                logger.error(f"Ошибка поиска pg_trgm ({kind}, '{query}'): {e}", exc_info=True)
+                return []
+    cache = DIMENSIONS if table_name in _DIMENSION_COLUMNS else SEARCH_ROWS
+    return cache.search(table_name, query, limit)
+
+# --- Пакетные варианты: одна выборка на любое число сущностей ---
+# Возвращают словарь {id: результат как у одиночной функции}; id, которых нет в справочнике, пропускаются.
+
+def _unique_ids(entity_ids) -> list:
+    """Убирает None и повторы, сохраняя порядок."""
+    return list(dict.fromkeys(entity_id for entity_id in entity_ids if entity_id is not None))
+
+def _names_for_ids(table, entity_ids: list, entity_label: str) -> dict:
+    """Имена сущностей из кэша справочников: {id: имя} только для найденных id."""
+    names = {}
+    for entity_id in entity_ids:
+        name = DIMENSIONS.get_name(table.name, entity_id)
+        if name:
+            names[entity_id] = name
+        else:
+            logger.warning(f"{entity_label} с id={entity_id} не найден(а).")
+    return names
+
+def _entry_stats_columns(count_column, count_label: str, with_details: bool = True) -> list:
+    """Агрегаты по RaceEntries с теми же метками, что и в одиночных запросах статистики."""
+    e = race_entries_table.c
+    columns = [
+        func.count(count_column).label(count_label),
+        func.sum(e.won_race).label('wins'),
+        func.sum(case((e.finish_position <= 5, 1), else_=0)).label('top5'),
+        func.sum(case((e.finish_position <= 10, 1), else_=0)).label('top10'),
+        func.sum(func.coalesce(e.laps_led, 0)).label('laps_led'),
+    ]
+    if with_details:
+        columns += [
+            func.sum(func.coalesce(e.laps_completed, 0)).label('laps_completed'),
+            func.avg(cast(e.start_position, Float)).label('avg_start'),
+            func.avg(cast(e.finish_position, Float)).label('avg_finish'),
+            func.sum(func.coalesce(e.points, 0)).label('points'),
+        ]
+    return columns
+
+def _season_details_many(entity_table, id_column_name: str, name_key: str, entity_label: str,
+                         rollup_table, count_label: str, entity_ids, season: int, series_name: str) -> dict:
+    """Общая часть get_driver_season_details_many / get_team_season_details_many."""
+    ids = _unique_ids(entity_ids)
+    logger.info(f"Пакетный запрос деталей сезона ({id_column_name}): {len(ids)} шт., season={season}, series='{series_name}'")
+    required_tables = [entity_table, race_entries_table, races_table, series_table]
+    if any(table is None for table in required_tables):
+        logger.error(f"Одна или несколько таблиц не отражены для пакетного запроса деталей сезона ({id_column_name}).")
+        return {}
+    if not ids:
+        return {}
+
     with get_db_session() as session:
         try:
+            series_id = get_series_id_by_name(session, series_name)
+            if not series_id: return {}
+            names = _names_for_ids(entity_table, ids, entity_label)
+            if not names: return {}
+
+            if rollup_table is not None:
+                stats_stmt = _season_stats_from_rollup(rollup_table, id_column_name, list(names), season, series_id, count_label)
+            else:
+                e = race_entries_table.c
+                id_column = getattr(e, id_column_name)
+                # Для команд считаем участия машин с гонщиком, для гонщиков — гонки
+                count_column = e.race_id if id_column_name == 'driver_id' else e.driver_id
+                stats_stmt = select(id_column, *_entry_stats_columns(count_column, count_label)
+                ).select_from(race_entries_table
+                ).join(races_table, e.race_id == races_table.c.race_id
+                ).where(
+                    id_column.in_(list(names)) &
+                    _season_filter(season, series_id) &
+                    (e.finish_position != None) &
+                    (e.driver_id != None)
+                ).group_by(id_column)
+
+            stats_by_id = {row[0]: row for row in session.execute(stats_stmt).fetchall()}
+            results = {}
+            for entity_id, name in names.items():
+                details = {name_key: name, 'season': season, 'series_name': series_name}
+                details.update(_stats_to_details(stats_by_id.get(entity_id), count_label))
+                results[entity_id] = details
+            logger.info(f"Сформированы детали сезона для {len(results)} сущностей.")
+            return results
+        except Exception as e:
+            logger.error(f"Ошибка пакетного получения деталей сезона ({id_column_name}, season={season}): {e}", exc_info=True)
+            return {}
+
+@QUERY_CACHE.cached(ttl=_TTL_DETAILS)
+def get_driver_season_details_many(driver_ids, season: int, series_name: str = 'Cup') -> dict:
+    """Детальная статистика нескольких гонщиков за сезон одним запросом: {driver_id: детали}."""
+    if SNAPSHOT is not None: # Локальная агрегация по снимку вместо запроса к БД
+        return {driver_id: details for driver_id in _unique_ids(driver_ids)
+                if (details := SNAPSHOT.driver_season_details(driver_id, season, series_name))}
+    return _season_details_many(drivers_table, 'driver_id', 'driver_name', "Гонщик",
+                                driver_season_stats_table, 'races', driver_ids, season, series_name)
+
+@QUERY_CACHE.cached(ttl=_TTL_DETAILS)
+def get_team_season_details_many(team_ids, season: int, series_name: str = 'Cup') -> dict:
+    """Детальная статистика нескольких команд за сезон одним запросом: {team_id: детали}."""
+    if SNAPSHOT is not None: # Локальная агрегация по снимку вместо запроса к БД
+        return {team_id: details for team_id in _unique_ids(team_ids)
+                if (details := SNAPSHOT.team_season_details(team_id, season, series_name))}
+    return _season_details_many(teams_table, 'team_id', 'team_name', "Команда",
+                                team_season_stats_table, 'entries', team_ids, season, series_name)
+
+def _overall_stats_many(entity_type: str, entity_table, id_column_name: str, name_key: str, entity_label: str,
+                        rollup_table, count_label: str, entity_ids, with_details: bool = True) -> dict:
+    """Общая часть get_overall_*_stats_many: кэш карьеры + один запрос для недостающих id."""
+    ids = _unique_ids(entity_ids)
+    logger.info(f"Пакетный запрос общей статистики ({entity_type}): {len(ids)} шт.")
+    if entity_table is None or race_entries_table is None:
+        logger.error(f"Одна или несколько таблиц не отражены для пакетной общей статистики ({entity_type}).")
+        return {}
+
+    results = {}
+    missing_ids = []
+    for entity_id in ids:
+        cached = _get_cached_career_stats(entity_type, entity_id)
+        if cached is not None:
+            results[entity_id] = cached
+        else:
+            missing_ids.append(entity_id)
+    if not missing_ids:
+        return results
+
+    if SNAPSHOT is not None: # Локальная агрегация по снимку вместо запроса к БД
+        snapshot_method = getattr(SNAPSHOT, f"overall_{entity_type}_stats")
+        for entity_id in missing_ids:
+            details = snapshot_method(entity_id)
+            if details:
+                results[entity_id] = _store_career_stats(entity_type, entity_id, details)
+        return results
+
+    names = _names_for_ids(entity_table, missing_ids, entity_label)
+    if not names:
+        return results
+
+    with get_db_session() as session:
+        try:
+            if rollup_table is not None:
+                stats_stmt = _career_stats_from_rollup(rollup_table, id_column_name, list(names), count_label, with_details=with_details)
+            else:
+                e = race_entries_table.c
+                id_column = getattr(e, id_column_name)
+                count_column = e.race_id if entity_type == 'driver' else e.driver_id
+                condition = id_column.in_(list(names)) & (e.driver_id != None)
+                if with_details:
+                    # Для производителей (без деталей) учитываются и нефинишировавшие, как в одиночном запросе
+                    condition = condition & (e.finish_position != None)
+                stats_stmt = select(id_column, *_entry_stats_columns(count_column, count_label, with_details)
+                ).select_from(race_entries_table
+                ).where(condition
+                ).group_by(id_column)
+
+            stats_by_id = {row[0]: row for row in session.execute(stats_stmt).fetchall()}
+            for entity_id, name in names.items():
+                details = {name_key: name, 'type': entity_type}
+                details.update(_stats_to_details(stats_by_id.get(entity_id), count_label, with_details))
+                results[entity_id] = _store_career_stats(entity_type, entity_id, details)
+            return results
+        except Exception as e:
+            logger.error(f"Ошибка пакетного получения общей статистики ({entity_type}): {e}", exc_info=True)
+            return results
+
+def get_overall_driver_stats_many(driver_ids) -> dict:
+    """Общая статистика нескольких гонщиков за все время: {driver_id: статистика}."""
+    return _overall_stats_many('driver', drivers_table, 'driver_id', 'driver_name', "Гонщик",
+                               driver_season_stats_table, 'races', driver_ids)
+
+def get_overall_team_stats_many(team_ids) -> dict:
+    """Общая статистика нескольких команд за все время: {team_id: статистика}."""
+    return _overall_stats_many('team', teams_table, 'team_id', 'team_name', "Команда",
+                               team_season_stats_table, 'entries', team_ids)
+
+def get_overall_manufacturer_stats_many(manufacturer_ids) -> dict:
+    """Общая статистика нескольких производителей за все время: {manufacturer_id: статистика}."""
+    return _overall_stats_many('manufacturer', manufacturers_table, 'manufacturer_id', 'manufacturer_name', "Производитель",
+                               manufacturer_season_stats_table, 'entries', manufacturer_ids, with_details=False)
+
+@QUERY_CACHE.cached(ttl=_TTL_DETAILS)
+def get_driver_race_results_for_season_many(driver_ids, season: int, series_id: int) -> dict:
+    """
+    Результаты гонок нескольких гонщиков за сезон/серию одним запросом.
+    Возвращает {driver_id: [(race_num_in_season, start_position, finish_position, points), ...]}.
+    """
+    ids = _unique_ids(driver_ids)
+    logger.info(f"Пакетный запрос результатов гонок: {len(ids)} гонщиков, season={season}, series_id={series_id}")
+    if race_entries_table is None or races_table is None:
+        logger.error("Таблицы не отражены для get_driver_race_results_for_season_many.")
+        return {}
+    if not ids:
+        return {}
+
+    if SNAPSHOT is not None: # Локальная агрегация по снимку вместо запроса к БД
+        return {driver_id: SNAPSHOT.driver_race_results_for_season(driver_id, season, series_id) for driver_id in ids}
+
+    with get_db_session() as session:
+        try:
+            e = race_entries_table.c
             stmt = select(
-                manufacturers_table.c.manufacturer_id,
-                manufacturers_table.c.manufacturer_name
-            ).order_by(asc(manufacturers_table.c.manufacturer_name))
-            results = session.execute(stmt).fetchall()
-            logger.info(f"Найдено {len(results)} производителей.")
-            # Возвращаем список кортежей (id, name)
+                e.driver_id,
+                races_table.c.race_num_in_season,
+                e.start_position,
+                e.finish_position,
+                e.points
+            ).select_from(race_entries_table
+            ).join(races_table, e.race_id == races_table.c.race_id
+            ).where(
+                e.driver_id.in_(ids) &
+                _season_filter(season, series_id)
+            ).order_by(asc(e.driver_id), asc(races_table.c.race_num_in_season))
+
+            results = {driver_id: [] for driver_id in ids}
+            for row in session.execute(stmt):
+                results[row.driver_id].append(RaceResultRow(*row[1:]))
             return results
         except Exception as e:
-            logger.error(f"Ошибка получения списка всех производителей: {e}", exc_info=True)
-            return []
+            logger.error(f"Ошибка пакетного получения результатов гонок: {e}", exc_info=True)
+            return {}
+
+@QUERY_CACHE.cached(ttl=_TTL_DETAILS)
+def get_team_race_results_for_season_many(team_ids, season: int, series_id: int) -> dict:
+    """
+    Средние результаты по гонкам для нескольких команд за сезон/серию одним запросом.
+    Возвращает {team_id: [(race_num_in_season, avg_start, avg_finish), ...]}.
+    """
+    ids = _unique_ids(team_ids)
+    logger.info(f"Пакетный запрос средних результатов гонок: {len(ids)} команд, season={season}, series_id={series_id}")
+    if race_entries_table is None or races_table is None:
+        logger.error("Таблицы не отражены для get_team_race_results_for_season_many.")
+        return {}
+    if not ids:
+        return {}
+
+    if SNAPSHOT is not None: # Локальная агрегация по снимку вместо запроса к БД
+        return {team_id: SNAPSHOT.team_race_results_for_season(team_id, season, series_id) for team_id in ids}
+
+    with get_db_session() as session:
+        try:
+            e = race_entries_table.c
+            stmt = select(
+                e.team_id,
+                races_table.c.race_num_in_season,
+                func.avg(cast(e.start_position, Float)).label('avg_start'),
+                func.avg(cast(e.finish_position, Float)).label('avg_finish')
+            ).select_from(race_entries_table
+            ).join(races_table, e.race_id == races_table.c.race_id
+            ).where(
+                e.team_id.in_(ids) &
+                _season_filter(season, series_id) &
+                (e.finish_position != None) &
+                (e.start_position != None)
+            ).group_by(
+                e.team_id, races_table.c.race_id, races_table.c.race_num_in_season
+            ).order_by(asc(e.team_id), asc(races_table.c.race_num_in_season))
+
+            results = {team_id: [] for team_id in ids}
+            for row in session.execute(stmt):
+                results[row.team_id].append(TeamRaceResultRow(*row[1:]))
+            return results
+        except Exception as e:
+            logger.error(f"Ошибка пакетного получения средних результатов гонок команд: {e}", exc_info=True)
+            return {}
+
+# --- Замеры функций чтения (см. db_metrics.py) ---
+# Обёртка снаружи кэша запросов: попадания в кэш тоже видны в перцентилях
+_INSTRUMENTED_FUNCTIONS = (
+    'reflect_db_schema', 'load_snapshot', 'get_latest_season',
+    'get_series_id_by_name', 'get_id_by_name',
+    'get_races_for_season', 'get_races_for_season_after', 'get_race_details_and_results',
+    'get_driver_standings', 'get_driver_standings_after', 'get_driver_season_details',
+    'get_driver_race_results_for_season', 'get_team_standings', 'get_team_standings_after',
+    'get_team_season_details', 'get_manufacturer_season_stats',
+    'get_overall_driver_stats', 'get_overall_team_stats', 'get_overall_manufacturer_stats',
+    'get_driver_standings_progression', 'get_standings_after_race', 'get_driver_rank_trajectory',
+    'get_team_race_results_for_season', 'get_manufacturer_wins_by_season',
+    'get_all_drivers_list', 'get_all_teams_list', 'get_all_manufacturers_list', 'search_entities',
+    'get_driver_season_details_many', 'get_team_season_details_many',
+    'get_overall_driver_stats_many', 'get_overall_team_stats_many', 'get_overall_manufacturer_stats_many',
+    'get_driver_race_results_for_season_many', 'get_team_race_results_for_season_many',
+)
+for _name in _INSTRUMENTED_FUNCTIONS:
+    globals()[_name] = QUERY_METRICS.instrument(globals()[_name])
 
 if __name__ == '__main__':
     # Пример использования и проверки
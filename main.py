@@ -1,8 +1,16 @@
 import sys
+import asyncio
 from PySide6.QtWidgets import QApplication
 from ui.main_window import MainWindow
 from themes.theme_manager import ThemeManager
-from db_sync import reflect_db_schema
+from db_sync import reflect_db_schema, start_pool_warm_up, prepare_replica, start_change_listener
+import db_async
+
+try:
+    # Цикл asyncio поверх цикла событий Qt: виды могут ждать запросы db_async через await
+    import qasync
+except ImportError:
+    qasync = None
 
 def handle_navigation(self, page_key: str):
     self.content_label.setText(f"Страница: {page_key.capitalize()}")
@@ -10,6 +18,10 @@ def handle_navigation(self, page_key: str):
 if __name__ == "__main__":
     app = QApplication(sys.argv)
 
+    # Соединения открываются в фоне, пока идёт отражение схемы и построение окна
+    # Локальная копия БД: при первом запуске заполняется сразу, затем синхронизируется в фоне
+    prepare_replica()
+    start_pool_warm_up()
     reflect_db_schema()
 
     theme_manager = ThemeManager(app)
@@ -17,5 +29,16 @@ if __name__ == "__main__":
     
     window = MainWindow(theme_manager)
     window.show()
+    # Уведомления загрузчика (PostgreSQL LISTEN/NOTIFY): кэши затронутых пар сбрасываются, открытый список обновляется
+    start_change_listener(window.data_changed.emit)
+
+    if qasync is None:
+        sys.exit(app.exec())
 
-    sys.exit(app.exec())
\ No newline at end of file
+    loop = qasync.QEventLoop(app)
+    asyncio.set_event_loop(loop)
+    app_close_event = asyncio.Event()
+    app.aboutToQuit.connect(app_close_event.set)
+    with loop:
+        loop.run_until_complete(app_close_event.wait())
+        loop.run_until_complete(db_async.dispose())
\ No newline at end of file
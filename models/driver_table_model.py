@@ -1,10 +1,12 @@
 from PySide6.QtCore import QAbstractTableModel, Qt, QModelIndex
+from models.sorted_rows import merge_groups
 
 
 class DriverTableModel(QAbstractTableModel):
     def __init__(self, drivers: list, parent=None):
         super().__init__(parent)
-        self._drivers = drivers
+        self._drivers = list(drivers)
+        self._sort_order = None # (столбец, порядок) последней сортировки: добавленные строки встают по ней
         self._headers = ["Гонщик", "Очки", "Победы", "Участий"]
 
     def rowCount(self, parent=QModelIndex()):
@@ -40,18 +42,38 @@ class DriverTableModel(QAbstractTableModel):
             return self._headers[section]
         return super().headerData(section, orientation, role)
 
-    def sort(self, column: int, order: Qt.SortOrder):
-        if not self._drivers:
+    def append_rows(self, rows: list):
+        """
+        Добавляет порцию строк (потоковая загрузка) без пересоздания модели. Если таблица отсортирована,
+        строки вставляются на свои места слиянием — без пересортировки уже загруженных.
+        """
+        if not rows:
             return
+        if self._sort_order is None:
+            groups = [(len(self._drivers), list(rows))]
+        else:
+            column, order = self._sort_order
+            groups = merge_groups(self._drivers, rows, self._sort_key(column), order == Qt.DescendingOrder)
+        for position, group in groups:
+            self.beginInsertRows(QModelIndex(), position, position + len(group) - 1)
+            self._drivers[position:position] = group
+            self.endInsertRows()
 
+    def _sort_key(self, column: int):
         key_funcs = {
             0: lambda d: d.driver_name.lower(),
             1: lambda d: d.total_points or 0,
             2: lambda d: d.total_wins or 0,
             3: lambda d: d.races_entered or 0
         }
+        return key_funcs.get(column, lambda d: 0)
+
+    def sort(self, column: int, order: Qt.SortOrder):
+        self._sort_order = (column, order)
+        if not self._drivers:
+            return
 
-        key_func = key_funcs.get(column, lambda d: 0)
+        key_func = self._sort_key(column)
         reverse = order == Qt.DescendingOrder
 
         self.layoutAboutToBeChanged.emit()
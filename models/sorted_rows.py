@@ -0,0 +1,31 @@
+import bisect
+
+
+class _Descending:
+    """Обёртка ключа с обратным сравнением: bisect по списку, отсортированному по убыванию."""
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+
+def merge_groups(rows: list, chunk: list, key, descending: bool) -> list:
+    """
+    Места вставки порции chunk в rows, уже отсортированный по key (по убыванию, если descending):
+    [(позиция в rows с учётом предыдущих вставок, строки), ...] по возрастанию позиций.
+    Строки с равным ключом встают после имеющихся — как при устойчивой сортировке всего списка.
+    """
+    wrap = _Descending if descending else (lambda value: value)
+    chunk = sorted(chunk, key=key, reverse=descending)
+    groups, inserted = [], 0
+    for row in chunk:
+        position = bisect.bisect_right(rows, wrap(key(row)), key=lambda existing: wrap(key(existing))) + inserted
+        if groups and groups[-1][0] + len(groups[-1][1]) == position:
+            groups[-1][1].append(row)
+        else:
+            groups.append((position, [row]))
+        inserted += 1
+    return groups
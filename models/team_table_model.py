@@ -1,10 +1,12 @@
 from PySide6.QtCore import QAbstractTableModel, Qt, QModelIndex
+from models.sorted_rows import merge_groups
 
 
 class TeamTableModel(QAbstractTableModel):
     def __init__(self, teams: list, parent=None):
         super().__init__(parent)
-        self._teams = teams
+        self._teams = list(teams)
+        self._sort_order = None # (столбец, порядок) последней сортировки: добавленные строки встают по ней
         self._headers = ["Команда", "Очки", "Победы", "Топ-5", "Участий"]
 
     def rowCount(self, parent=QModelIndex()):
@@ -37,10 +39,24 @@ class TeamTableModel(QAbstractTableModel):
             return self._headers[section]
         return super().headerData(section, orientation, role)
 
-    def sort(self, column: int, order: Qt.SortOrder):
-        if not self._teams:
+    def append_rows(self, rows: list):
+        """
+        Добавляет порцию строк (потоковая загрузка) без пересоздания модели. Если таблица отсортирована,
+        строки вставляются на свои места слиянием — без пересортировки уже загруженных.
+        """
+        if not rows:
             return
+        if self._sort_order is None:
+            groups = [(len(self._teams), list(rows))]
+        else:
+            column, order = self._sort_order
+            groups = merge_groups(self._teams, rows, self._sort_key(column), order == Qt.DescendingOrder)
+        for position, group in groups:
+            self.beginInsertRows(QModelIndex(), position, position + len(group) - 1)
+            self._teams[position:position] = group
+            self.endInsertRows()
 
+    def _sort_key(self, column: int):
         key_funcs = {
             0: lambda t: t.team_name.lower(),
             1: lambda t: t.total_points or 0,
@@ -48,8 +64,14 @@ class TeamTableModel(QAbstractTableModel):
             3: lambda t: t.total_top5 or 0,
             4: lambda t: t.total_entries or 0
         }
+        return key_funcs.get(column, lambda t: 0)
+
+    def sort(self, column: int, order: Qt.SortOrder):
+        self._sort_order = (column, order)
+        if not self._teams:
+            return
 
-        key_func = key_funcs.get(column, lambda t: 0)
+        key_func = self._sort_key(column)
         reverse = order == Qt.DescendingOrder
 
         self.layoutAboutToBeChanged.emit()
@@ -0,0 +1,126 @@
+from PySide6.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QTableWidget, QTableWidgetItem,
+    QHeaderView, QAbstractItemView, QTabWidget
+)
+from PySide6.QtCore import Qt, QTimer
+
+import db_sync
+
+REFRESH_INTERVAL_MS = 2000 # Обновление таблиц, пока панель видна
+
+
+class DiagnosticsPanel(QWidget):
+    """
+    Скрытая панель диагностики (Ctrl+Shift+D): перцентили времени функций чтения db_sync,
+    самые долгие SQL-запросы, состояние кэша запросов, пулов соединений и реплики чтения.
+    """
+
+    FUNCTION_COLUMNS = ["Функция", "Вызовов", "p50, мс", "p95, мс", "max, мс", "БД p50, мс", "БД p95, мс", "Строк (ср.)", "КБ (ср.)", "Ошибок"]
+    STATEMENT_COLUMNS = ["SQL", "Выполнений", "p50, мс", "p95, мс", "max, мс"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._setup_ui()
+
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.timeout.connect(self.refresh)
+
+    def _setup_ui(self):
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(8, 8, 8, 8)
+
+        self.summary_label = QLabel()
+        self.summary_label.setTextInteractionFlags(Qt.TextSelectableByMouse)
+        layout.addWidget(self.summary_label)
+
+        self.tabs = QTabWidget()
+        self.functions_table = self._create_table(self.FUNCTION_COLUMNS)
+        self.statements_table = self._create_table(self.STATEMENT_COLUMNS)
+        self.tabs.addTab(self.functions_table, "Функции")
+        self.tabs.addTab(self.statements_table, "SQL")
+        layout.addWidget(self.tabs)
+
+        buttons_layout = QHBoxLayout()
+        self.refresh_button = QPushButton("Обновить")
+        self.refresh_button.clicked.connect(self.refresh)
+        self.reset_button = QPushButton("Сбросить замеры")
+        self.reset_button.clicked.connect(self._reset)
+        buttons_layout.addStretch()
+        buttons_layout.addWidget(self.refresh_button)
+        buttons_layout.addWidget(self.reset_button)
+        layout.addLayout(buttons_layout)
+
+    def _create_table(self, columns: list) -> QTableWidget:
+        table = QTableWidget(0, len(columns))
+        table.setHorizontalHeaderLabels(columns)
+        table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        table.verticalHeader().setVisible(False)
+        table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        for column in range(1, len(columns)):
+            table.horizontalHeader().setSectionResizeMode(column, QHeaderView.ResizeToContents)
+        return table
+
+    @staticmethod
+    def _fill_table(table: QTableWidget, rows: list):
+        table.setRowCount(len(rows))
+        for row_index, values in enumerate(rows):
+            for column, value in enumerate(values):
+                if isinstance(value, float):
+                    text = f"{value:.1f}"
+                else:
+                    text = str(value)
+                item = QTableWidgetItem(text)
+                if column > 0:
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                else:
+                    item.setToolTip(text)
+                table.setItem(row_index, column, item)
+
+    def refresh(self):
+        metrics = db_sync.get_query_metrics()
+        self._fill_table(self.functions_table, [
+            (row['function'], row['calls'], row['wall_p50_ms'], row['wall_p95_ms'], row['wall_max_ms'],
+             row['db_p50_ms'], row['db_p95_ms'], row['rows_avg'], row['bytes_avg'] / 1024, row['errors'])
+            for row in metrics['functions']
+        ])
+        self._fill_table(self.statements_table, [
+            (row['statement'], row['count'], row['p50_ms'], row['p95_ms'], row['max_ms'])
+            for row in metrics['statements']
+        ])
+
+        cache = db_sync.QUERY_CACHE.stats()
+        pools = db_sync.get_route_metrics()
+        routing = db_sync.get_routing_status()
+        pool_text = "   |   ".join(
+            f"Пул {'чтения' if route == 'read' else 'записи'}: выдано {pool['checked_out']} (макс. {pool['max_checked_out']}), "
+            f"ожидание соединения ср. {pool['wait_avg_ms']} мс, макс. {pool['wait_max_ms']} мс"
+            for route, pool in pools.items()
+            if route == 'read' or db_sync.write_engine is not db_sync.engine
+        )
+        if routing['has_replica']:
+            lag = routing['lag_seconds']
+            replica_text = (
+                f"Реплика: {'используется' if routing['replica_healthy'] and not routing['waiting_for_lsn'] else 'чтение из основной БД'}, "
+                f"отставание {'?' if lag is None else f'{lag:.1f}'} с (макс. {routing['max_lag']} с), "
+                f"чтений из основной БД вместо реплики {routing['fallback_reads']}"
+            )
+        else:
+            replica_text = f"Чтений {routing['requests']['read']}, записей {routing['requests']['write']}"
+        self.summary_label.setText(
+            f"Кэш запросов: {cache['entries']} записей, {cache['bytes'] // 1024} КБ, "
+            f"попаданий {cache['hits']}, промахов {cache['misses']}   |   {pool_text}\n{replica_text}"
+        )
+
+    def _reset(self):
+        db_sync.QUERY_METRICS.reset()
+        self.refresh()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh()
+        self.refresh_timer.start(REFRESH_INTERVAL_MS)
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.refresh_timer.stop()
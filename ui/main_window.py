@@ -1,8 +1,9 @@
 import os
 from PySide6.QtWidgets import (
-    QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel
+    QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QDockWidget
 )
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, Signal
+from PySide6.QtGui import QShortcut, QKeySequence
 
 from ui.topbar import TopBar
 from ui.sidebar import Sidebar
@@ -15,9 +16,13 @@ from views.team_details_view import TeamDetailsView
 from views.manufacturer_list_view import ManufacturerListView
 from views.manufacturer_details_view import ManufacturerDetailsView
 from views.compare_view import CompareView
+from ui.diagnostics_panel import DiagnosticsPanel
 
 
 class MainWindow(QMainWindow):
+    # Пары (season, series_name), данные которых загрузчик изменил (из потока слушателя db_sync)
+    data_changed = Signal(list)
+
     def __init__(self, theme_manager):
         super().__init__()
         self.setWindowTitle("NASCAR Stats")
@@ -27,6 +32,8 @@ class MainWindow(QMainWindow):
         self.current_view = None
 
         self._setup_ui()
+        # Сигнал испускается в фоновом потоке — слот выполняется в потоке UI (очередь событий)
+        self.data_changed.connect(self._on_data_changed)
 
     def _setup_ui(self):
         central_widget = QWidget()
@@ -49,8 +56,19 @@ class MainWindow(QMainWindow):
         outer_layout.addLayout(self.content_layout)
         self.setCentralWidget(central_widget)
 
+        # Скрытая панель диагностики запросов (Ctrl+Shift+D)
+        self.diagnostics_dock = QDockWidget("Диагностика запросов", self)
+        self.diagnostics_dock.setWidget(DiagnosticsPanel())
+        self.addDockWidget(Qt.BottomDockWidgetArea, self.diagnostics_dock)
+        self.diagnostics_dock.hide()
+        self.diagnostics_shortcut = QShortcut(QKeySequence("Ctrl+Shift+D"), self)
+        self.diagnostics_shortcut.activated.connect(self.toggle_diagnostics)
+
         self.handle_navigation("races")  # Стартовая вкладка
 
+    def toggle_diagnostics(self):
+        self.diagnostics_dock.setVisible(not self.diagnostics_dock.isVisible())
+
     def handle_navigation(self, page_key: str):
         if self.current_view:
             if isinstance(self.current_view, CompareView) and page_key == "compare":
@@ -141,6 +159,18 @@ class MainWindow(QMainWindow):
         self.current_view = view
         self.content_layout.addWidget(view, stretch=1)
 
+    def _on_data_changed(self, pairs: list):
+        """Обновляет открытый список, если загрузка затронула его сезон и серию."""
+        pairs = {(season, series) for season, series in pairs}
+        newest = max((season for season, _ in pairs), default=None)
+        if newest is not None and newest > int(self.topbar.season_combo.itemText(0)):
+            self.topbar.season_combo.insertItem(0, str(newest)) # Появился новый сезон
+
+        season = int(self.topbar.season_combo.currentText())
+        series = self.topbar.series_combo.currentText()
+        if (season, series) in pairs and isinstance(self.current_view, (RaceListView, DriverListView, TeamListView, ManufacturerListView)):
+            self._handle_topbar_change()
+
     def _handle_topbar_change(self, *_):
         season = int(self.topbar.season_combo.currentText())
         series = self.topbar.series_combo.currentText()
@@ -1,7 +1,11 @@
 from PySide6.QtWidgets import QWidget, QHBoxLayout, QLabel, QPushButton, QComboBox, QSpacerItem, QSizePolicy
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, QTimer
 from PySide6.QtCore import Signal
 
+import db_sync
+
+REPLICA_STATUS_INTERVAL_MS = 30_000 # Как часто обновлять индикатор локальной копии
+
 class TopBar(QWidget):
     season_changed = Signal(int)
     series_changed = Signal(str)
@@ -32,6 +36,14 @@ class TopBar(QWidget):
         self.series_combo = QComboBox()
         self.series_combo.addItems(["Cup", "Xfinity", "Truck"])
 
+        # Индикатор свежести локальной копии БД (скрыт, если чтение идёт из основной БД)
+        self.replica_label = QLabel()
+        self.replica_label.setObjectName("replicaStatusLabel")
+        self.replica_timer = QTimer(self)
+        self.replica_timer.timeout.connect(self.update_replica_status)
+        self.replica_timer.start(REPLICA_STATUS_INTERVAL_MS)
+        self.update_replica_status()
+
         self.theme_button = QPushButton("🌓 Тема")
         self.theme_button.clicked.connect(self.theme_manager.toggle_theme)
 
@@ -40,4 +52,36 @@ class TopBar(QWidget):
         layout.addWidget(self.series_label)
         layout.addWidget(self.series_combo)
         layout.addItem(QSpacerItem(40, 20, QSizePolicy.Expanding, QSizePolicy.Minimum))
+        layout.addWidget(self.replica_label)
         layout.addWidget(self.theme_button)
+
+    def update_replica_status(self):
+        status = db_sync.get_replica_status()
+        if status is None:
+            self.replica_label.hide()
+            return
+        self.replica_label.show()
+
+        age = status['age_seconds']
+        if status['syncing']:
+            text = "⟳ Синхронизация..."
+        elif age is None:
+            text = "⚠ Локальная копия не синхронизирована"
+        elif age < 60:
+            text = "Данные: обновлены только что"
+        elif age < 3600:
+            text = f"Данные: обновлены {int(age // 60)} мин назад"
+        elif age < 86400:
+            text = f"Данные: обновлены {int(age // 3600)} ч назад"
+        else:
+            text = f"⚠ Данные: обновлены {int(age // 86400)} дн назад"
+
+        tooltip = "Чтение из локальной копии БД"
+        if status['synced_at'] is not None:
+            tooltip += f"\nПоследняя синхронизация: {status['synced_at'].astimezone():%d.%m.%Y %H:%M}"
+        if status['error']:
+            if not text.startswith("⚠"):
+                text = "⚠ " + text
+            tooltip += f"\nОшибка синхронизации: {status['error']}"
+        self.replica_label.setText(text)
+        self.replica_label.setToolTip(tooltip)
@@ -3,9 +3,11 @@ from PySide6.QtWidgets import (
     QGridLayout, QGroupBox, QScrollArea, QFrame, QComboBox, QRadioButton,
     QSpacerItem, QSizePolicy, QCompleter, QButtonGroup
 )
-from PySide6.QtCore import Qt, QSortFilterProxyModel, QThread, QObject, Signal
+from PySide6.QtCore import Qt, QSortFilterProxyModel, QThread, QObject, Signal, QModelIndex
 from PySide6.QtGui import QStandardItemModel, QStandardItem, QColor, QPalette
+import asyncio
 import db_sync
+import db_async
 from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
 import numpy as np # Для расположения столбцов на графике
@@ -28,6 +30,42 @@ class IdNameItemModel(QStandardItemModel):
                  return item.data(Qt.UserRole)
         return None # Возвращаем None, если индекс невалиден или элемента нет
 
+# Completer комбобокса сущностей: подсказки дает индекс поиска db_sync.search_entities
+# (опечатки, начала слов), а не перебор всех имен модели при каждом нажатии клавиши
+class EntitySearchCompleter(QCompleter):
+    SUGGESTION_LIMIT = 15
+
+    def __init__(self, combo: QComboBox, parent=None):
+        super().__init__(parent)
+        self._combo = combo
+        self._kind = None
+        self._suggestions = QStandardItemModel(self)
+        self.setModel(self._suggestions)
+        self.setCompletionMode(QCompleter.UnfilteredPopupCompletion) # Порядок и отбор — из поиска
+        self.setCaseSensitivity(Qt.CaseInsensitive)
+
+    def set_kind(self, kind: str):
+        """Вид сущностей для поиска ('drivers', 'teams', 'manufacturers')."""
+        self._kind = kind
+        self._suggestions.clear()
+        self.setModel(self._suggestions) # QComboBox.setModel подменяет модель completer'а своей
+
+    def update_suggestions(self, text: str):
+        self._suggestions.clear()
+        if not self._kind or not text.strip():
+            return
+        for match in db_sync.search_entities(self._kind, text, self.SUGGESTION_LIMIT):
+            item = QStandardItem(match.name)
+            item.setData(match.id, Qt.UserRole)
+            self._suggestions.appendRow(item)
+        self.complete()
+
+    def select_suggestion(self, index: QModelIndex):
+        """Выбирает в комбобоксе сущность подсказки по id (имена могут совпадать)."""
+        row = self._combo.findData(index.data(Qt.UserRole), Qt.UserRole)
+        if row >= 0:
+            self._combo.setCurrentIndex(row)
+
 # Worker для фоновых задач БД
 class DbWorker(QObject):
     """Выполняет запросы к БД в фоновом потоке."""
@@ -50,6 +88,8 @@ class DbWorker(QObject):
                 'season_results2': None
             }
             series_id = None
+            stats = {}
+            season_results = {}
             if is_season_mode:
                 # Получаем series_id только один раз
                 with db_sync.get_db_session() as session:
@@ -57,35 +97,35 @@ class DbWorker(QObject):
                 if not series_id:
                     raise ValueError(f"Серия '{series}' не найдена в БД.")
 
+            # Пакетные запросы: один запрос на обе сущности вместо отдельного на каждую
+            ids = [id1, id2]
             if entity_type == "driver":
                 if is_season_mode:
-                    results['stats1'] = db_sync.get_driver_season_details(id1, season, series)
-                    results['stats2'] = db_sync.get_driver_season_details(id2, season, series)
-                    results['season_results1'] = db_sync.get_driver_race_results_for_season(id1, season, series_id)
-                    results['season_results2'] = db_sync.get_driver_race_results_for_season(id2, season, series_id)
+                    stats = db_sync.get_driver_season_details_many(ids, season, series)
+                    season_results = db_sync.get_driver_race_results_for_season_many(ids, season, series_id)
                 else:
-                    results['stats1'] = db_sync.get_overall_driver_stats(id1)
-                    results['stats2'] = db_sync.get_overall_driver_stats(id2)
+                    stats = db_sync.get_overall_driver_stats_many(ids)
             elif entity_type == "team":
                 if is_season_mode:
-                    results['stats1'] = db_sync.get_team_season_details(id1, season, series)
-                    results['stats2'] = db_sync.get_team_season_details(id2, season, series)
-                    results['season_results1'] = db_sync.get_team_race_results_for_season(id1, season, series_id)
-                    results['season_results2'] = db_sync.get_team_race_results_for_season(id2, season, series_id)
+                    stats = db_sync.get_team_season_details_many(ids, season, series)
+                    season_results = db_sync.get_team_race_results_for_season_many(ids, season, series_id)
                 else:
-                    results['stats1'] = db_sync.get_overall_team_stats(id1)
-                    results['stats2'] = db_sync.get_overall_team_stats(id2)
+                    stats = db_sync.get_overall_team_stats_many(ids)
             elif entity_type == "manufacturer":
                 if is_season_mode:
                     # Получаем статистику ВСЕХ производителей за сезон
                     all_manu_stats = db_sync.get_manufacturer_season_stats(season, series)
                     # Находим нужных нам по ID
-                    results['stats1'] = next((m for m in all_manu_stats if m.get('manufacturer_id') == id1), None)
-                    results['stats2'] = next((m for m in all_manu_stats if m.get('manufacturer_id') == id2), None)
+                    stats = {m.get('manufacturer_id'): m for m in all_manu_stats if m.get('manufacturer_id') in ids}
                     # Сезонных графиков для производителей пока нет
                 else:
-                    results['stats1'] = db_sync.get_overall_manufacturer_stats(id1)
-                    results['stats2'] = db_sync.get_overall_manufacturer_stats(id2)
+                    stats = db_sync.get_overall_manufacturer_stats_many(ids)
+
+            results['stats1'] = stats.get(id1)
+            results['stats2'] = stats.get(id2)
+            if season_results:
+                results['season_results1'] = season_results.get(id1)
+                results['season_results2'] = season_results.get(id2)
 
             print(f"DEBUG [DbWorker]: Task finished successfully. Emitting result_ready.")
             self.result_ready.emit(results)
@@ -97,6 +137,50 @@ class DbWorker(QObject):
             traceback.print_exc() # Выводим полный traceback в консоль для отладки
             self.error_occurred.emit(error_msg)
 
+async def fetch_comparison_async(entity_type, is_season_mode, id1, id2, season, series) -> dict:
+    """
+    Асинхронный вариант DbWorker.run (при работе под qasync): статистика и результаты
+    по гонкам запрашиваются одновременно, а не по очереди.
+    """
+    results = {'stats1': None, 'stats2': None, 'season_results1': None, 'season_results2': None}
+    ids = [id1, id2]
+    series_id = None
+    if is_season_mode:
+        series_id = await db_async.get_series_id_by_name(series)
+        if not series_id:
+            raise ValueError(f"Серия '{series}' не найдена в БД.")
+
+    stats, season_results = {}, {}
+    if entity_type == "driver":
+        if is_season_mode:
+            stats, season_results = await asyncio.gather(
+                db_async.get_driver_season_details_many(ids, season, series),
+                db_async.get_driver_race_results_for_season_many(ids, season, series_id)
+            )
+        else:
+            stats = await db_async.get_overall_driver_stats_many(ids)
+    elif entity_type == "team":
+        if is_season_mode:
+            stats, season_results = await asyncio.gather(
+                db_async.get_team_season_details_many(ids, season, series),
+                db_async.get_team_race_results_for_season_many(ids, season, series_id)
+            )
+        else:
+            stats = await db_async.get_overall_team_stats_many(ids)
+    elif entity_type == "manufacturer":
+        if is_season_mode:
+            all_manu_stats = await db_async.get_manufacturer_season_stats(season, series)
+            stats = {m.get('manufacturer_id'): m for m in all_manu_stats if m.get('manufacturer_id') in ids}
+        else:
+            stats = await db_async.get_overall_manufacturer_stats_many(ids)
+
+    results['stats1'] = stats.get(id1)
+    results['stats2'] = stats.get(id2)
+    if season_results:
+        results['season_results1'] = season_results.get(id1)
+        results['season_results2'] = season_results.get(id2)
+    return results
+
 class CompareView(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -252,10 +336,11 @@ class CompareView(QWidget):
         self.entity2_label.setText(f"{label_text} 2:")
 
         # Обновляем модель для каждого комбобокса
+        search_kind = {"driver": "drivers", "team": "teams", "manufacturer": "manufacturers"}.get(self.current_entity_type)
         for combo in [self.entity1_combo, self.entity2_combo]:
             model = IdNameItemModel(data, self)
             combo.setModel(model)
-            combo.completer().setModel(model)
+            combo.completer().set_kind(search_kind)
             combo.setCurrentIndex(-1)
             # Плейсхолдер тоже меняется
             combo.lineEdit().setPlaceholderText(f"Начните вводить {label_text.lower()}...")
@@ -270,12 +355,12 @@ class CompareView(QWidget):
         combo.setMinimumWidth(200)
         combo.setMaxVisibleItems(15)
 
-        # Настраиваем completer без модели (модель будет установлена позже)
-        completer = QCompleter(self) # Создаем completer без модели
-        completer.setCompletionMode(QCompleter.PopupCompletion)
-        completer.setFilterMode(Qt.MatchContains)
-        completer.setCaseSensitivity(Qt.CaseInsensitive)
+        # Подсказки — из индекса поиска (вид сущностей задается в _update_combos_for_entity_type)
+        completer = EntitySearchCompleter(combo, self)
         combo.setCompleter(completer) # Устанавливаем completer для combo
+        combo.lineEdit().textEdited.connect(completer.update_suggestions)
+        # После обработчика QComboBox (он ищет выбранную подсказку по тексту) уточняем выбор по id
+        completer.activated[QModelIndex].connect(completer.select_suggestion)
 
         return combo
 
@@ -432,6 +517,16 @@ class CompareView(QWidget):
         self.compare_button.setEnabled(False)
         self.compare_button.setText("Загрузка...") # Индикатор
 
+        if db_async.has_running_loop():
+            # Под qasync: запросы выполняются корутинами в цикле событий, без отдельного потока
+            print("DEBUG: Асинхронная загрузка данных сравнения...")
+            db_async.schedule(
+                fetch_comparison_async(self.current_entity_type, is_season_mode, id1, id2, season, series),
+                self._on_comparison_data_ready,
+                self._on_db_error
+            )
+            return
+
         # Создаем поток и worker'а
         self.db_thread = QThread()
         self.db_worker = DbWorker() # Создаем экземпляр нашего worker'а
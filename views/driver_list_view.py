@@ -1,19 +1,28 @@
 from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QLabel, QTableView, QSizePolicy, QHeaderView, QLineEdit
 )
-from PySide6.QtCore import Qt, Signal
+from PySide6.QtCore import Qt, Signal, QTimer
 from models.driver_table_model import DriverTableModel
+from db_search import SearchIndex
 import db_sync
 
 
 class DriverListView(QWidget):
     driver_selected = Signal(int)
+    CHUNK_SIZE = 200 # Строк в порции потоковой загрузки рейтинга
 
     def __init__(self, season: int, series: str, parent=None):
         super().__init__(parent)
         self.season = season
         self.series = series
         self._all_drivers = []
+        self._search_index = None # Индекс нечёткого поиска по загруженным гонщикам (строится при первом фильтре)
+        self._load_generation = 0 # Номер текущей загрузки: устаревшие порции отбрасываются
+        # [генератор порций рейтинга (db_sync.iter_driver_standings) или None]. Вид удаляется (deleteLater)
+        # без hide: поток закрывается по destroyed. Обработчик подключается один раз и держит только список — не сам вид
+        self._stream_slot = [None]
+        stream_slot = self._stream_slot
+        self.destroyed.connect(lambda *_: stream_slot[0] is not None and stream_slot[0].close())
 
         self.layout = QVBoxLayout(self)
         self.layout.setContentsMargins(10, 10, 10, 10)
@@ -37,24 +46,48 @@ class DriverListView(QWidget):
         self.load_data()
 
     def load_data(self):
-        drivers, _, _ = db_sync.get_driver_standings(
-            season=self.season,
-            series_name=self.series,
-            page=1,
-            page_size=5000
-        )
-        self._all_drivers = drivers
+        # Рейтинг читается одним потоковым запросом; следующая порция — после обработки событий UI
+        self._close_stream()
+        self._load_generation += 1
+        self._all_drivers = []
+        self._search_index = None
         self.apply_filter()
+        self._stream_slot[0] = db_sync.iter_driver_standings(self.season, self.series, chunk_size=self.CHUNK_SIZE)
+        self._load_chunk(self._load_generation)
+
+    def _close_stream(self):
+        if self._stream_slot[0] is not None:
+            self._stream_slot[0].close() # Прерывает недочитанный поток прежнего сезона/серии
+            self._stream_slot[0] = None
+
+    def _load_chunk(self, generation: int):
+        stream = self._stream_slot[0]
+        if generation != self._load_generation or stream is None:
+            return # Сезон/серия сменились, эта загрузка устарела
+        drivers = next(stream, None)
+        if drivers is None:
+            self._stream_slot[0] = None
+            return
+        self._all_drivers.extend(drivers)
+        self._search_index = None
+        query = self.search_box.text()
+        if query.strip():
+            # Сходство с запросом зависит только от имени — порцию можно фильтровать отдельно
+            matched = SearchIndex(enumerate(d.driver_name for d in drivers)).matching_ids(query)
+            drivers = [d for position, d in enumerate(drivers) if position in matched]
+        self.table.model().append_rows(drivers)
+        QTimer.singleShot(0, self, lambda: self._load_chunk(generation))
 
     def apply_filter(self):
-        query = self.search_box.text().lower()
-        if not query:
+        query = self.search_box.text()
+        if not query.strip():
             filtered_drivers = self._all_drivers
         else:
-            filtered_drivers = [
-                d for d in self._all_drivers
-                if query in d.driver_name.lower()
-            ]
+            # Поиск с опечатками по индексу; порядок рейтинга сохраняется
+            if self._search_index is None:
+                self._search_index = SearchIndex(enumerate(d.driver_name for d in self._all_drivers))
+            matched = self._search_index.matching_ids(query)
+            filtered_drivers = [d for position, d in enumerate(self._all_drivers) if position in matched]
 
         model = DriverTableModel(filtered_drivers)
         self.table.setModel(model)
@@ -3,6 +3,7 @@ from PySide6.QtWidgets import (
 )
 from PySide6.QtCore import Qt, Signal
 from models.race_table_model import RaceTableModel
+from db_search import SearchIndex
 import db_sync
 
 
@@ -14,6 +15,7 @@ class RaceListView(QWidget):
         self.season = season
         self.series = series
         self._all_races = []
+        self._search_index = None # Индекс нечёткого поиска по гонкам сезона (строится при первом фильтре)
 
         self.layout = QVBoxLayout(self)
         self.layout.setContentsMargins(10, 10, 10, 10)
@@ -23,7 +25,7 @@ class RaceListView(QWidget):
         self.layout.addWidget(self.label)
 
         self.search_box = QLineEdit()
-        self.search_box.setPlaceholderText("Фильтр по названию гонки...")
+        self.search_box.setPlaceholderText("Фильтр по названию гонки или трассе...")
         self.search_box.textChanged.connect(self.apply_filter)
         self.layout.addWidget(self.search_box)
 
@@ -41,17 +43,19 @@ class RaceListView(QWidget):
             season=self.season, series_name=self.series, page=1, page_size=100
         )
         self._all_races = races
+        self._search_index = None
         self.apply_filter()
 
     def apply_filter(self):
-        query = self.search_box.text().lower()
-        if not query:
+        query = self.search_box.text()
+        if not query.strip():
             filtered = self._all_races
         else:
-            filtered = [
-                r for r in self._all_races
-                if query in r.race_name.lower()
-            ]
+            # Поиск с опечатками по названию гонки и трассе; порядок гонок сохраняется
+            if self._search_index is None:
+                self._search_index = SearchIndex(enumerate(f"{r.race_name} {r.track_name or ''}" for r in self._all_races))
+            matched = self._search_index.matching_ids(query)
+            filtered = [r for position, r in enumerate(self._all_races) if position in matched]
 
         model = RaceTableModel(filtered)
         self.table.setModel(model)
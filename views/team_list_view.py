@@ -1,17 +1,26 @@
 from PySide6.QtWidgets import QWidget, QVBoxLayout, QLabel, QTableView, QHeaderView, QSizePolicy, QLineEdit
-from PySide6.QtCore import Qt, Signal
+from PySide6.QtCore import Qt, Signal, QTimer
 import db_sync
+from db_search import SearchIndex
 from models.team_table_model import TeamTableModel
 
 
 class TeamListView(QWidget):
     team_selected = Signal(int)
+    CHUNK_SIZE = 200 # Строк в порции потоковой загрузки рейтинга
 
     def __init__(self, parent=None):
         super().__init__(parent)
         self.season = None
         self.series = None
         self._all_teams = []
+        self._search_index = None # Индекс нечёткого поиска по загруженным командам (строится при первом фильтре)
+        self._load_generation = 0 # Номер текущей загрузки: устаревшие порции отбрасываются
+        # [генератор порций рейтинга (db_sync.iter_team_standings) или None]. Вид удаляется (deleteLater)
+        # без hide: поток закрывается по destroyed. Обработчик подключается один раз и держит только список — не сам вид
+        self._stream_slot = [None]
+        stream_slot = self._stream_slot
+        self.destroyed.connect(lambda *_: stream_slot[0] is not None and stream_slot[0].close())
 
         layout = QVBoxLayout(self)
         layout.setContentsMargins(10, 10, 10, 10)
@@ -54,25 +63,49 @@ class TeamListView(QWidget):
         self._load_data()
 
     def _load_data(self):
-        teams, _, _ = db_sync.get_team_standings(
-            self.season,
-            self.series,
-            page=1,
-            page_size=5000
-        )
-        self._all_teams = teams
+        # Рейтинг читается одним потоковым запросом; следующая порция — после обработки событий UI
+        self._close_stream()
+        self._load_generation += 1
+        self._all_teams = []
+        self._search_index = None
         self.label.setText(f"Команды: {self.series} — {self.season}")
         self.apply_filter()
+        self._stream_slot[0] = db_sync.iter_team_standings(self.season, self.series, chunk_size=self.CHUNK_SIZE)
+        self._load_chunk(self._load_generation)
+
+    def _close_stream(self):
+        if self._stream_slot[0] is not None:
+            self._stream_slot[0].close() # Прерывает недочитанный поток прежнего сезона/серии
+            self._stream_slot[0] = None
+
+    def _load_chunk(self, generation: int):
+        stream = self._stream_slot[0]
+        if generation != self._load_generation or stream is None:
+            return # Сезон/серия сменились, эта загрузка устарела
+        teams = next(stream, None)
+        if teams is None:
+            self._stream_slot[0] = None
+            return
+        self._all_teams.extend(teams)
+        self._search_index = None
+        query = self.search_box.text()
+        if query.strip():
+            # Сходство с запросом зависит только от названия — порцию можно фильтровать отдельно
+            matched = SearchIndex(enumerate(t.team_name for t in teams)).matching_ids(query)
+            teams = [t for position, t in enumerate(teams) if position in matched]
+        self.table.model().append_rows(teams)
+        QTimer.singleShot(0, self, lambda: self._load_chunk(generation))
 
     def apply_filter(self):
-        query = self.search_box.text().lower()
-        if not query:
+        query = self.search_box.text()
+        if not query.strip():
             filtered_teams = self._all_teams
         else:
-            filtered_teams = [
-                t for t in self._all_teams
-                if query in t.team_name.lower()
-            ]
+            # Поиск с опечатками по индексу; порядок рейтинга сохраняется
+            if self._search_index is None:
+                self._search_index = SearchIndex(enumerate(t.team_name for t in self._all_teams))
+            matched = self._search_index.matching_ids(query)
+            filtered_teams = [t for position, t in enumerate(self._all_teams) if position in matched]
 
         model = TeamTableModel(filtered_teams, self)
         self.table.setModel(model)